@@ -1,10 +1,13 @@
 """
 文件管理API视图
 """
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
-from fastapi.responses import StreamingResponse
+import os
+from fastapi import APIRouter, Body, Depends, UploadFile, File, HTTPException, Path, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, conint
 from sqlalchemy.orm import Session
-from typing import List
+from starlette.datastructures import Headers
+from typing import List, Optional
 from urllib.parse import quote
 from app.database import get_db
 from app.controllers.file import FileController
@@ -12,9 +15,61 @@ from app.schemas import FileResponse, StandardResponse, PaginatedResponse, Token
 from app.middleware.auth import get_current_user, require_permission
 from celery_app import celery_app
 from app.parsers import is_supported_file
+from parse_cache import get_parse_cache
+from file_storage import get_multipart_uploads
+from file_transfer import (close_response, content_hash, etag_matches, if_range_matches, not_modified_since,
+                           parse_range, resolve_range, stream_object)
 
 router = APIRouter()
 
+# 分片上传：对象存储要求除最后一片外每片不小于 5MB，最多 10000 片
+MULTIPART_MIN_PART_SIZE = 5 << 20
+MULTIPART_MAX_PART_SIZE = int(os.getenv("FILE_MULTIPART_MAX_PART_SIZE", 512 << 20))
+MULTIPART_MAX_PARTS = 10000
+
+
+class MultipartPart(BaseModel):
+    part_number: conint(ge=1, le=MULTIPART_MAX_PARTS)
+    etag: str
+
+def _parse_options(file):
+    # 解析器按扩展名选择，同一内容以不同扩展名上传时解析结果可能不同，扩展名作为缓存键的一部分
+    return {"ext": os.path.splitext(getattr(file, "filename", "") or "")[1].lower()}
+
+
+def _hash_upload(fileobj):
+    """上传时在写入对象存储前计算内容哈希，读完后回到开头供后续上传使用"""
+    digest = content_hash(fileobj)
+    fileobj.seek(0)
+    return digest
+
+
+def _remember_upload(result, digest):
+    # 解析时只按 file_id 查找上传时记录的哈希，不再重新下载对象
+    file_id = result.get("id") if isinstance(result, dict) else getattr(result, "id", None)
+    if file_id is not None:
+        get_parse_cache().remember_file_hash(file_id, digest)
+
+
+def _batch_file_results(result):
+    """批量任务结果中的 results 列表按 file_id 展开；失败或缺少结果的条目不参与缓存"""
+    items = result.get("results") if isinstance(result, dict) else None
+    if not isinstance(items, list):
+        return {}
+    return {item["file_id"]: item.get("result") for item in items
+            if isinstance(item, dict) and "file_id" in item and item.get("success", True) and not item.get("error")}
+
+
+def _cached_parse(file_id, cached):
+    return {
+        'task_id': None,
+        'file_id': file_id,
+        'state': 'SUCCESS',
+        'status': '解析完成',
+        'cached': True,
+        'result': cached
+    }
+
 
 @router.post("/upload", response_model=StandardResponse[FileResponse], summary="上传文件")
 @require_permission("UPLOAD_FILE")
@@ -28,12 +83,121 @@ def upload_file(
     if not is_supported_file(file.filename):
         raise HTTPException(status_code=400, detail="文件类型不支持")
     controller = FileController(db)
+    digest = _hash_upload(file.file)
     result = controller.upload_file(file, current_user.user_id)
+    _remember_upload(result, digest)
+    return StandardResponse(message="文件上传成功", data=result)
+
+
+@router.post("/multipart/init", response_model=StandardResponse[dict], summary="初始化分片上传")
+@require_permission("UPLOAD_FILE")
+def init_multipart_upload(
+    filename: str = Body(..., description="文件名"),
+    size: int = Body(..., ge=1, description="文件总大小（字节）"),
+    part_size: int = Body(16 << 20, description="分片大小（字节）"),
+    content_type: Optional[str] = Body(None, description="文件类型"),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """创建对象存储分片上传会话，返回 upload_id 与分片规划"""
+    if not is_supported_file(filename):
+        raise HTTPException(status_code=400, detail="文件类型不支持")
+    if not MULTIPART_MIN_PART_SIZE <= part_size <= MULTIPART_MAX_PART_SIZE:
+        raise HTTPException(status_code=400, detail=f"分片大小需在 {MULTIPART_MIN_PART_SIZE}~{MULTIPART_MAX_PART_SIZE} 字节之间")
+    part_count = -(-size // part_size)
+    if part_count > MULTIPART_MAX_PARTS:
+        raise HTTPException(status_code=400, detail="分片数量超过上限，请增大分片大小")
+    result = get_multipart_uploads().create(current_user.user_id, filename, size, part_size, content_type)
+    return StandardResponse(message="分片上传已初始化", data=result)
+
+
+@router.put("/multipart/{upload_id}/parts/{part_number}", response_model=StandardResponse[dict], summary="上传分片")
+@require_permission("UPLOAD_FILE")
+def upload_part(
+    upload_id: str,
+    part_number: int = Path(..., ge=1, le=MULTIPART_MAX_PARTS, description="分片序号，从 1 开始"),
+    file: UploadFile = File(...),
+    current_user: TokenData = Depends(get_current_user)
+):
+    """上传单个分片，可并发、可重传；服务端只暂存当前分片，直接写入对象存储的对应分片"""
+    file.file.seek(0, os.SEEK_END)
+    part_length = file.file.tell()
+    file.file.seek(0)
+    if part_length == 0:
+        raise HTTPException(status_code=400, detail="分片内容为空")
+    if part_length > MULTIPART_MAX_PART_SIZE:
+        raise HTTPException(status_code=413, detail="分片过大")
+    try:
+        result = get_multipart_uploads().upload_part(upload_id, current_user.user_id, part_number, file.file,
+                                                     part_length)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    return StandardResponse(message="分片上传成功", data=result)
+
+
+@router.get("/multipart/{upload_id}", response_model=StandardResponse[dict], summary="查询分片上传进度")
+@require_permission("UPLOAD_FILE")
+def get_multipart_upload(
+    upload_id: str,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """返回已上传的分片（序号、ETag、大小），用于断点续传时跳过已完成的分片"""
+    result = get_multipart_uploads().list_parts(upload_id, current_user.user_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    return StandardResponse(message="获取分片上传进度成功", data=result)
+
+
+@router.post("/multipart/{upload_id}/complete", response_model=StandardResponse[FileResponse], summary="完成分片上传")
+@require_permission("UPLOAD_FILE")
+def complete_multipart_upload(
+    upload_id: str,
+    parts: Optional[List[MultipartPart]] = Body(None, embed=True, description="分片列表，为空时使用对象存储记录的分片"),
+    current_user: TokenData = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """在对象存储端合并分片，再以合并后的对象创建文件记录"""
+    if parts:
+        if len({p.part_number for p in parts}) != len(parts):
+            raise HTTPException(status_code=400, detail="分片序号重复")
+        parts = [p.model_dump() for p in parts]
+    uploads = get_multipart_uploads()
+    try:
+        merged = uploads.complete(upload_id, current_user.user_id, parts)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not merged:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    # 文件记录由 FileController.upload_file 统一创建；合并后的暂存对象转交后删除
+    try:
+        with uploads.spool_object(merged["object_name"]) as spool:
+            headers = Headers({"content-type": merged["content_type"]} if merged["content_type"] else {})
+            upload = UploadFile(spool, size=merged["size"], filename=merged["filename"], headers=headers)
+            digest = _hash_upload(spool)
+            result = FileController(db).upload_file(upload, current_user.user_id)
+    finally:
+        uploads.remove_object(merged["object_name"])
+    _remember_upload(result, digest)
     return StandardResponse(message="文件上传成功", data=result)
 
 
+@router.post("/multipart/{upload_id}/abort", response_model=StandardResponse[dict], summary="取消分片上传")
+@require_permission("UPLOAD_FILE")
+def abort_multipart_upload(
+    upload_id: str,
+    current_user: TokenData = Depends(get_current_user)
+):
+    """取消分片上传并释放对象存储中已上传的分片"""
+    success = get_multipart_uploads().abort(upload_id, current_user.user_id)
+    if not success:
+        raise HTTPException(status_code=404, detail="上传会话不存在或已结束")
+    return StandardResponse(message="分片上传已取消", data={"upload_id": upload_id})
+
+
 @router.get("/download", summary="下载文件")
 def download_file(
+    request: Request,
     token: str = Query(..., description="下载token"),
     db: Session = Depends(get_db)
 ):
@@ -49,20 +213,50 @@ def download_file(
     response = controller.get_file_response(file_id)
     if not response:
         raise HTTPException(status_code=404, detail="文件不存在")
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    validators = {k: v for k, v in (("ETag", etag), ("Last-Modified", last_modified)) if v}
+    # 条件请求：If-None-Match 优先于 If-Modified-Since，命中时不传输内容
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+            not if_none_match and not_modified_since(request.headers.get("if-modified-since"), last_modified)):
+        close_response(response)
+        return Response(status_code=304, headers=validators)
     file_name = file.filename
+    headers = {
+        'Content-Disposition': f"attachment; filename*=utf-8''{quote(file_name)}",
+        'Accept-Ranges': 'bytes',
+        **validators,
+    }
+    size = response.headers.get("Content-Length")
+    if size is not None:
+        headers['Content-Length'] = size
+    # 单一字节区间按对象总长度在本地求解；If-Range 不匹配说明对象已变化，改为返回完整内容
+    byte_range = parse_range(request.headers.get("range")) if size is not None else None
+    if byte_range and not if_range_matches(request.headers.get("if-range"), etag, last_modified):
+        byte_range = None
+    status_code = 200
+    if byte_range:
+        size = int(size)
+        span = resolve_range(byte_range, size)
+        # 完整内容的响应只用来取长度与校验值，未读取正文即关闭
+        close_response(response)
+        if span is None:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        start, end = span
+        # 只向对象存储请求所需区间，不在本地跳过前缀字节
+        response = controller.get_file_response(file_id, offset=start, length=end - start + 1)
+        if not response:
+            raise HTTPException(status_code=404, detail="文件不存在")
+        headers['Content-Length'] = str(end - start + 1)
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        status_code = 206
     # 流式返回
-    def stream_response():
-        try:
-            for chunk in response.stream(1024):
-                yield chunk
-        finally:
-            response.close()
-            response.release_conn()
-
     return StreamingResponse(
-        stream_response(),
+        stream_object(response),
+        status_code=status_code,
         media_type=response.headers['Content-Type'],
-        headers={'Content-Disposition': f"attachment; filename*=utf-8''{quote(file_name)}"}
+        headers=headers
     )
 
 
@@ -107,6 +301,7 @@ def delete_file(
     success = controller.delete_file(file_id, current_user.user_id)
     if not success:
         raise HTTPException(status_code=404, detail="文件不存在")
+    get_parse_cache().forget_file(file_id)
     return StandardResponse(message="文件删除成功", data={"file_id": file_id})
 
 
@@ -127,14 +322,29 @@ def download_file(
 @require_permission("PARSE_FILE")
 def parse_file_content(
     file_id: int,
+    force: bool = Query(False, description="忽略缓存强制重新解析"),
     current_user: TokenData = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """手动触发文件内容解析"""
+    """手动触发文件内容解析，内容与解析器均未变化时直接返回缓存结果"""
     controller = FileController(db)
+    file = controller.get_file(file_id, current_user.user_id)
+    if not file:
+        raise HTTPException(status_code=404, detail="文件不存在")
+    cache = get_parse_cache()
+    options = _parse_options(file)
+    # 没有上传时记录的哈希（如本功能上线前上传的文件）时不使用缓存
+    digest = cache.file_hash(file_id)
+    if digest and not force:
+        cached = cache.get(digest, options)
+        if cached is not None:
+            return StandardResponse(message="文件解析结果已缓存", data=_cached_parse(file_id, cached))
     result = controller.parse_file_content(file_id, current_user.user_id)
     if not result:
         raise HTTPException(status_code=404, detail="文件不存在")
+    # 任务与文件、内容哈希在服务端绑定，完成后只按绑定写入缓存
+    if digest and isinstance(result, dict) and result.get("task_id"):
+        cache.bind_task(result["task_id"], file_id, digest, options)
     return StandardResponse(message="文件解析任务已启动", data=result)
 
 
@@ -147,6 +357,11 @@ def get_parse_status(
     db: Session = Depends(get_db)
 ):
     """查询文件解析任务的进度"""
+    # 任务已绑定到其他文件时拒绝，避免借他人的 file_id 写入或读取缓存
+    cache = get_parse_cache()
+    binding = cache.task_binding(task_id)
+    if binding is not None and binding["file_id"] != file_id:
+        raise HTTPException(status_code=404, detail="解析任务不存在")
     # 获取Celery任务结果
     task_result = celery_app.AsyncResult(task_id)
     
@@ -182,6 +397,7 @@ def get_parse_status(
             'result': task_result.result,
             'content_length': task_result.info.get('content_length', 0) if task_result.info else 0
         }
+        cache.complete_task(task_id, task_result.result)
     elif task_result.state == 'FAILURE':
         # 任务失败
         response = {
@@ -211,15 +427,37 @@ def get_parse_status(
 @require_permission("BATCH_PARSE_FILES")
 def batch_parse_files(
     file_ids: List[int],
+    force: bool = Query(False, description="忽略缓存强制重新解析"),
     current_user: TokenData = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """批量解析文件内容"""
+    """批量解析文件内容，已有缓存结果的文件不再提交解析任务"""
     if not file_ids:
         raise HTTPException(status_code=400, detail="文件ID列表不能为空")
     
     controller = FileController(db)
-    result = controller.batch_parse_files(file_ids, current_user.user_id)
+    cache = get_parse_cache()
+    cached_ids = []
+    pending = {}
+    for file_id in file_ids:
+        file = controller.get_file(file_id, current_user.user_id)
+        digest = cache.file_hash(file_id) if file else None
+        options = _parse_options(file) if file else None
+        if digest and not force and cache.get(digest, options) is not None:
+            cached_ids.append(file_id)
+        else:
+            pending[file_id] = (digest, options)
+    if not pending:
+        return StandardResponse(message="文件解析结果已缓存", data={
+            "task_id": None, "state": "SUCCESS", "total": len(file_ids), "cached_file_ids": cached_ids
+        })
+    result = controller.batch_parse_files(list(pending), current_user.user_id)
+    # 逐个文件绑定到批量任务，完成后按绑定写入各文件的缓存
+    if isinstance(result, dict) and result.get("task_id"):
+        cache.bind_batch(result["task_id"], [(file_id, digest, options)
+                                             for file_id, (digest, options) in pending.items() if digest])
+    if cached_ids:
+        result = {**result, "cached_file_ids": cached_ids}
     return StandardResponse(message="批量解析任务已启动", data=result)
 
 
@@ -259,6 +497,7 @@ def get_batch_parse_status(
             'status': '批量解析完成',
             'result': task_result.result
         }
+        get_parse_cache().complete_batch(task_id, _batch_file_results(task_result.result))
     elif task_result.state == 'FAILURE':
         response = {
             'task_id': task_id,
@@ -0,0 +1,194 @@
+"""
+对象存储分片上传会话
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from minio import Minio
+except ImportError:
+    Minio = None
+
+# 相对路径按本模块所在目录解析；默认放在已被 .gitignore 忽略的 data/ 下
+MULTIPART_DB_PATH = Path(__file__).resolve().parent / os.getenv("MULTIPART_DB_PATH", "data/multipart.db")
+MULTIPART_PREFIX = "multipart/"
+# 合并后的对象转存为文件记录时，不超过该大小的内容留在内存，更大的落到临时文件
+SPOOL_MAX_SIZE = 64 << 20
+COPY_CHUNK_SIZE = 1 << 20
+
+# 只需 part_number 与 etag 两个属性，与 minio.datatypes.Part 用法一致
+_Part = namedtuple("_Part", ["part_number", "etag"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS multipart_uploads (
+    upload_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    object_name TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    part_size INTEGER NOT NULL,
+    content_type TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _etag(value):
+    return (value or "").strip().strip('"')
+
+
+class MultipartUploads:
+    """对象存储分片上传的薄封装：会话归属（upload_id -> user_id）与分片规划记录在本地 SQLite，
+    分片本身直接写入对象存储，已上传分片以对象存储的 ListParts 为准"""
+
+    def __init__(self, client, bucket, path=MULTIPART_DB_PATH):
+        self.client = client
+        self.bucket = bucket
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _session(self, upload_id, user_id):
+        # 会话不存在与属于其他用户同样返回 None，不暴露他人的 upload_id 是否存在
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT object_name, filename, size, part_size, content_type FROM multipart_uploads "
+                "WHERE upload_id = ? AND user_id = ?", (upload_id, str(user_id))).fetchone()
+        if row is None:
+            return None
+        object_name, filename, size, part_size, content_type = row
+        return {"upload_id": upload_id, "object_name": object_name, "filename": filename, "size": size,
+                "part_size": part_size, "part_count": -(-size // part_size), "content_type": content_type}
+
+    def _forget(self, upload_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM multipart_uploads WHERE upload_id = ?", (upload_id,))
+
+    def create(self, user_id, filename, size, part_size, content_type=None):
+        object_name = f"{MULTIPART_PREFIX}{user_id}/{uuid.uuid4().hex}/{Path(filename).name}"
+        headers = {"Content-Type": content_type} if content_type else {}
+        upload_id = self.client._create_multipart_upload(self.bucket, object_name, headers)
+        with self._connect() as conn:
+            conn.execute("INSERT INTO multipart_uploads VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         (upload_id, str(user_id), object_name, filename, size, part_size, content_type, time.time()))
+        session = self._session(upload_id, user_id)
+        return {key: session[key] for key in ("upload_id", "filename", "size", "part_size", "part_count")}
+
+    def upload_part(self, upload_id, user_id, part_number, data, length):
+        """写入单个分片，同一序号重传时覆盖；除最后一片外大小必须等于规划的分片大小"""
+        session = self._session(upload_id, user_id)
+        if session is None:
+            return None
+        if part_number > session["part_count"]:
+            raise ValueError(f"分片序号超出范围，共 {session['part_count']} 片")
+        last = session["size"] - (session["part_count"] - 1) * session["part_size"]
+        expected = last if part_number == session["part_count"] else session["part_size"]
+        if length != expected:
+            raise ValueError(f"第 {part_number} 片应为 {expected} 字节，实际 {length} 字节")
+        etag = self.client._upload_part(self.bucket, session["object_name"], data.read(length), None,
+                                        upload_id, part_number)
+        return {"upload_id": upload_id, "part_number": part_number, "etag": _etag(etag), "size": length}
+
+    def _list(self, session):
+        parts = []
+        marker = 0
+        while True:
+            result = self.client._list_parts(self.bucket, session["object_name"], session["upload_id"],
+                                             part_number_marker=marker)
+            parts += [{"part_number": p.part_number, "etag": _etag(p.etag), "size": p.size} for p in result.parts]
+            if not result.is_truncated:
+                return sorted(parts, key=lambda p: p["part_number"])
+            marker = result.next_part_number_marker
+
+    def list_parts(self, upload_id, user_id):
+        session = self._session(upload_id, user_id)
+        if session is None:
+            return None
+        plan = {key: session[key] for key in ("upload_id", "filename", "size", "part_size", "part_count")}
+        return {**plan, "parts": self._list(session)}
+
+    def complete(self, upload_id, user_id, parts=None):
+        """按序号合并分片；parts 为空时使用对象存储记录的分片，指定时 ETag 须与已上传分片一致"""
+        session = self._session(upload_id, user_id)
+        if session is None:
+            return None
+        uploaded = {p["part_number"]: p for p in self._list(session)}
+        if parts is None:
+            parts = list(uploaded.values())
+        numbers = sorted(p["part_number"] for p in parts)
+        if numbers != list(range(1, session["part_count"] + 1)):
+            missing = sorted(set(range(1, session["part_count"] + 1)) - set(numbers))
+            raise ValueError(f"分片不完整，缺少 {missing[:20]}" if missing else "分片序号无效")
+        for p in parts:
+            known = uploaded.get(p["part_number"])
+            if known is None or known["etag"] != _etag(p["etag"]):
+                raise ValueError(f"第 {p['part_number']} 片的 ETag 与已上传分片不一致")
+        result = self.client._complete_multipart_upload(
+            self.bucket, session["object_name"], upload_id,
+            [_Part(n, uploaded[n]["etag"]) for n in numbers])
+        self._forget(upload_id)
+        return {"object_name": session["object_name"], "etag": _etag(getattr(result, "etag", None)),
+                "filename": session["filename"], "size": session["size"], "content_type": session["content_type"]}
+
+    def abort(self, upload_id, user_id):
+        session = self._session(upload_id, user_id)
+        if session is None:
+            return False
+        self.client._abort_multipart_upload(self.bucket, session["object_name"], upload_id)
+        self._forget(upload_id)
+        return True
+
+    def spool_object(self, object_name):
+        """把合并后的对象按块复制到临时文件（小对象留在内存），返回已回到开头的文件对象"""
+        response = self.client.get_object(self.bucket, object_name)
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            shutil.copyfileobj(response, spool, COPY_CHUNK_SIZE)
+        except Exception:
+            spool.close()
+            raise
+        finally:
+            response.close()
+            response.release_conn()
+        spool.seek(0)
+        return spool
+
+    def remove_object(self, object_name):
+        self.client.remove_object(self.bucket, object_name)
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_multipart_uploads():
+    """首次使用时按环境变量连接对象存储并建表，导入本模块没有副作用"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                if Minio is None:
+                    raise RuntimeError("分片上传需要安装 minio")
+                client = Minio(os.environ["MINIO_ENDPOINT"], access_key=os.environ["MINIO_ACCESS_KEY"],
+                               secret_key=os.environ["MINIO_SECRET_KEY"],
+                               secure=os.getenv("MINIO_SECURE", "false").lower() in ("1", "true", "yes"))
+                _instance = MultipartUploads(client, os.environ["MINIO_BUCKET"])
+    return _instance
@@ -0,0 +1,129 @@
+"""
+文件传输辅助函数
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from email.utils import parsedate_to_datetime
+
+import anyio
+from fastapi.concurrency import run_in_threadpool
+
+# 下载分块大小：每块跨一次线程池，大块可显著减少 2GB 级文件的迭代次数；限制在 64KB~16MB
+DOWNLOAD_CHUNK_SIZE = min(max(int(os.getenv("FILE_DOWNLOAD_CHUNK_SIZE", 1 << 20)), 64 << 10), 16 << 20)
+HASH_CHUNK_SIZE = 1 << 20
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def parse_range(header):
+    """解析单一字节区间，返回 (start, end)，后缀区间 start 为 None；多区间或格式错误时返回 None，按完整内容响应"""
+    if not header:
+        return None
+    m = _RANGE_RE.fullmatch(header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    start = int(m.group(1)) if m.group(1) else None
+    end = int(m.group(2)) if m.group(2) else None
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+def resolve_range(byte_range, size):
+    """按对象总长度求出闭区间 [start, end]；无法满足（起点越界、bytes=-0）时返回 None，应答 416"""
+    start, end = byte_range
+    if start is None:
+        if not end or not size:
+            return None
+        return max(size - end, 0), size - 1
+    if start >= size:
+        return None
+    return start, size - 1 if end is None else min(end, size - 1)
+
+
+def etag_matches(header, etag, weak=True):
+    """比较 If-None-Match / If-Range 中的 ETag 列表，weak=False 时要求强校验"""
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    if not weak and etag.startswith("W/"):
+        return False
+    strip = (lambda t: t[2:] if t.startswith("W/") else t) if weak else (lambda t: t)
+    return any(strip(t.strip()) == strip(etag) for t in header.split(","))
+
+
+def not_modified_since(header, last_modified):
+    if not header or not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+
+
+def if_range_matches(header, etag, last_modified):
+    """If-Range 为 ETag 时强校验，为日期时要求与 Last-Modified 完全一致"""
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith('"') or header.startswith("W/"):
+        return etag_matches(header, etag, weak=False)
+    return bool(last_modified) and header == last_modified
+
+
+def content_hash(fileobj):
+    """按块顺序读取计算 SHA-256，内存占用与文件大小无关"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_chunk(response, chunk_size):
+    return response.read(chunk_size)
+
+
+def close_response(response):
+    response.close()
+    response.release_conn()
+
+
+async def stream_object(response, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """按大块读取对象存储响应并预读一块：发送当前块时后台线程读取下一块，
+    每个连接最多占用两块内存，客户端消费变慢时读取随之暂停（背压）；
+    区间请求由对象存储按 offset/length 返回，这里只原样转发"""
+    # 取消等待中的任务不会停止已在线程中执行的读取，读取与关闭用同一把锁串行化
+    lock = threading.Lock()
+
+    def read():
+        with lock:
+            return read_chunk(response, chunk_size)
+
+    def close():
+        with lock:
+            close_response(response)
+
+    pending = None
+    try:
+        pending = asyncio.ensure_future(run_in_threadpool(read))
+        while True:
+            chunk = await pending
+            pending = None
+            if not chunk:
+                break
+            pending = asyncio.ensure_future(run_in_threadpool(read))
+            yield chunk
+    finally:
+        # 客户端断开时生成器被取消：屏蔽取消，保证连接总会被关闭并归还连接池
+        with anyio.CancelScope(shield=True):
+            try:
+                if pending is not None:
+                    await asyncio.wait([pending])
+                    if not pending.cancelled():
+                        pending.exception()
+            finally:
+                await run_in_threadpool(close)
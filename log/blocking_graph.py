@@ -0,0 +1,205 @@
+import time
+from collections import defaultdict
+
+class WaitForGraph:
+    # 等待图：边 waiter -> blocker。每次采样只按边的增删做增量更新，
+    # 只重算受影响的根阻塞者；累计阻塞时长用 等待者数 * now - 等待开始时间之和 O(1) 得出
+    def __init__(self):
+        self.waits_for = defaultdict(set)
+        self.blocks = defaultdict(set)
+        self.wait_start = {}
+        self._edges = set()
+        self._roots = {}
+        self._member_of = defaultdict(set)
+        self._cycles = []
+
+    def update(self, edges, now=None):
+        now = time.time() if now is None else now
+        new = set()
+        waited = {}
+        for waiter, blocker, seconds in edges:
+            if waiter == blocker:
+                continue
+            new.add((waiter, blocker))
+            if seconds is not None:
+                waited[waiter] = max(waited.get(waiter, 0.0), seconds)
+        added = new - self._edges
+        removed = self._edges - new
+        if not added and not removed:
+            return self
+        dirty = set()
+        for w, b in removed:
+            dirty |= self._member_of.get(w, set()) | self._member_of.get(b, set())
+            self.waits_for[w].discard(b)
+            self.blocks[b].discard(w)
+            if not self.waits_for[w]:
+                del self.waits_for[w]
+                self.wait_start.pop(w, None)
+            if not self.blocks[b]:
+                del self.blocks[b]
+        for w, b in added:
+            dirty |= self._member_of.get(w, set()) | self._member_of.get(b, set())
+            self.waits_for[w].add(b)
+            self.blocks[b].add(w)
+            if w not in self.wait_start:
+                self.wait_start[w] = now - waited.get(w, 0.0)
+        self._edges = new
+        # 环检测不做增量维护：每次 update（即每个采样快照）在边集差分后至多跑一次全量 Tarjan，
+        # O(会话数 + 边数)，不随单条边的插入重复执行；只删边不会产生新环，没有旧环时跳过
+        if added or self._cycles:
+            self._cycles = self._find_cycles()
+        for w, b in added | removed:
+            dirty |= self._roots_above(b)
+        for r in dirty:
+            self._drop_root(r)
+        for r in self._current_roots():
+            if r not in self._roots:
+                self._compute_root(r)
+        return self
+
+    def _roots_above(self, pid):
+        # 沿 waits_for 向上找到所有根（无阻塞者或处于环中的代表节点）
+        roots = set()
+        stack = [pid]
+        seen = {pid}
+        while stack:
+            node = stack.pop()
+            blockers = self.waits_for.get(node)
+            if not blockers:
+                roots.add(node)
+                continue
+            for b in blockers:
+                if b not in seen:
+                    seen.add(b)
+                    stack.append(b)
+        return roots | {min(c) for c in self._cycles if c & seen}
+
+    def _current_roots(self):
+        roots = {b for b in self.blocks if not self.waits_for.get(b)}
+        # 全部成员都在环内、没有外部根的死锁环，取最小 pid 作为代表
+        for cycle in self._cycles:
+            if all(self.waits_for.get(n, set()) <= cycle for n in cycle):
+                roots.add(min(cycle))
+        return roots
+
+    def _drop_root(self, root):
+        info = self._roots.pop(root, None)
+        if info is None:
+            return
+        for node in info["members"]:
+            self._member_of[node].discard(root)
+            if not self._member_of[node]:
+                del self._member_of[node]
+
+    def _compute_root(self, root):
+        depth = {}
+        order = []
+        # 按 pid 顺序遍历：有环时最长链取决于遍历顺序，固定顺序保证增量与全量计算结果一致
+        stack = [(root, iter(sorted(self.blocks.get(root, ()))))]
+        seen = {root}
+        while stack:
+            node, it = stack[-1]
+            child = next(it, None)
+            if child is None:
+                stack.pop()
+                order.append(node)
+                continue
+            if child in seen:
+                continue
+            seen.add(child)
+            stack.append((child, iter(sorted(self.blocks.get(child, ())))))
+        # 后序遍历求最长等待链（按会话数计），环上的回边忽略
+        for node in order:
+            depth[node] = 1 + max((depth.get(c, 0) for c in self.blocks.get(node, ()) if c != root), default=0)
+        waiters = seen - {root}
+        self._roots[root] = {
+            "members": seen,
+            "waiters": len(waiters),
+            "direct": len(self.blocks.get(root, ())),
+            "chain_length": depth[root],
+            "start_sum": sum(self.wait_start.get(w, 0.0) for w in waiters),
+            "oldest_start": min((self.wait_start.get(w, 0.0) for w in waiters), default=None),
+        }
+        for node in seen:
+            self._member_of[node].add(root)
+
+    def _find_cycles(self):
+        # Tarjan 强连通分量（迭代实现），大小大于 1 的分量即等待环
+        index = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        cycles = []
+        counter = 0
+        for start in list(self.waits_for):
+            if start in index:
+                continue
+            work = [(start, iter(self.waits_for.get(start, ())))]
+            index[start] = low[start] = counter
+            counter += 1
+            stack.append(start)
+            on_stack.add(start)
+            while work:
+                node, it = work[-1]
+                nxt = next(it, None)
+                if nxt is not None:
+                    if nxt not in index:
+                        index[nxt] = low[nxt] = counter
+                        counter += 1
+                        stack.append(nxt)
+                        on_stack.add(nxt)
+                        work.append((nxt, iter(self.waits_for.get(nxt, ()))))
+                    elif nxt in on_stack:
+                        low[node] = min(low[node], index[nxt])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    comp = set()
+                    while True:
+                        n = stack.pop()
+                        on_stack.discard(n)
+                        comp.add(n)
+                        if n == node:
+                            break
+                    if len(comp) > 1:
+                        cycles.append(comp)
+        return cycles
+
+    def snapshot(self, now=None, top=20):
+        now = time.time() if now is None else now
+        roots = []
+        for pid, info in self._roots.items():
+            roots.append({
+                "pid": pid,
+                "direct_waiters": info["direct"],
+                "total_waiters": info["waiters"],
+                "chain_length": info["chain_length"],
+                "cumulative_blocked_s": round(info["waiters"] * now - info["start_sum"], 3),
+                "max_wait_s": round(now - info["oldest_start"], 3) if info["oldest_start"] is not None else 0.0,
+            })
+        roots.sort(key=lambda r: r["cumulative_blocked_s"], reverse=True)
+        return {
+            "waiters": len(self.waits_for),
+            "root_blockers": len(roots),
+            "max_chain_length": max((r["chain_length"] for r in roots), default=0),
+            "cycles": [sorted(c) for c in self._cycles],
+            "roots": roots[:top],
+        }
+
+def evaluate_blocking_alerts(snapshot, max_chain=3, max_cumulative_s=30):
+    # README 告警：阻塞链路长度 > 3 且累计阻塞 > 30s；等待环（死锁）直接告警
+    alerts = [
+        {"root_pid": r["pid"], "chain_length": r["chain_length"], "cumulative_blocked_s": r["cumulative_blocked_s"]}
+        for r in snapshot["roots"]
+        if r["chain_length"] > max_chain and r["cumulative_blocked_s"] > max_cumulative_s
+    ]
+    alerts += [{"cycle": c} for c in snapshot["cycles"]]
+    return alerts
+
+def edges_from_blocking(rows):
+    for row in rows:
+        dur = row.get("blocked_duration")
+        yield row["blocked_pid"], row["blocking_pid"], dur.total_seconds() if dur is not None else None
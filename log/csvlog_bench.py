@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import csvlog_parser as cp
+from csvlog_gen import generate
+
+_TEXT_ENGINES = ("line", "block", "mmap", "parallel")
+_CSVLOG_ENGINES = ("csvlog", "csvlog_profile", "block", "mmap")
+_RECORD_CHUNK = 10000
+
+def _timed_chunks(chunks):
+    lat = []
+    for run in chunks:
+        t0 = time.perf_counter()
+        run()
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+def _run_line(path, min_ms, workers):
+    # 与 parse_log 相同的逐行扫描，按 _RECORD_CHUNK 行分批计时
+    acc = cp._new_acc(50)
+    lat = []
+    lineno = 0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            t0 = time.perf_counter()
+            chunk = list(islice(f, _RECORD_CHUNK))
+            if not chunk:
+                break
+            cp._scan_lines(chunk, min_ms, acc, lineno)
+            lineno += len(chunk)
+            lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+def _timed_range(task):
+    t0 = time.perf_counter()
+    acc = cp._scan_range(task)
+    return acc, (time.perf_counter() - t0) * 1000
+
+def _run_parallel(path, min_ms, workers):
+    # 与 parse_log_parallel 相同的切分与合并，每段在子进程内计时
+    workers = workers or os.cpu_count() or 1
+    parts = max(1, min(workers * 4, os.path.getsize(path) // cp._MIN_RANGE_SIZE))
+    tasks = [(str(path), a, b, min_ms, 50, False, False) for a, b in cp._split_ranges(path, parts)]
+    acc = cp._new_acc(50)
+    lat = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for part, ms in ex.map(_timed_range, tasks):
+            cp._merge_acc(acc, part)
+            lat.append(ms)
+    return lat
+
+def _run_block(path, min_ms, workers):
+    acc = cp._new_acc(50)
+    with open(path, "rb") as f:
+        blocks = cp._iter_blocks(f, 0, os.path.getsize(path))
+        return _timed_chunks(lambda o=o, b=b: cp._scan_block(b, min_ms, acc, o) for o, b in blocks)
+
+def _run_mmap(path, min_ms, workers):
+    parts = max(1, os.path.getsize(path) // cp._BLOCK_SIZE)
+    ranges = cp._split_ranges(path, parts)
+    return _timed_chunks(lambda a=a, b=b: cp._scan_range((str(path), a, b, min_ms, 50, True, False))
+                         for a, b in ranges)
+
+def _run_csvlog(path, min_ms, workers, profile=False):
+    acc = cp._new_acc(50, profile)
+    records = cp.iter_csvlog_records(path)
+    lat = []
+    while True:
+        t0 = time.perf_counter()
+        chunk = list(islice(records, _RECORD_CHUNK))
+        if not chunk:
+            break
+        cp._scan_records(chunk, min_ms, acc)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+ENGINES = {
+    "line": _run_line,
+    "block": _run_block,
+    "mmap": _run_mmap,
+    "parallel": _run_parallel,
+    "csvlog": _run_csvlog,
+    "csvlog_profile": lambda path, min_ms, workers: _run_csvlog(path, min_ms, workers, True),
+}
+
+def _peak_rss_mb():
+    # Linux 下 ru_maxrss 单位为 KB，macOS 为字节；并行引擎的子进程单独取峰值
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) * scale / (1 << 20), 1)
+
+def _p99(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))], 3)
+
+def _child(engine, path, min_ms, workers):
+    t0 = time.perf_counter()
+    lat = ENGINES[engine](Path(path), min_ms, workers)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps({"elapsed_s": elapsed, "chunks": len(lat), "chunk_p99_ms": _p99(lat),
+                      "peak_rss_mb": _peak_rss_mb()}))
+
+def _count_events(path, fmt):
+    if fmt == "csvlog":
+        return sum(1 for _ in cp.iter_csvlog_records(path))
+    with open(path, "rb") as f:
+        return sum(block.count(b"\n") for _, block in cp._iter_blocks(f, 0, os.path.getsize(path)))
+
+def _git_rev():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                             capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def _load_history(results_path):
+    history = []
+    try:
+        with open(results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return history
+
+def _check_regression(entry, history, tolerance):
+    # 与同主机、同引擎、同格式、文件大小相近的最近 5 次结果中位数比较吞吐
+    same = [h for h in history
+            if h.get("engine") == entry["engine"] and h.get("format") == entry["format"]
+            and h.get("host") == entry["host"] and abs(h.get("bytes", 0) - entry["bytes"]) <= entry["bytes"] * 0.05]
+    if not same:
+        return None
+    baseline = statistics.median(h["mb_s"] for h in same[-5:])
+    change = entry["mb_s"] / baseline - 1 if baseline else 0.0
+    return {"baseline_mb_s": round(baseline, 2), "change": round(change, 4), "regressed": change < -tolerance}
+
+def run_bench(path, fmt, engines, min_ms=1000, workers=None, repeat=3, results_path=None, tolerance=0.1):
+    path = Path(path)
+    size = os.path.getsize(path)
+    events = _count_events(path, fmt)
+    history = _load_history(results_path) if results_path else []
+    rev = _git_rev()
+    entries = []
+    for engine in engines:
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run([sys.executable, __file__, "--child", engine, "--path", str(path),
+                                  "--min-duration-ms", str(min_ms), "--workers", str(workers or 0)],
+                                 capture_output=True, text=True)
+            if out.returncode != 0:
+                raise RuntimeError(f"{engine} 运行失败: {out.stderr.strip()[-500:]}")
+            runs.append(json.loads(out.stdout))
+        best = min(runs, key=lambda r: r["elapsed_s"])
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "engine": engine,
+            "format": fmt,
+            "bytes": size,
+            "events": events,
+            "elapsed_s": round(best["elapsed_s"], 4),
+            "mb_s": round(size / (1 << 20) / best["elapsed_s"], 2),
+            "events_s": round(events / best["elapsed_s"]),
+            "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+            "chunk_p99_ms": best["chunk_p99_ms"],
+            "chunks": best["chunks"],
+            "host": platform.node(),
+            "rev": rev,
+        }
+        regression = _check_regression(entry, history, tolerance)
+        entries.append(dict(entry, regression=regression))
+        history.append(entry)
+        if results_path:
+            with open(results_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return entries
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--path", help="基准日志文件，不指定则按 --size-mb 生成合成日志")
+    p.add_argument("--format", choices=["csvlog", "text"], default="csvlog")
+    p.add_argument("--size-mb", type=float, default=256)
+    p.add_argument("--engines", help="逗号分隔，默认按格式选择全部适用引擎")
+    p.add_argument("--min-duration-ms", type=int, default=1000)
+    p.add_argument("--workers", type=int, default=0)
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--results", default="csvlog_bench.jsonl", help="结果追加写入的 JSON Lines 文件")
+    p.add_argument("--tolerance", type=float, default=0.1, help="吞吐下降超过该比例视为回归")
+    p.add_argument("--child", choices=sorted(ENGINES), help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.child:
+        _child(args.child, args.path, args.min_duration_ms, args.workers or None)
+        return
+    path = args.path
+    if not path:
+        suffix = ".csv" if args.format == "csvlog" else ".log"
+        path = f"csvlog_bench_{int(args.size_mb)}mb{suffix}"
+        if not os.path.exists(path):
+            generate(path, args.size_mb, args.format)
+    engines = args.engines.split(",") if args.engines else (
+        _CSVLOG_ENGINES if args.format == "csvlog" else _TEXT_ENGINES)
+    try:
+        entries = run_bench(path, args.format, engines, args.min_duration_ms, args.workers or None,
+                            args.repeat, args.results, args.tolerance)
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False, indent=2))
+        sys.exit(2)
+    print(json.dumps(entries, ensure_ascii=False, indent=2))
+    if any(e["regression"] and e["regression"]["regressed"] for e in entries):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
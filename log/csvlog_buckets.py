@@ -0,0 +1,242 @@
+import argparse
+import json
+import math
+import re
+import time
+from array import array
+
+import numpy as np
+
+from csvlog_parser import CSVLOG_COLUMNS, expand_paths, iter_csvlog_records, open_binary, resolve_format, timestamp_ms
+
+# 耗时直方图分桶边界（毫秒），每桶为左开右闭区间 (e_i, e_i+1]；告警阈值必须是边界之一，
+# build_buckets 会把阈值加入边界
+DURATION_EDGES_MS = (0, 10, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+_FLUSH_EVENTS = 1 << 20
+_ERROR = 1
+_DEADLOCK = 2
+
+_TEXT_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:\.\d+)?)")
+_TEXT_DURATION_RE = re.compile(r"duration:\s*([0-9]+(?:\.[0-9]+)?)\s*ms", re.IGNORECASE)
+_TEXT_ERROR_RE = re.compile(r"\bERROR\b", re.IGNORECASE)
+_TEXT_DEADLOCK_RE = re.compile(r"deadlock detected", re.IGNORECASE)
+
+class TimeBuckets:
+    # 固定宽度时间桶，每桶事件数、错误、死锁与耗时直方图均为紧凑 NumPy 数组
+    def __init__(self, width_s=60, edges=DURATION_EDGES_MS):
+        self.width_ms = int(width_s * 1000)
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.start = None
+        self.events = np.zeros(0, np.int32)
+        self.errors = np.zeros(0, np.int32)
+        self.deadlocks = np.zeros(0, np.int32)
+        self.hist = np.zeros((0, len(self.edges)), np.int32)
+
+    def __len__(self):
+        return len(self.events)
+
+    def _grow(self, lo, hi):
+        # lo 为负时在前面补桶，hi 超出时在后面补桶
+        front = max(0, -lo)
+        back = max(0, hi - len(self.events))
+        if not front and not back:
+            return
+        self.events = np.pad(self.events, (front, back))
+        self.errors = np.pad(self.errors, (front, back))
+        self.deadlocks = np.pad(self.deadlocks, (front, back))
+        self.hist = np.pad(self.hist, ((front, back), (0, 0)))
+        self.start -= front * self.width_ms
+
+    def add_batch(self, ts, durations, flags):
+        ts = np.asarray(ts, dtype=np.int64)
+        if ts.size == 0:
+            return
+        durations = np.asarray(durations, dtype=np.float64)
+        flags = np.asarray(flags, dtype=np.uint8)
+        if self.start is None:
+            self.start = int(ts.min()) // self.width_ms * self.width_ms
+        idx = (ts - self.start) // self.width_ms
+        self._grow(int(idx.min()), int(idx.max()) + 1)
+        idx = (ts - self.start) // self.width_ms
+        n = len(self.events)
+        self.events += np.bincount(idx, minlength=n).astype(np.int32)
+        self.errors += np.bincount(idx[(flags & _ERROR) > 0], minlength=n).astype(np.int32)
+        self.deadlocks += np.bincount(idx[(flags & _DEADLOCK) > 0], minlength=n).astype(np.int32)
+        timed = ~np.isnan(durations)
+        if timed.any():
+            nb = len(self.edges)
+            bins = np.searchsorted(self.edges, durations[timed], side="left") - 1
+            flat = idx[timed] * nb + np.clip(bins, 0, nb - 1)
+            self.hist += np.bincount(flat, minlength=n * nb).reshape(n, nb).astype(np.int32)
+
+    def bucket_time(self, i):
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime((self.start + i * self.width_ms) / 1000))
+
+    def save(self, path):
+        np.savez_compressed(path, start=self.start if self.start is not None else -1, width_ms=self.width_ms,
+                            edges=self.edges, events=self.events, errors=self.errors,
+                            deadlocks=self.deadlocks, hist=self.hist)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        tb = cls(int(data["width_ms"]) / 1000, data["edges"])
+        start = int(data["start"])
+        tb.start = None if start < 0 else start
+        tb.events = data["events"]
+        tb.errors = data["errors"]
+        tb.deadlocks = data["deadlocks"]
+        tb.hist = data["hist"]
+        return tb
+
+class _EventBatch:
+    def __init__(self):
+        self.ts = array("q")
+        self.durations = array("d")
+        self.flags = array("B")
+
+    def add(self, ts, duration, flag):
+        self.ts.append(ts)
+        self.durations.append(duration)
+        self.flags.append(flag)
+
+    def flush_into(self, tb):
+        tb.add_batch(np.frombuffer(self.ts, np.int64), np.frombuffer(self.durations, np.float64),
+                     np.frombuffer(self.flags, np.uint8))
+        self.__init__()
+
+def _collect_csvlog(path, layout, batch, tb):
+    nan = float("nan")
+    for rec in iter_csvlog_records(path, layout):
+        ts = timestamp_ms(rec.timestamp)
+        if ts is None:
+            continue
+        flag = _ERROR if rec.severity == "ERROR" else 0
+        if rec.sqlstate == "40P01" or "deadlock detected" in rec.message:
+            flag |= _DEADLOCK
+        batch.add(ts, nan if rec.duration_ms is None else rec.duration_ms, flag)
+        if len(batch.ts) >= _FLUSH_EVENTS:
+            batch.flush_into(tb)
+
+def _collect_text(path, batch, tb):
+    # 只有带时间前缀的行才是一条记录的开头，续行（多行 SQL、DETAIL 等）不单独计数
+    nan = float("nan")
+    with open_binary(path) as f:
+        for raw in f:
+            line = raw.decode("utf-8", "ignore")
+            m = _TEXT_TS_RE.match(line)
+            if not m:
+                continue
+            ts = timestamp_ms(m.group(1))
+            m = _TEXT_DURATION_RE.search(line)
+            flag = _ERROR if _TEXT_ERROR_RE.search(line) else 0
+            if _TEXT_DEADLOCK_RE.search(line):
+                flag |= _DEADLOCK
+            batch.add(ts, float(m.group(1)) if m else nan, flag)
+            if len(batch.ts) >= _FLUSH_EVENTS:
+                batch.flush_into(tb)
+
+def _edges_with(*thresholds):
+    return tuple(sorted(set(DURATION_EDGES_MS).union(t for t in thresholds if t is not None)))
+
+def build_buckets(spec, width_s=60, fmt="auto", layout="opengauss", slow_ms=None):
+    tb = TimeBuckets(width_s, _edges_with(slow_ms))
+    batch = _EventBatch()
+    for path in expand_paths(spec):
+        if resolve_format(path, fmt) == "csvlog":
+            _collect_csvlog(path, layout, batch, tb)
+        else:
+            _collect_text(path, batch, tb)
+    batch.flush_into(tb)
+    return tb
+
+def _runs(mask, min_len):
+    d = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(d == 1)
+    ends = np.flatnonzero(d == -1)
+    keep = ends - starts >= min_len
+    return starts[keep], ends[keep]
+
+def evaluate_alerts(tb, slow_ms=2000, slow_runs=5, deadlock_window_s=600, deadlock_threshold=1):
+    if slow_ms not in tb.edges:
+        raise ValueError(f"slow_ms={slow_ms} 不是分桶边界，可用边界: {[float(e) for e in tb.edges]}")
+    alerts = {"slow_runs": [], "deadlock_windows": []}
+    if len(tb) == 0:
+        return alerts
+    # 连续 slow_runs 个桶都出现超过 slow_ms 的语句；分桶左开右闭，边界处不计入
+    over = tb.hist[:, tb.edges >= slow_ms].sum(axis=1)
+    starts, ends = _runs(over > 0, slow_runs)
+    for s, e in zip(starts, ends):
+        alerts["slow_runs"].append({
+            "from": tb.bucket_time(s), "to": tb.bucket_time(e),
+            "buckets": int(e - s), "statements": int(over[s:e].sum()),
+        })
+    # 任意 deadlock_window_s 滑动窗口内死锁数达到阈值
+    w = max(1, math.ceil(deadlock_window_s * 1000 / tb.width_ms))
+    c = np.concatenate(([0], np.cumsum(tb.deadlocks, dtype=np.int64)))
+    sums = c[w:] - c[:-w] if len(tb) >= w else c[-1:] - c[:1]
+    starts, ends = _runs(sums >= deadlock_threshold, 1)
+    merged = []
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        stop = min(e - 1 + w, len(tb))
+        if merged and s <= merged[-1][1]:
+            merged[-1][1] = stop
+            merged[-1][2] = max(merged[-1][2], int(sums[s:e].max()))
+        else:
+            merged.append([s, stop, int(sums[s:e].max())])
+    for s, stop, peak in merged:
+        alerts["deadlock_windows"].append({
+            "from": tb.bucket_time(s), "to": tb.bucket_time(stop), "max_in_window": peak,
+        })
+    return alerts
+
+def summarize(tb, series=False):
+    out = {
+        "bucket_seconds": tb.width_ms / 1000,
+        "buckets": len(tb),
+        "from": tb.bucket_time(0) if len(tb) else None,
+        "to": tb.bucket_time(len(tb)) if len(tb) else None,
+        "events": int(tb.events.sum()),
+        "errors": int(tb.errors.sum()),
+        "deadlocks": int(tb.deadlocks.sum()),
+        "duration_histogram": dict(zip((f">{e:g}ms" for e in tb.edges), tb.hist.sum(axis=0).tolist())),
+    }
+    if series:
+        out["series"] = [
+            {"time": tb.bucket_time(i), "events": int(tb.events[i]), "errors": int(tb.errors[i]),
+             "deadlocks": int(tb.deadlocks[i]), "durations": tb.hist[i].tolist()}
+            for i in np.flatnonzero(tb.events)
+        ]
+    return out
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--path", help="日志文件、目录或通配符")
+    p.add_argument("--load", help="从已保存的 .npz 时间桶直接评估告警，不重新扫描日志")
+    p.add_argument("--save", help="把时间桶保存为 .npz")
+    p.add_argument("--bucket-seconds", type=float, default=60)
+    p.add_argument("--format", choices=["auto", "text", "csvlog"], default="auto")
+    p.add_argument("--layout", choices=sorted(CSVLOG_COLUMNS), default="opengauss")
+    p.add_argument("--slow-ms", type=float, default=2000, help="慢语句阈值毫秒数；--load 时必须是已保存的分桶边界")
+    p.add_argument("--slow-runs", type=int, default=5)
+    p.add_argument("--deadlock-window", type=float, default=600, help="死锁告警窗口秒数")
+    p.add_argument("--series", action="store_true", help="输出每个非空时间桶的明细")
+    args = p.parse_args()
+    if not args.path and not args.load:
+        p.error("需要 --path 或 --load")
+    try:
+        tb = TimeBuckets.load(args.load) if args.load else build_buckets(
+            args.path, args.bucket_seconds, args.format, args.layout, args.slow_ms)
+        if args.save:
+            tb.save(args.save)
+        t0 = time.perf_counter()
+        alerts = evaluate_alerts(tb, args.slow_ms, args.slow_runs, args.deadlock_window)
+        result = summarize(tb, args.series)
+        result["alerts"] = alerts
+        result["alert_eval_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+    except Exception as e:
+        result = {"error": str(e)}
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+from pathlib import Path
+
+from csvlog_parser import CSVLOG_COLUMNS, expand_paths, iter_csvlog_records, record_statement, resolve_format, timestamp_ms
+from sql_fingerprint import fingerprint, normalize_sql
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+_DICT_COLUMNS = ("user", "db", "app", "severity", "sqlstate")
+_TEXT_COLUMNS = ("message", "detail", "statement")
+
+def _schema(with_fingerprint):
+    dict_type = pa.dictionary(pa.int32(), pa.string())
+    fields = [
+        pa.field("ts", pa.timestamp("ms")),
+        pa.field("pid", pa.int64()),
+        pa.field("file", dict_type),
+    ]
+    fields += [pa.field(name, dict_type) for name in _DICT_COLUMNS]
+    fields += [pa.field(name, pa.string()) for name in _TEXT_COLUMNS]
+    fields.append(pa.field("duration_ms", pa.float64()))
+    if with_fingerprint:
+        fields.append(pa.field("fingerprint", dict_type))
+    return pa.schema(fields)
+
+def _new_columns(schema):
+    return {name: [] for name in schema.names}
+
+def _to_batch(cols, schema):
+    arrays = []
+    for field in schema:
+        values = cols[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+class _Writer:
+    # .parquet 写 Parquet；其他后缀写 Arrow IPC stream（允许各批次字典不同）。
+    # 先写到 <out>.tmp，成功后再改名，中途出错不会留下残缺的输出文件
+    def __init__(self, out, schema, compression):
+        self.out = str(out)
+        self.tmp = f"{out}.tmp"
+        self.parquet = Path(out).suffix == ".parquet"
+        if self.parquet:
+            self._w = pq.ParquetWriter(self.tmp, schema, compression=compression)
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=None if compression == "none" else compression)
+            self._w = pa.ipc.new_stream(self.tmp, schema, options=options)
+
+    def write(self, batch):
+        if self.parquet:
+            self._w.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._w.write_batch(batch)
+
+    def commit(self):
+        self._w.close()
+        os.replace(self.tmp, self.out)
+
+    def abort(self):
+        try:
+            self._w.close()
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+
+def export_records(spec, out, layout="opengauss", batch_size=65536, compression="zstd", with_fingerprint=False):
+    if pa is None:
+        return {"error": "列式导出需要安装 pyarrow"}
+    schema = _schema(with_fingerprint)
+    rows = 0
+    batches = 0
+    files = []
+    skipped = []
+    writer = None
+    try:
+        writer = _Writer(out, schema, compression)
+        cols = _new_columns(schema)
+        for path in expand_paths(spec):
+            if resolve_format(path, "auto") != "csvlog":
+                skipped.append(str(path))
+                continue
+            files.append(str(path))
+            name = str(path)
+            for rec in iter_csvlog_records(path, layout):
+                cols["ts"].append(timestamp_ms(rec.timestamp))
+                cols["pid"].append(rec.pid)
+                cols["file"].append(name)
+                for col in _DICT_COLUMNS + _TEXT_COLUMNS:
+                    cols[col].append(getattr(rec, col))
+                cols["duration_ms"].append(rec.duration_ms)
+                if with_fingerprint:
+                    fp = None
+                    if rec.duration_ms is not None:
+                        normalized = normalize_sql(record_statement(rec))
+                        fp = fingerprint(normalized) if normalized else None
+                    cols["fingerprint"].append(fp)
+                if len(cols["ts"]) >= batch_size:
+                    writer.write(_to_batch(cols, schema))
+                    rows += len(cols["ts"])
+                    batches += 1
+                    cols = _new_columns(schema)
+        if cols["ts"]:
+            writer.write(_to_batch(cols, schema))
+            rows += len(cols["ts"])
+            batches += 1
+        writer.commit()
+    except Exception as e:
+        if writer is not None:
+            try:
+                writer.abort()
+            except Exception:
+                pass
+        return {"error": str(e)}
+    return {"out": str(out), "rows": rows, "batches": batches, "files": files, "skipped": skipped}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--path", required=True, help="csvlog 文件、目录或通配符，支持 .gz/.zst")
+    p.add_argument("--out", required=True, help="输出文件，.parquet 为 Parquet，其他为 Arrow IPC stream")
+    p.add_argument("--layout", choices=sorted(CSVLOG_COLUMNS), default="opengauss")
+    p.add_argument("--batch-size", type=int, default=65536)
+    p.add_argument("--compression", default="zstd", help="Parquet 支持 zstd/snappy/lz4/none，Arrow 支持 zstd/lz4/none")
+    p.add_argument("--fingerprint", action="store_true", help="为慢 SQL 附加指纹列")
+    args = p.parse_args()
+    result = export_records(args.path, args.out, args.layout, args.batch_size, args.compression, args.fingerprint)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import calendar
+import csv
+import io
+import json
+import random
+import time
+
+_USERS = ("app", "report", "etl", "admin")
+_DBS = ("orders", "crm", "audit")
+_APPS = ("gateway", "batch", "gsql", "jdbc")
+_STATEMENTS = (
+    "SELECT * FROM orders WHERE id = {n}",
+    "SELECT o.id, o.amount FROM orders o JOIN customers c ON c.id = o.customer_id WHERE c.region = '{s}' AND o.created_at > '2024-01-{d:02d}'",
+    "UPDATE accounts SET balance = balance - {n} WHERE id = {m}",
+    "INSERT INTO audit_log (user_id, action, payload) VALUES ({n}, '{s}', '{{\"k\": {m}}}')",
+    "SELECT count(*) FROM events WHERE type IN ({ids})",
+    "DELETE FROM sessions WHERE last_seen < now() - interval '{d} days'",
+)
+_NOISE = (
+    "checkpoint starting: time",
+    "connection authorized: user=app database=orders",
+    "disconnection: session time: 0:00:0{d}.123",
+    "automatic vacuum of table \"orders.public.events\": index scans: {d}",
+)
+
+def _statement(rnd, multiline):
+    tpl = rnd.choice(_STATEMENTS)
+    sql = tpl.format(n=rnd.randint(1, 10 ** 6), m=rnd.randint(1, 10 ** 4), d=rnd.randint(1, 28),
+                     s=rnd.choice(("north", "south", "east", "west")),
+                     ids=", ".join(str(rnd.randint(1, 500)) for _ in range(rnd.randint(1, 8))))
+    if multiline:
+        sql = sql.replace(" FROM ", "\n  FROM ").replace(" WHERE ", "\n WHERE ")
+    return sql
+
+def _events(rnd, slow_ratio, multiline_ratio, deadlock_rate, error_rate, min_ms):
+    # 产出 (severity, sqlstate, message, detail, statement)
+    while True:
+        r = rnd.random()
+        multiline = rnd.random() < multiline_ratio
+        if r < deadlock_rate:
+            a, b = rnd.randint(1000, 60000), rnd.randint(1000, 60000)
+            yield ("ERROR", "40P01", "deadlock detected",
+                   f"Process {a} waits for ShareLock on transaction {b}; blocked by process {b}.\n"
+                   f"Process {b} waits for ShareLock on transaction {a}; blocked by process {a}.",
+                   _statement(rnd, multiline))
+        elif r < deadlock_rate + error_rate:
+            yield ("ERROR", "23505", "duplicate key value violates unique constraint \"orders_pkey\"",
+                   f"Key (id)=({rnd.randint(1, 10 ** 6)}) already exists.", _statement(rnd, multiline))
+        elif r < deadlock_rate + error_rate + slow_ratio:
+            ms = min_ms * rnd.lognormvariate(0, 1.2)
+            yield ("LOG", "00000", f"duration: {ms:.3f} ms  statement: {_statement(rnd, multiline)}", "", "")
+        else:
+            yield ("LOG", "00000", rnd.choice(_NOISE).format(d=rnd.randint(1, 9)), "", "")
+
+def _fmt_ts(t):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t)) + f".{int(t * 1000) % 1000:03d} CST"
+
+def _csvlog_row(t, pid, user, db, app, event, line_no):
+    sev, state, msg, detail, stmt = event
+    ts = _fmt_ts(t)
+    return [ts, "dn_6001", user, db, pid, "10.0.0.8:53412", f"{int(t):x}.{pid}", line_no, "SELECT",
+            ts, f"3/{line_no}", "0", "0", "postgres", sev, state, msg, detail, "", "", "", "", stmt, "", "", app]
+
+def _text_lines(t, pid, user, db, app, event):
+    sev, state, msg, detail, stmt = event
+    prefix = f"{_fmt_ts(t)} [{pid}] user={user},db={db},app={app},client=10.0.0.8 "
+    # 多行内容按 stderr 日志习惯以制表符缩进续行
+    out = [prefix + f"{sev}:  " + msg.replace("\n", "\n\t")]
+    if detail:
+        out.append(prefix + "DETAIL:  " + detail.replace("\n", "\n\t"))
+    if stmt:
+        out.append(prefix + "STATEMENT:  " + stmt.replace("\n", "\n\t"))
+    return "\n".join(out) + "\n"
+
+def generate(out, size_mb=64, fmt="csvlog", slow_ratio=0.05, multiline_ratio=0.1, deadlock_rate=0.0005,
+             error_rate=0.01, min_ms=1000, events_per_sec=200, seed=42, start="2024-01-01 00:00:00"):
+    rnd = random.Random(seed)
+    target = int(size_mb * (1 << 20))
+    t = calendar.timegm(time.strptime(start, "%Y-%m-%d %H:%M:%S"))
+    events = _events(rnd, slow_ratio, multiline_ratio, deadlock_rate, error_rate, min_ms)
+    counts = {"records": 0, "durations": 0, "errors": 0, "deadlocks": 0}
+    written = 0
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    with open(out, "w", encoding="utf-8", newline="") as f:
+        while written < target:
+            for _ in range(1000):
+                t += rnd.expovariate(events_per_sec)
+                event = next(events)
+                pid = str(rnd.randint(1000, 60000))
+                user, db, app = rnd.choice(_USERS), rnd.choice(_DBS), rnd.choice(_APPS)
+                counts["records"] += 1
+                if event[0] == "ERROR":
+                    counts["errors"] += 1
+                    counts["deadlocks"] += event[1] == "40P01"
+                elif event[2].startswith("duration"):
+                    counts["durations"] += 1
+                if fmt == "csvlog":
+                    writer.writerow(_csvlog_row(t, pid, user, db, app, event, counts["records"]))
+                else:
+                    buf.write(_text_lines(t, pid, user, db, app, event))
+            data = buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            f.write(data)
+            written += len(data.encode("utf-8"))
+    counts["bytes"] = written
+    counts["file"] = str(out)
+    return counts
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--out", required=True)
+    p.add_argument("--size-mb", type=float, default=64)
+    p.add_argument("--format", choices=["csvlog", "text"], default="csvlog")
+    p.add_argument("--slow-ratio", type=float, default=0.05, help="慢 SQL 记录占比")
+    p.add_argument("--multiline-ratio", type=float, default=0.1, help="多行语句/错误栈占比")
+    p.add_argument("--deadlock-rate", type=float, default=0.0005, help="死锁记录占比")
+    p.add_argument("--error-rate", type=float, default=0.01, help="其他 ERROR 记录占比")
+    p.add_argument("--min-duration-ms", type=float, default=1000, help="慢 SQL 耗时分布的中位数")
+    p.add_argument("--events-per-sec", type=float, default=200, help="日志时间戳推进速率")
+    p.add_argument("--seed", type=int, default=42)
+    args = p.parse_args()
+    result = generate(args.out, args.size_mb, args.format, args.slow_ratio, args.multiline_ratio,
+                      args.deadlock_rate, args.error_rate, args.min_duration_ms, args.events_per_sec, args.seed)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,658 @@
 import argparse
+import calendar
+import csv
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import mmap
+import os
 import re
 import json
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 
-def parse_log(path, min_ms):
-    duration_re = re.compile(r"duration:\s*([0-9]+(?:\.[0-9]+)?)\s*ms", re.IGNORECASE)
-    deadlock_re = re.compile(r"deadlock detected", re.IGNORECASE)
-    error_re = re.compile(r"\bERROR\b", re.IGNORECASE)
-    slow = []
-    errors = 0
-    deadlocks = 0
+from metrics_store import record
+from sql_fingerprint import SlowQueryProfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_EVENT_RE = re.compile(
+    rb"duration:\s*([0-9]+(?:\.[0-9]+)?)\s*ms|(deadlock detected)|\bERROR\b",
+    re.IGNORECASE,
+)
+_BLOCK_SIZE = 8 << 20
+# 跟踪模式下用文件开头这么多字节的摘要识别 copytruncate 后被重写的文件
+_HEAD_BYTES = 1024
+_MIN_RANGE_SIZE = 1 << 20
+_LOG_SUFFIXES = (".log", ".csv")
+_COMPRESSED_SUFFIXES = (".gz", ".zst")
+_DURATION_RE = re.compile(r"duration:\s*([0-9]+(?:\.[0-9]+)?)\s*ms", re.IGNORECASE)
+_DEADLOCK_RE = re.compile(r"deadlock detected", re.IGNORECASE)
+_ERROR_RE = re.compile(r"\bERROR\b", re.IGNORECASE)
+_STATEMENT_RE = re.compile(
+    r"duration:\s*[0-9.]+\s*ms\s+(?:statement|(?:execute|parse|bind)[^:]*):\s*(.*)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+CsvlogRecord = namedtuple("CsvlogRecord", [
+    "timestamp", "pid", "user", "db", "app", "severity", "sqlstate",
+    "message", "detail", "statement", "duration_ms",
+])
+_RECORD_FIELDS = CsvlogRecord._fields[:-1]
+
+# 各版本 csvlog 的列位置，按列数区分；PostgreSQL 新版本只在末尾追加列
+CSVLOG_COLUMNS = {
+    "opengauss": {
+        25: {"timestamp": 0, "user": 2, "db": 3, "pid": 4, "severity": 13, "sqlstate": 14,
+             "message": 15, "detail": 16, "statement": 21, "app": 24},
+        26: {"timestamp": 0, "user": 2, "db": 3, "pid": 4, "severity": 14, "sqlstate": 15,
+             "message": 16, "detail": 17, "statement": 22, "app": 25},
+    },
+    "postgres": {
+        n: {"timestamp": 0, "user": 1, "db": 2, "pid": 3, "severity": 11, "sqlstate": 12,
+            "message": 13, "detail": 14, "statement": 19, "app": 22}
+        for n in (23, 24, 26)
+    },
+}
+
+class _TopK:
+    # 固定容量的最小堆，只保留耗时最大的 k 条；同耗时按出现顺序优先保留靠前的
+    def __init__(self, k):
+        self.k = k
+        self.count = 0
+        self._heap = []
+
+    def would_keep(self, ms):
+        return self.k > 0 and (len(self._heap) < self.k or ms > self._heap[0][0])
+
+    def add(self, ms, seq, line):
+        self.count += 1
+        if self.would_keep(ms):
+            self._push((ms, -seq, line))
+
+    def _push(self, item):
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        else:
+            heapq.heapreplace(self._heap, item)
+
+    def merge(self, other):
+        self.count += other.count
+        for item in other._heap:
+            if self.would_keep(item[0]):
+                self._push(item)
+        return self
+
+    def items(self):
+        ordered = sorted(self._heap, key=lambda x: (-x[0], -x[1]))
+        return [{"duration_ms": ms, "line": line} for ms, _, line in ordered]
+
+    def dump(self):
+        return {"count": self.count, "heap": [list(item) for item in self._heap]}
+
+    @classmethod
+    def load(cls, k, data):
+        topk = cls(k)
+        for ms, neg_seq, line in (data or {}).get("heap", []):
+            if topk.would_keep(ms):
+                topk._push((ms, neg_seq, line))
+        topk.count = (data or {}).get("count", 0)
+        return topk
+
+def parse_log(path, min_ms, top=50, profile=False):
+    acc = _new_acc(top, profile)
     try:
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                m = duration_re.search(line)
-                if m:
-                    ms = float(m.group(1))
-                    if ms >= min_ms:
-                        slow.append({"duration_ms": ms, "line": line.strip()[:1000]})
-                if error_re.search(line):
-                    errors += 1
-                if deadlock_re.search(line):
-                    deadlocks += 1
+            _scan_lines(f, min_ms, acc)
     except Exception as e:
         return {"error": str(e)}
-    slow.sort(key=lambda x: x["duration_ms"], reverse=True)
+    return _acc_result(path, min_ms, acc)
+
+def _scan_lines(lines, min_ms, acc, start=0):
+    # start 为第一行的行号，分批调用时保证同耗时语句仍按出现顺序取舍
+    slow = acc["slow"]
+    errors = 0
+    deadlocks = 0
+    for lineno, line in enumerate(lines, start):
+        m = _DURATION_RE.search(line)
+        if m:
+            ms = float(m.group(1))
+            if ms >= min_ms:
+                slow.add(ms, lineno, line.strip()[:1000])
+                _profile_add(acc, line, ms)
+        if _ERROR_RE.search(line):
+            errors += 1
+        if _DEADLOCK_RE.search(line):
+            deadlocks += 1
+    acc["errors"] += errors
+    acc["deadlocks"] += deadlocks
+    return acc
+
+def _new_acc(top, profile=False):
+    return {"slow": _TopK(top), "errors": 0, "deadlocks": 0,
+            "profile": SlowQueryProfile() if profile else None}
+
+def _merge_acc(acc, part):
+    acc["slow"].merge(part["slow"])
+    acc["errors"] += part["errors"]
+    acc["deadlocks"] += part["deadlocks"]
+    if acc["profile"] is not None and part["profile"] is not None:
+        acc["profile"].merge(part["profile"])
+    return acc
+
+def _profile_add(acc, text, ms):
+    if acc["profile"] is None:
+        return
+    m = _STATEMENT_RE.search(text)
+    if m:
+        acc["profile"].add(m.group(1), ms)
+
+def _build_result(path, min_ms, slow, errors, deadlocks):
     return {
         "file": str(path),
         "min_duration_ms": min_ms,
-        "slow_count": len(slow),
-        "slow_top": slow[:50],
+        "slow_count": slow.count,
+        "slow_top": slow.items(),
         "errors": errors,
         "deadlocks": deadlocks,
     }
 
+def _acc_result(path, min_ms, acc):
+    result = _build_result(path, min_ms, acc["slow"], acc["errors"], acc["deadlocks"])
+    if acc["profile"] is not None:
+        result["profile"] = acc["profile"].top(acc["slow"].k)
+    return result
+
+def _scan_block(buf, min_ms, acc, base=0, pos=0, endpos=None):
+    # 单个组合正则扫描整块字节，按行首去重，保持与逐行匹配相同的计数语义；
+    # buf 可以是 bytes 或 mmap，只有命中的慢 SQL 行才会被切片并解码
+    if endpos is None:
+        endpos = len(buf)
+    last_dur = last_err = last_dl = -1
+    for m in _EVENT_RE.finditer(buf, pos, endpos):
+        start = max(buf.rfind(b"\n", pos, m.start()) + 1, pos)
+        if m.group(1) is not None:
+            if start == last_dur:
+                continue
+            last_dur = start
+            ms = float(m.group(1))
+            if ms < min_ms:
+                continue
+            slow = acc["slow"]
+            profile = acc["profile"] is not None
+            if profile or slow.would_keep(ms):
+                end = buf.find(b"\n", m.end(), endpos)
+                if end < 0:
+                    end = endpos
+                line = buf[start:end].decode("utf-8", "ignore").strip()
+                slow.add(ms, base + start, line[:1000])
+                _profile_add(acc, line, ms)
+            else:
+                slow.count += 1
+        elif m.group(2) is not None:
+            if start != last_dl:
+                last_dl = start
+                acc["deadlocks"] += 1
+        elif start != last_err:
+            last_err = start
+            acc["errors"] += 1
+
+def _iter_blocks(f, start, end, block_size=_BLOCK_SIZE):
+    if f.tell() != start:
+        f.seek(start)
+    pos = start
+    tail = b""
+    while pos < end:
+        data = f.read(min(block_size, end - pos))
+        if not data:
+            break
+        pos += len(data)
+        if tail:
+            data = tail + data
+        cut = data.rfind(b"\n") + 1
+        if cut == 0:
+            tail = data
+            continue
+        tail = data[cut:]
+        yield pos - len(data), data[:cut]
+    if tail:
+        yield pos - len(tail), tail
+
+def _split_ranges(path, parts):
+    size = os.path.getsize(path)
+    cuts = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, cuts[-1]))
+            f.readline()
+            cuts.append(min(f.tell(), size))
+    cuts.append(size)
+    return [(a, b) for a, b in zip(cuts, cuts[1:]) if a < b]
+
+def _scan_mapped(f, start, end, min_ms, acc):
+    if end <= start:
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        _scan_block(mm, min_ms, acc, 0, start, end)
+
+def _scan_range(task):
+    path, start, end, min_ms, top, use_mmap, profile = task
+    acc = _new_acc(top, profile)
+    with open(path, "rb") as f:
+        if use_mmap:
+            _scan_mapped(f, start, end, min_ms, acc)
+        else:
+            for offset, block in _iter_blocks(f, start, end):
+                _scan_block(block, min_ms, acc, offset)
+    return acc
+
+def parse_log_mmap(path, min_ms, top=50, profile=False):
+    try:
+        acc = _scan_range((str(path), 0, os.path.getsize(path), min_ms, top, True, profile))
+    except Exception as e:
+        return {"error": str(e)}
+    return _acc_result(path, min_ms, acc)
+
+def parse_log_parallel(path, min_ms, workers=None, top=50, use_mmap=False, profile=False):
+    workers = workers or os.cpu_count() or 1
+    try:
+        size = os.path.getsize(path)
+        parts = max(1, min(workers * 4, size // _MIN_RANGE_SIZE))
+        tasks = [(str(path), a, b, min_ms, top, use_mmap, profile) for a, b in _split_ranges(path, parts)]
+        # 小文件只切出一段时不值得启动进程池
+        if len(tasks) <= 1:
+            partials = list(map(_scan_range, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                partials = list(ex.map(_scan_range, tasks))
+    except Exception as e:
+        return {"error": str(e)}
+    acc = _new_acc(top, profile)
+    for part in partials:
+        _merge_acc(acc, part)
+    return _acc_result(path, min_ms, acc)
+
+def _csvlog_getter(layout, ncols, cache):
+    key = (layout, ncols)
+    if key not in cache:
+        cols = CSVLOG_COLUMNS[layout].get(ncols)
+        cache[key] = itemgetter(*(cols[k] for k in _RECORD_FIELDS)) if cols else None
+    return cache[key]
+
+def iter_csvlog_records(path, layout="opengauss"):
+    if Path(path).suffix in _COMPRESSED_SUFFIXES:
+        with open_binary(Path(path)) as f:
+            yield from _iter_csv_rows(io.TextIOWrapper(f, encoding="utf-8", errors="ignore", newline=""), layout)
+        return
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="", buffering=_BLOCK_SIZE) as f:
+        yield from _iter_csv_rows(f, layout)
+
+_TS_CACHE = {}
+
+def timestamp_ms(ts):
+    # 按数据库服务器本地时间解释（忽略时区缩写），同一秒内的记录复用解析结果
+    key = ts[:19]
+    base = _TS_CACHE.get(key)
+    if base is None:
+        try:
+            base = calendar.timegm(time.strptime(key, "%Y-%m-%d %H:%M:%S")) * 1000
+        except ValueError:
+            return None
+        if len(_TS_CACHE) > 100000:
+            _TS_CACHE.clear()
+        _TS_CACHE[key] = base
+    frac = ts[20:23].split(" ", 1)[0]
+    if ts[19:20] == "." and frac.isdigit():
+        base += int(frac.ljust(3, "0"))
+    return base
+
+def _iter_csv_rows(f, layout):
+    # 交给 C 实现的 csv 模块处理引号内换行，一条多行错误栈只产生一条记录
+    csv.field_size_limit(max(csv.field_size_limit(), 64 << 20))
+    getters = {}
+    for row in csv.reader(f):
+        getter = _csvlog_getter(layout, len(row), getters)
+        if getter is None:
+            continue
+        ts, pid, user, db, app, sev, state, msg, detail, stmt = getter(row)
+        duration_ms = None
+        if "duration" in msg:
+            m = _DURATION_RE.search(msg)
+            if m:
+                duration_ms = float(m.group(1))
+        yield CsvlogRecord(ts, int(pid) if pid.isdigit() else None, user, db, app,
+                           sev, state, msg, detail, stmt, duration_ms)
+
+def record_statement(rec):
+    m = _STATEMENT_RE.search(rec.message)
+    return m.group(1) if m else rec.statement
+
+def _record_line(rec):
+    line = f"{rec.timestamp} [{rec.pid}] user={rec.user},db={rec.db},app={rec.app} {rec.severity}:  {rec.message}"
+    return line[:1000]
+
+def _scan_records(records, min_ms, acc, seq=0):
+    slow = acc["slow"]
+    for rec in records:
+        if rec.duration_ms is not None and rec.duration_ms >= min_ms:
+            if slow.would_keep(rec.duration_ms):
+                slow.add(rec.duration_ms, seq, _record_line(rec))
+            else:
+                slow.count += 1
+            if acc["profile"] is not None:
+                acc["profile"].add(record_statement(rec), rec.duration_ms)
+        if rec.severity == "ERROR":
+            acc["errors"] += 1
+        if rec.sqlstate == "40P01" or "deadlock detected" in rec.message:
+            acc["deadlocks"] += 1
+        seq += 1
+    return seq
+
+def parse_csvlog(path, min_ms, top=50, layout="opengauss", profile=False):
+    acc = _new_acc(top, profile)
+    try:
+        _scan_records(iter_csvlog_records(path, layout), min_ms, acc)
+    except Exception as e:
+        return {"error": str(e)}
+    return _acc_result(path, min_ms, acc)
+
+def _csv_record_cut(buf):
+    # csv 以成对双引号转义，换行前的引号数为偶数时才处于记录边界
+    quotes = buf.count(b'"')
+    end = len(buf)
+    while True:
+        nl = buf.rfind(b"\n", 0, end)
+        if nl < 0:
+            return 0
+        quotes -= buf.count(b'"', nl, end)
+        if quotes % 2 == 0:
+            return nl + 1
+        end = nl
+
+def _consume_text(f, offset, size, min_ms, acc, seq, final):
+    if size <= offset:
+        return offset, seq
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = size if final else mm.rfind(b"\n", offset, size) + 1
+        if end > offset:
+            _scan_block(mm, min_ms, acc, seq - offset, offset, end)
+    end = max(end, offset)
+    return end, seq + end - offset
+
+def _consume_csvlog(f, offset, size, min_ms, acc, seq, final, layout):
+    f.seek(offset)
+    done = offset
+    remaining = size - offset
+    buf = b""
+    while remaining > 0:
+        chunk = f.read(min(_BLOCK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        buf += chunk
+        cut = len(buf) if final and remaining == 0 else _csv_record_cut(buf)
+        if cut:
+            text = io.StringIO(buf[:cut].decode("utf-8", "ignore"), newline="")
+            _scan_records(_iter_csv_rows(text, layout), min_ms, acc, seq)
+            seq += cut
+            done += cut
+            buf = buf[cut:]
+    return done, seq
+
+def _consume(path, offset, min_ms, acc, seq, fmt, layout, final=False):
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if resolve_format(path, fmt) == "csvlog":
+            return _consume_csvlog(f, offset, size, min_ms, acc, seq, final, layout)
+        return _consume_text(f, offset, size, min_ms, acc, seq, final)
+
+def resolve_format(path, fmt):
+    if fmt == "auto":
+        suffixes = Path(path).suffixes
+        if suffixes and suffixes[-1] in _COMPRESSED_SUFFIXES:
+            suffixes = suffixes[:-1]
+        return "csvlog" if suffixes and suffixes[-1] == ".csv" else "text"
+    return fmt
+
+def _follow_targets(path):
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if p.is_file() and p.suffix in _LOG_SUFFIXES)
+    return [path]
+
+def _find_by_inode(directory, inode):
+    for p in directory.iterdir():
+        try:
+            if p.is_file() and p.stat().st_ino == inode:
+                return p
+        except OSError:
+            continue
+    return None
+
+def _head_digest(path, offset):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(min(offset, _HEAD_BYTES))).hexdigest()
+
+def _resume_offset(target, st, ck):
+    # 文件变短或开头内容变了（copytruncate 后又写入超过原偏移）都说明已是新内容，从头读
+    if not ck or st.st_size < ck["offset"]:
+        return 0
+    if "head" in ck and _head_digest(target, ck["offset"]) != ck["head"]:
+        return 0
+    return ck["offset"]
+
+def _load_state(state_path):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(state_path, state):
+    tmp = f"{state_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp, state_path)
+
+def follow_log(path, min_ms, top=50, state_path=None, fmt="auto", layout="opengauss", profile=False):
+    # 每个文件记录 inode 与已处理偏移（停在最后一个完整行/记录之后，不完整的尾部留到下次），
+    # 每次只处理新增字节，并把增量累加到持久化的滚动汇总中
+    path = Path(path)
+    state_path = Path(state_path) if state_path else path.parent / f"{path.name}.offset"
+    state = _load_state(state_path)
+    if state.get("min_duration_ms") != min_ms:
+        # 阈值变化后旧汇总不再可比，偏移一并清空，按新阈值从头统计
+        state = {}
+    total = _TopK.load(top, state.get("slow"))
+    acc = _new_acc(top, profile)
+    seq = state.get("seq", 0)
+    checkpoints = state.get("files", {})
+    by_inode = {ck["inode"]: ck for ck in checkpoints.values()}
+    files = {}
+    new_bytes = 0
+    try:
+        targets = [(t, t.stat()) for t in _follow_targets(path)]
+        live = {st.st_ino for _, st in targets}
+        for target, st in targets:
+            ck = checkpoints.get(str(target))
+            if ck and ck["inode"] != st.st_ino:
+                # 按重命名方式轮转：旧文件若仍在跟踪范围内（目录模式下改名后仍是 .log/.csv），
+                # 由它自己按原偏移继续读；否则在这里把剩余部分处理完
+                if ck["inode"] not in live:
+                    old = _find_by_inode(target.parent, ck["inode"])
+                    if old is not None:
+                        end, seq = _consume(old, ck["offset"], min_ms, acc, seq, resolve_format(target, fmt), layout, final=True)
+                        new_bytes += end - ck["offset"]
+                ck = None
+            # 目录中改名后的文件按 inode 找回原偏移，避免从头重复统计
+            ck = ck or by_inode.get(st.st_ino)
+            offset = _resume_offset(target, st, ck)
+            end, seq = _consume(target, offset, min_ms, acc, seq, fmt, layout)
+            new_bytes += end - offset
+            files[str(target)] = {"inode": st.st_ino, "offset": end, "head": _head_digest(target, end)}
+    except Exception as e:
+        return {"error": str(e)}
+    total.merge(acc["slow"])
+    errors = state.get("errors", 0) + acc["errors"]
+    deadlocks = state.get("deadlocks", 0) + acc["deadlocks"]
+    since = state.get("since") or time.strftime("%Y-%m-%d %H:%M:%S")
+    new_state = {
+        "min_duration_ms": min_ms,
+        "since": since,
+        "seq": seq,
+        "files": files,
+        "slow": total.dump(),
+        "errors": errors,
+        "deadlocks": deadlocks,
+    }
+    total_profile = None
+    if profile:
+        total_profile = SlowQueryProfile.load(state.get("profile")).merge(acc["profile"])
+        new_state["profile"] = total_profile.dump()
+    _save_state(state_path, new_state)
+    result = _build_result(path, min_ms, total, errors, deadlocks)
+    if total_profile is not None:
+        result["profile"] = total_profile.top(top)
+    result["since"] = since
+    result["new"] = {
+        "bytes": new_bytes,
+        "slow_count": acc["slow"].count,
+        "slow_top": acc["slow"].items(),
+        "errors": acc["errors"],
+        "deadlocks": acc["deadlocks"],
+    }
+    return result
+
+def _is_log_file(p):
+    name = p.name
+    for ext in _COMPRESSED_SUFFIXES:
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return p.is_file() and name.endswith(_LOG_SUFFIXES)
+
+def expand_paths(spec):
+    path = Path(spec)
+    if path.is_dir():
+        return sorted(p for p in path.iterdir() if _is_log_file(p))
+    if glob.has_magic(str(spec)):
+        return sorted(p for p in map(Path, glob.glob(str(spec))) if p.is_file())
+    return [path]
+
+def open_binary(path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("读取 .zst 日志需要安装 zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb", buffering=0)
+
+def _scan_file(task):
+    path, min_ms, top, fmt, layout, use_mmap, profile = task
+    path = Path(path)
+    acc = _new_acc(top, profile)
+    try:
+        compressed = path.suffix in _COMPRESSED_SUFFIXES
+        if resolve_format(path, fmt) == "csvlog":
+            _scan_records(iter_csvlog_records(path, layout), min_ms, acc)
+        elif use_mmap and not compressed:
+            with open(path, "rb") as f:
+                _scan_mapped(f, 0, os.fstat(f.fileno()).st_size, min_ms, acc)
+        else:
+            with open_binary(path) as f:
+                for offset, block in _iter_blocks(f, 0, float("inf")):
+                    _scan_block(block, min_ms, acc, offset)
+    except Exception as e:
+        return {"file": str(path), "error": str(e)}, None
+    return _acc_result(path, min_ms, acc), acc
+
+def parse_paths(spec, min_ms, top=50, workers=None, fmt="auto", layout="opengauss", use_mmap=False, profile=False):
+    # 按文件分发到进程池，大文件优先以均衡负载；汇总每个文件的结果与全局 Top-K
+    workers = workers or os.cpu_count() or 1
+    try:
+        files = sorted(expand_paths(spec), key=lambda p: p.stat().st_size, reverse=True)
+    except Exception as e:
+        return {"error": str(e)}
+    tasks = [(str(p), min_ms, top, fmt, layout, use_mmap, profile) for p in files]
+    if workers == 1 or len(tasks) <= 1:
+        outputs = list(map(_scan_file, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+            outputs = list(ex.map(_scan_file, tasks))
+    acc = _new_acc(top, profile)
+    for _, part in outputs:
+        if part is not None:
+            _merge_acc(acc, part)
+    result = _acc_result(spec, min_ms, acc)
+    result["files"] = sorted((r for r, _ in outputs), key=lambda r: r["file"])
+    return result
+
+def _store_result(store, spec, result):
+    # 只在增量模式下记录本轮新增计数；一次性扫描每次都从头统计，写入时序库会重复累计
+    if not store or "error" in result:
+        return
+    counts = result["new"]
+    record(store, {
+        "csvlog.slow_count": counts.get("slow_count"),
+        "csvlog.errors": counts.get("errors"),
+        "csvlog.deadlocks": counts.get("deadlocks"),
+        "csvlog.new_bytes": counts.get("bytes"),
+    }, {"path": str(spec)})
+
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("--path", required=True)
+    p.add_argument("--path", required=True, help="日志文件、目录或通配符，支持 .gz/.zst")
     p.add_argument("--min-duration-ms", type=int, default=1000)
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                   help="并行进程数，默认使用全部 CPU，1 表示单进程顺序扫描")
+    p.add_argument("--top", type=int, default=50, help="保留的慢 SQL 条数")
+    p.add_argument("--format", choices=["auto", "text", "csvlog"], default="auto",
+                   help="日志格式，auto 按 .csv 后缀识别 csvlog")
+    p.add_argument("--layout", choices=sorted(CSVLOG_COLUMNS), default="opengauss", help="csvlog 列布局")
+    p.add_argument("--mmap", action="store_true", help="以内存映射方式按字节扫描文本日志")
+    p.add_argument("--follow", action="store_true", help="增量模式：只处理上次检查点之后的新数据")
+    p.add_argument("--state", help="增量模式检查点文件，默认 <path>.offset")
+    p.add_argument("--interval", type=float, default=0, help="增量模式轮询间隔秒数，0 表示只执行一次")
+    p.add_argument("--profile", action="store_true", help="按 SQL 指纹聚合慢 SQL 画像（次数、总耗时、分位数）")
+    p.add_argument("--store", help="增量模式下把每轮新增计数写入该本地时序库（SQLite）")
     args = p.parse_args()
-    result = parse_log(Path(args.path), args.min_duration_ms)
+    if args.store and not args.follow:
+        p.error("--store 只能与 --follow 一起使用")
+    path = Path(args.path)
+    if args.follow:
+        while True:
+            result = follow_log(path, args.min_duration_ms, args.top, args.state, args.format, args.layout,
+                                args.profile)
+            _store_result(args.store, args.path, result)
+            print(json.dumps(result, ensure_ascii=False, indent=2), flush=True)
+            if args.interval <= 0:
+                return
+            time.sleep(args.interval)
+    if path.is_dir() or glob.has_magic(args.path) or path.suffix in _COMPRESSED_SUFFIXES:
+        result = parse_paths(args.path, args.min_duration_ms, args.top, args.workers or None,
+                             args.format, args.layout, args.mmap, args.profile)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    fmt = resolve_format(path, args.format)
+    if fmt == "csvlog":
+        result = parse_csvlog(path, args.min_duration_ms, args.top, args.layout, args.profile)
+    elif args.workers != 1:
+        result = parse_log_parallel(path, args.min_duration_ms, args.workers or None, args.top, args.mmap,
+                                    args.profile)
+    elif args.mmap:
+        result = parse_log_mmap(path, args.min_duration_ms, args.top, args.profile)
+    else:
+        result = parse_log(path, args.min_duration_ms, args.top, args.profile)
     print(json.dumps(result, ensure_ascii=False, indent=2))
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,178 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import psycopg2
+from psycopg2.extensions import parse_dsn
+
+MAX_WORKERS = 32
+
+def target_name(dsn):
+    # 只用 host:port/dbname 作为名称，报告、时序库标签与日志中都不会出现密码等连接参数
+    try:
+        params = parse_dsn(dsn)
+    except psycopg2.Error:
+        return "invalid-dsn"
+    host = params.get("host") or params.get("hostaddr") or "localhost"
+    port = params.get("port")
+    name = f"{host}:{port}" if port else host
+    return f"{name}/{params['dbname']}" if params.get("dbname") else name
+
+def load_targets(dsns=None, targets_file=None):
+    # 目标列表：--dsn 可重复；--targets 文件每行 "名称 DSN" 或只写 DSN，# 开头为注释；
+    # 未指定名称时由 DSN 的 host:port/dbname 生成，重名时追加序号
+    targets = []
+    for dsn in dsns or ():
+        targets.append((None, dsn))
+    if targets_file:
+        with open(targets_file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                name, _, rest = line.partition(" ")
+                if rest.strip() and "=" not in name and "://" not in name:
+                    targets.append((name, rest.strip()))
+                else:
+                    targets.append((None, line))
+    seen_dsn = set()
+    names = {}
+    unique = []
+    for name, dsn in targets:
+        if dsn in seen_dsn:
+            continue
+        seen_dsn.add(dsn)
+        name = name or target_name(dsn)
+        n = names[name] = names.get(name, 0) + 1
+        unique.append((name if n == 1 else f"{name}#{n}", dsn))
+    return unique
+
+class Fleet:
+    # 每个目标一条连接，同一 Fleet 的多次 sweep 之间复用，close() 时统一关闭（命令行的集群巡检只做一次
+    # sweep，run_fleet 用完即关）；巡检在线程池中并发执行；
+    # 单个目标的超时由 connect_timeout、statement_timeout 与从任务开始执行起计算的截止时间三层保证，
+    # 线程数少于目标数时排队中的目标不会被提前判为超时
+    def __init__(self, targets, timeout=10, workers=None, application_name="fleet_inspector"):
+        self.targets = list(targets)
+        self.timeout = timeout
+        self.application_name = application_name
+        self.workers = workers or min(MAX_WORKERS, max(1, len(self.targets)))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        self._conns = {}
+        self._busy = set()
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _connection(self, name, dsn):
+        conn = self._conns.get(name)
+        if conn is not None and not conn.closed:
+            return conn
+        conn = psycopg2.connect(dsn, connect_timeout=max(1, int(self.timeout)))
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SET application_name = %s", (self.application_name,))
+            cur.execute("SET statement_timeout = %s", (int(self.timeout * 1000),))
+        self._conns[name] = conn
+        return conn
+
+    def _run_one(self, name, dsn, inspect):
+        t0 = time.perf_counter()
+        with self._lock:
+            self._started[name] = time.monotonic()
+        try:
+            conn = self._connection(name, dsn)
+            with conn.cursor() as cur:
+                result = inspect(cur)
+            return {"ok": True, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2), "result": result}
+        except Exception as e:
+            conn = self._conns.pop(name, None)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            return {"ok": False, "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2), "error": str(e)}
+        finally:
+            with self._lock:
+                self._busy.discard(name)
+
+    def sweep(self, inspect):
+        t0 = time.perf_counter()
+        futures = {}
+        results = {}
+        for name, dsn in self.targets:
+            with self._lock:
+                # 上一轮超时仍未返回的目标本轮跳过，避免同一连接被两个线程同时使用
+                if name in self._busy:
+                    results[name] = {"ok": False, "elapsed_ms": None, "error": "上一轮巡检尚未结束"}
+                    continue
+                self._busy.add(name)
+                self._started.pop(name, None)
+            futures[self._pool.submit(self._run_one, name, dsn, inspect)] = name
+        pending = set(futures)
+        # 兜底截止时间：按线程数分轮，每轮最多 timeout，避免工作线程卡死时无限等待
+        rounds = -(-len(futures) // self.workers) if futures else 0
+        hard_deadline = time.monotonic() + self.timeout * (rounds + 1)
+        while pending:
+            now = time.monotonic()
+            with self._lock:
+                started = {fut: self._started.get(futures[fut]) for fut in pending}
+            deadlines = [t + self.timeout for t in started.values() if t is not None]
+            limit = min(deadlines + [now + self.timeout, hard_deadline])
+            done, pending = wait(pending, timeout=max(0.0, limit - now), return_when=FIRST_COMPLETED)
+            for fut in done:
+                results[futures[fut]] = fut.result()
+            now = time.monotonic()
+            for fut in list(pending):
+                t = started.get(fut)
+                if now < hard_deadline and (t is None or now < t + self.timeout):
+                    continue
+                pending.discard(fut)
+                name = futures[fut]
+                if t is None and fut.cancel():
+                    results[name] = {"ok": False, "elapsed_ms": None, "error": "排队超时"}
+                    with self._lock:
+                        self._busy.discard(name)
+                    continue
+                conn = self._conns.get(name)
+                if conn is not None:
+                    # 取消仍在执行的语句，让工作线程尽快释放
+                    try:
+                        conn.cancel()
+                    except Exception:
+                        pass
+                results[name] = {"ok": False, "elapsed_ms": round(self.timeout * 1000, 2), "error": "超时"}
+        ordered = {name: results[name] for name, _ in self.targets if name in results}
+        return {
+            "targets": len(self.targets),
+            "ok": sum(1 for r in ordered.values() if r["ok"]),
+            "failed": sum(1 for r in ordered.values() if not r["ok"]),
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+            "results": ordered,
+        }
+
+    def close(self):
+        # 先中断仍在执行的语句、取消排队中的任务，等工作线程全部退出后再关闭连接，
+        # 避免关闭仍被其他线程使用的连接
+        with self._lock:
+            busy = [self._conns.get(name) for name in self._busy]
+        for conn in busy:
+            if conn is not None:
+                try:
+                    conn.cancel()
+                except Exception:
+                    pass
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        for conn in list(self._conns.values()):
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._conns.clear()
+
+def run_fleet(targets, inspect, timeout=10, workers=None, application_name="fleet_inspector"):
+    fleet = Fleet(targets, timeout, workers, application_name)
+    try:
+        return fleet.sweep(inspect)
+    finally:
+        fleet.close()
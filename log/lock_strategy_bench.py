@@ -0,0 +1,138 @@
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+
+import psycopg2
+
+import transaction_inspector as ti
+
+# 咨询锁命名空间：classid 取该值，objid 取 1..N，避免与业务咨询锁冲突
+_ADVISORY_NS = 731
+
+def _timed(fn, repeat):
+    lat = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat, result
+
+def _entry(lock_count, waiters, strategy, lat, rows):
+    return {
+        "lock_count": lock_count,
+        "waiters": waiters,
+        "strategy": strategy,
+        "ms_median": round(statistics.median(lat), 3),
+        "ms_min": round(min(lat), 3),
+        "rows": rows,
+    }
+
+def _pairs(rows):
+    return sorted((r["blocked_pid"], r["blocking_pid"], r["locktype"], r["blocked_mode"], r["blocking_mode"])
+                  for r in rows)
+
+def _synthetic(lock_count, waiters, sessions, rnd):
+    # 列顺序同 _LOCKS_SQL：locktype, database, relation, transactionid, classid, objid, pid, mode, granted, waited
+    locks = [("advisory", 16384, None, None, _ADVISORY_NS, i, rnd.randint(1, sessions), "ExclusiveLock", True, None)
+             for i in range(1, lock_count + 1)]
+    for _ in range(waiters):
+        objid = rnd.randint(1, lock_count)
+        locks.append(("advisory", 16384, None, None, _ADVISORY_NS, objid, sessions + rnd.randint(1, sessions),
+                      "ExclusiveLock", False, None))
+    rnd.shuffle(locks)
+    sess = [(pid, "app", "SELECT 1", None) for pid in range(1, 2 * sessions + 1)]
+    return locks, sess
+
+def bench_offline(lock_counts, waiters=200, sessions=500, repeat=5, seed=1):
+    # 无数据库时只测客户端哈希匹配的开销
+    rnd = random.Random(seed)
+    entries = []
+    for n in lock_counts:
+        locks, sess = _synthetic(n, waiters, sessions, rnd)
+        lat, rows = _timed(lambda: ti._match_locks(locks, sess), repeat)
+        entries.append(_entry(n, waiters, "python_match_only", lat, len(rows)))
+    return entries
+
+def _hold_locks(lock_count):
+    conn = ti._connect()
+    cur = conn.cursor()
+    cur.execute("SELECT count(pg_advisory_xact_lock(%s, g)) FROM generate_series(1, %s) g",
+                (_ADVISORY_NS, lock_count))
+    cur.fetchall()
+    return conn
+
+def _wait_on(key, ready, conns):
+    conn = ti._connect()
+    conns.append(conn)
+    ready.release()
+    try:
+        conn.cursor().execute("SELECT pg_advisory_xact_lock(%s, %s)", (_ADVISORY_NS, key))
+    except psycopg2.Error:
+        pass
+
+def _ungranted(cur):
+    cur.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND classid = %s AND NOT granted",
+                (_ADVISORY_NS,))
+    return cur.fetchone()[0]
+
+def bench_online(lock_counts, waiters=20, repeat=5, strategies=ti.LOCK_STRATEGIES):
+    # 持有连接一次性取 N 个事务级咨询锁，waiters 个连接各等待其中一个，再分别用两种策略采集阻塞关系
+    entries = []
+    inspector = ti._connect()
+    inspector.autocommit = True
+    icur = inspector.cursor()
+    for n in lock_counts:
+        holder = _hold_locks(n)
+        ready = threading.Semaphore(0)
+        conns = []
+        threads = [threading.Thread(target=_wait_on, args=(random.randint(1, n), ready, conns), daemon=True)
+                   for _ in range(waiters)]
+        try:
+            for t in threads:
+                t.start()
+            for _ in threads:
+                ready.acquire()
+            deadline = time.monotonic() + 30
+            while _ungranted(icur) < waiters and time.monotonic() < deadline:
+                time.sleep(0.05)
+            results = {}
+            for strategy in strategies:
+                lat, rows = _timed(lambda: ti._fetch_blocking(icur, strategy=strategy), repeat)
+                results[strategy] = _pairs(rows)
+                entries.append(_entry(n, waiters, strategy, lat, len(rows)))
+            if len(set(map(tuple, results.values()))) > 1:
+                entries.append({"lock_count": n, "error": "两种策略结果不一致"})
+        finally:
+            holder.rollback()
+            holder.close()
+            for t in threads:
+                t.join(timeout=10)
+            for c in conns:
+                ti._close_quietly(c)
+    inspector.close()
+    return entries
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--lock-counts", default="1000,10000,100000",
+                   help="逗号分隔的持有锁数量；在线模式受 max_locks_per_transaction 限制")
+    p.add_argument("--waiters", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--offline", action="store_true", help="不连接数据库，用合成锁快照只测客户端匹配开销")
+    args = p.parse_args()
+    counts = [int(x) for x in args.lock_counts.split(",") if x.strip()]
+    try:
+        if args.offline:
+            entries = bench_offline(counts, args.waiters, repeat=args.repeat)
+        else:
+            entries = bench_online(counts, args.waiters, args.repeat)
+    except Exception as e:
+        entries = {"error": str(e)}
+    print(json.dumps(entries, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
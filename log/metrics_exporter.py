@@ -0,0 +1,245 @@
+import argparse
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import transaction_inspector as ti
+import wal_checkpoint_inspector as wci
+from blocking_graph import WaitForGraph, edges_from_blocking
+from csvlog_parser import CSVLOG_COLUMNS, follow_log
+
+_OPENMETRICS = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+def _label_str(labels):
+    if not labels:
+        return ""
+    parts = []
+    for k, v in sorted(labels.items()):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+def _render(families, openmetrics):
+    # families: [(name, type, help, [(labels, value)])]；counter 样本名带 _total
+    lines = []
+    for name, kind, text, samples in families:
+        sample_name = name + "_total" if kind == "counter" else name
+        lines.append(f"# HELP {name if openmetrics else sample_name} {text}")
+        lines.append(f"# TYPE {name if openmetrics else sample_name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{sample_name}{_label_str(labels)} {float(value)!r}")
+    if openmetrics:
+        lines.append("# EOF")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+class MetricsCache:
+    # 各数据源在自己的线程里刷新后整体替换；抓取只读取预先渲染好的字节，不触发任何数据库查询
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sources = {}
+        self._payload = {True: _render([], True), False: _render([], False)}
+
+    def update(self, source, families):
+        with self._lock:
+            self._sources[source] = families
+            # 同名指标族（如各数据源的 exporter_up）合并到同一 HELP/TYPE 下
+            by_name = {}
+            for key in sorted(self._sources):
+                for name, kind, text, samples in self._sources[key]:
+                    by_name.setdefault(name, (name, kind, text, []))[3].extend(samples)
+            merged = list(by_name.values())
+            self._payload = {True: _render(merged, True), False: _render(merged, False)}
+
+    def payload(self, openmetrics):
+        return self._payload[openmetrics]
+
+class _Refresher(threading.Thread):
+    # 按固定间隔调用 collect()，并附带刷新耗时、最近成功时间与失败次数；
+    # 刷新失败时不再导出上一轮的指标，只保留 up=0 与刷新状态，避免把过期数据当作当前值
+    def __init__(self, name, cache, interval, stop):
+        super().__init__(name=name, daemon=True)
+        self.source = name
+        self.cache = cache
+        self.interval = interval
+        self.stop = stop
+        self.errors = 0
+        self.last_ok = 0.0
+        self.families = []
+
+    def collect(self):
+        # 子类返回本数据源的指标族列表 [(name, type, help, [(labels, value)])]
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def refresh(self):
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            self.families = self.collect()
+            self.last_ok = time.time()
+        except Exception as e:
+            ok = False
+            self.errors += 1
+            self.families = []
+            print(f"{self.source} 刷新失败: {e}", flush=True)
+            self.reset()
+        labels = {"source": self.source}
+        self.cache.update(self.source, self.families + [
+            ("opengauss_exporter_up", "gauge", "最近一次刷新是否成功", [(labels, int(ok))]),
+            ("opengauss_exporter_refresh_seconds", "gauge", "最近一次刷新耗时", [(labels, time.perf_counter() - t0)]),
+            ("opengauss_exporter_last_success_timestamp_seconds", "gauge", "最近一次成功刷新的时间",
+             [(labels, self.last_ok)]),
+            ("opengauss_exporter_refresh_errors", "counter", "刷新失败次数", [(labels, self.errors)]),
+        ])
+        return time.perf_counter() - t0
+
+    def run(self):
+        while not self.stop.is_set():
+            elapsed = self.refresh()
+            self.stop.wait(max(0.0, self.interval - elapsed))
+
+class DatabaseRefresher(_Refresher):
+    # 常驻连接采集会话、阻塞图与 bgwriter/WAL 计数；累计计数原样作为 counter 暴露，速率交给 Prometheus 计算
+    def __init__(self, cache, interval, stop, min_ms=1000, lock_strategy="sql"):
+        super().__init__("database", cache, interval, stop)
+        self.min_ms = min_ms
+        self.lock_strategy = lock_strategy
+        self.conn = None
+        self.cur = None
+        self.caps = None
+        self.graph = WaitForGraph()
+
+    def reset(self):
+        if self.conn is not None:
+            ti._close_quietly(self.conn)
+        self.conn = None
+
+    def collect(self):
+        if self.conn is None or self.conn.closed:
+            self.conn = ti._connect()
+            self.conn.autocommit = True
+            self.cur = self.conn.cursor()
+            self.cur.execute("SET application_name = 'metrics_exporter'")
+            self.caps = wci._capabilities(self.cur)
+        cur = self.cur
+        activity = ti._fetch_activity(cur, query_chars=1)
+        blocking = ti._fetch_blocking(cur, query_chars=1, strategy=self.lock_strategy)
+        graph = self.graph.update(edges_from_blocking(blocking)).snapshot()
+        snap = wci._snapshot(cur, self.caps)
+        states = Counter(row.get("state") or "unknown" for row in activity)
+        long_running = ti._long_running(activity, self.min_ms)
+        families = [
+            ("opengauss_sessions", "gauge", "按状态统计的会话数", [({"state": s}, n) for s, n in sorted(states.items())]),
+            ("opengauss_long_running_queries", "gauge", f"执行超过 {self.min_ms}ms 的会话数", [({}, len(long_running))]),
+            ("opengauss_lock_waits", "gauge", "等待-持有锁对数量", [({}, len(blocking))]),
+            ("opengauss_blocked_sessions", "gauge", "处于锁等待的会话数", [({}, graph["waiters"])]),
+            ("opengauss_root_blockers", "gauge", "根阻塞会话数", [({}, graph["root_blockers"])]),
+            ("opengauss_blocking_max_chain_length", "gauge", "最长阻塞链路（会话数）", [({}, graph["max_chain_length"])]),
+            ("opengauss_blocking_max_cumulative_seconds", "gauge", "单个根阻塞者造成的最大累计阻塞秒数",
+             [({}, max((r["cumulative_blocked_s"] for r in graph["roots"]), default=0))]),
+            ("opengauss_wait_cycles", "gauge", "等待环数量", [({}, len(graph["cycles"]))]),
+            ("opengauss_checkpoints", "counter", "检查点次数", [
+                ({"trigger": "timed"}, snap["checkpoints_timed"]), ({"trigger": "requested"}, snap["checkpoints_req"])]),
+            ("opengauss_buffers_written", "counter", "写出的缓冲区数", [
+                ({"by": "checkpoint"}, snap["buffers_checkpoint"]), ({"by": "bgwriter"}, snap["buffers_clean"])]),
+            ("opengauss_bgwriter_maxwritten_clean", "counter", "bgwriter 因达到 lru_maxpages 中止的次数",
+             [({}, snap["maxwritten_clean"])]),
+            ("opengauss_checkpoint_time_seconds", "counter", "检查点写入与同步耗时", [
+                ({"phase": "write"}, (snap["checkpoint_write_time"] or 0) / 1000),
+                ({"phase": "sync"}, (snap["checkpoint_sync_time"] or 0) / 1000)]),
+        ]
+        if snap.get("_lsn") is not None:
+            families.append(("opengauss_wal_position_bytes", "counter", "当前（备机为回放）WAL 位置",
+                             [({}, snap["_lsn"])]))
+        if "wal_fpi" in snap:
+            families.append(("opengauss_wal_full_page_images", "counter", "WAL 整页镜像数", [({}, snap["wal_fpi"])]))
+        return families
+
+class CsvlogRefresher(_Refresher):
+    # 以增量模式跟踪日志，计数来自 follow_log 的持久化检查点，进程重启后继续累加；
+    # 默认检查点文件与 csvlog_parser --follow 分开，两者各自消费全部增量
+    def __init__(self, cache, interval, stop, path, min_ms=1000, state_path=None, fmt="auto", layout="opengauss",
+                 top=50):
+        super().__init__("csvlog", cache, interval, stop)
+        path = Path(path)
+        state_path = state_path or path.parent / f"{path.name}.exporter.offset"
+        self.args = (path, min_ms, top, state_path, fmt, layout)
+        self.bytes = 0
+
+    def collect(self):
+        result = follow_log(*self.args)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        self.bytes += result["new"]["bytes"]
+        labels = {"path": str(self.args[0])}
+        return [
+            ("opengauss_csvlog_slow_statements", "counter", f"超过 {self.args[1]}ms 的慢 SQL 条数",
+             [(labels, result["slow_count"])]),
+            ("opengauss_csvlog_errors", "counter", "ERROR 记录数", [(labels, result["errors"])]),
+            ("opengauss_csvlog_deadlocks", "counter", "死锁记录数", [(labels, result["deadlocks"])]),
+            ("opengauss_csvlog_read_bytes", "counter", "本进程已处理的日志字节数", [(labels, self.bytes)]),
+        ]
+
+def _handler(cache):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            openmetrics = "application/openmetrics-text" in (self.headers.get("Accept") or "")
+            body = cache.payload(openmetrics)
+            self.send_response(200)
+            self.send_header("Content-Type", _OPENMETRICS if openmetrics else _PROMETHEUS)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+def serve(listen="0.0.0.0:9187", db_interval=15, log_path=None, log_interval=10, state_path=None,
+          min_ms=1000, lock_strategy="sql", fmt="auto", layout="opengauss", with_db=True, top=50):
+    host, _, port = listen.rpartition(":")
+    cache = MetricsCache()
+    stop = threading.Event()
+    refreshers = []
+    if with_db:
+        refreshers.append(DatabaseRefresher(cache, db_interval, stop, min_ms, lock_strategy))
+    if log_path:
+        refreshers.append(CsvlogRefresher(cache, log_interval, stop, log_path, min_ms, state_path, fmt, layout, top))
+    for r in refreshers:
+        r.start()
+    server = ThreadingHTTPServer((host or "0.0.0.0", int(port)), _handler(cache))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--listen", default="0.0.0.0:9187")
+    p.add_argument("--db-interval", type=float, default=15, help="数据库指标刷新间隔秒数")
+    p.add_argument("--no-db", action="store_true", help="只导出日志指标")
+    p.add_argument("--log-path", help="增量跟踪的日志文件或目录")
+    p.add_argument("--log-interval", type=float, default=10, help="日志增量处理间隔秒数")
+    p.add_argument("--state", help="日志增量检查点文件，默认 <path>.exporter.offset，不要与 csvlog_parser --follow 共用")
+    p.add_argument("--top", type=int, default=50, help="检查点中保留的慢 SQL 条数")
+    p.add_argument("--min-duration-ms", type=int, default=1000)
+    p.add_argument("--lock-strategy", choices=ti.LOCK_STRATEGIES, default="sql")
+    p.add_argument("--format", choices=["auto", "text", "csvlog"], default="auto")
+    p.add_argument("--layout", choices=sorted(CSVLOG_COLUMNS), default="opengauss")
+    args = p.parse_args()
+    serve(args.listen, args.db_interval, args.log_path, args.log_interval, args.state, args.min_duration_ms,
+          args.lock_strategy, args.format, args.layout, not args.no_db, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+import argparse
+import json
+import re
+import sqlite3
+import time
+
+# 分辨率：原始点（按秒）与 1 分钟、1 小时汇总；写入时同步累加到各表，查询按时间跨度选表
+RESOLUTIONS = (("raw", 0), ("1m", 60), ("1h", 3600))
+DEFAULT_RETENTION = {"raw": 2 * 86400, "1m": 35 * 86400, "1h": 400 * 86400}
+_PRUNE_EVERY_S = 600
+_RAW_SPAN_S = 6 * 3600
+_MAX_POINTS = 1500
+_SPAN_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([smhd]?)$")
+_SPAN_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    metric TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    UNIQUE (metric, tags)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# 原始表与汇总表结构相同：原始表按秒聚合，同一秒内多次写入与汇总表的计数保持一致
+_POINTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS points_{res} (
+    series_id INTEGER NOT NULL,
+    ts INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    min REAL NOT NULL,
+    max REAL NOT NULL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO points_{res} (series_id, ts, count, sum, min, max) VALUES (?, ?, 1, ?, ?, ?)
+ON CONFLICT (series_id, ts) DO UPDATE SET
+    count = count + 1, sum = sum + excluded.sum,
+    min = min(min, excluded.min), max = max(max, excluded.max)
+"""
+
+def parse_span(text):
+    m = _SPAN_RE.match(str(text).strip())
+    if not m:
+        raise ValueError(f"无法解析时间跨度: {text}")
+    return int(float(m.group(1)) * _SPAN_UNITS[m.group(2)])
+
+def _tags_key(tags):
+    return json.dumps(tags or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+class MetricsStore:
+    # 本地追加写时序库：SQLite WAL 模式，(series_id, ts) 聚簇主键，按跨度选择原始或汇总表
+    def __init__(self, path, retention=None):
+        self.path = str(path)
+        self.retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA + "".join(_POINTS_SCHEMA.format(res=r) for r, _ in RESOLUTIONS))
+        self._series = {}
+        # 上次清理时间保存在库中，单次运行的 record() 不会每次都全表扫描删除
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_prune'").fetchone()
+        self._last_prune = int(row[0]) if row else 0
+
+    def _series_id(self, metric, tags):
+        key = (metric, _tags_key(tags))
+        sid = self._series.get(key)
+        if sid is None:
+            self.conn.execute("INSERT OR IGNORE INTO series (metric, tags) VALUES (?, ?)", key)
+            sid = self.conn.execute("SELECT id FROM series WHERE metric = ? AND tags = ?", key).fetchone()[0]
+            self._series[key] = sid
+        return sid
+
+    def write_many(self, points, ts=None, tags=None):
+        # points: {metric: value} 或 [(metric, value, tags)]；非数值与 None 跳过
+        ts = int(ts if ts is not None else time.time())
+        items = points.items() if isinstance(points, dict) else points
+        rows = []
+        with self.conn:
+            for item in items:
+                metric, value = item[0], item[1]
+                point_tags = item[2] if len(item) > 2 else tags
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)) or value != value:
+                    continue
+                rows.append((self._series_id(metric, point_tags), float(value)))
+            for res, step in RESOLUTIONS:
+                self.conn.executemany(_UPSERT.format(res=res),
+                                      [(sid, ts - ts % step if step else ts, v, v, v) for sid, v in rows])
+        if ts - self._last_prune >= _PRUNE_EVERY_S:
+            self.prune(ts)
+        return len(rows)
+
+    def write(self, metric, value, tags=None, ts=None):
+        return self.write_many([(metric, value, tags)], ts)
+
+    def prune(self, now=None):
+        now = int(now if now is not None else time.time())
+        with self.conn:
+            for res, _ in RESOLUTIONS:
+                keep = self.retention.get(res)
+                if keep:
+                    self.conn.execute(f"DELETE FROM points_{res} WHERE ts < ?", (now - keep,))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_prune', ?)", (str(now),))
+        self._last_prune = now
+
+    def _pick(self, start, end, step):
+        # 只考虑保留期覆盖起点的分辨率；指定步长时取不超过步长的最粗分辨率，
+        # 否则 6 小时内用原始点，更长跨度取点数不超过 _MAX_POINTS 的最细汇总
+        now = time.time()
+        usable = [(res, s) for res, s in RESOLUTIONS
+                  if not self.retention.get(res) or start >= now - self.retention[res]] or [RESOLUTIONS[-1]]
+        if step:
+            fit = [res for res, s in usable if s <= step]
+            return fit[-1] if fit else usable[0][0]
+        for res, s in usable:
+            if (not s and end - start <= _RAW_SPAN_S) or (s and (end - start) / s <= _MAX_POINTS):
+                return res
+        return usable[-1][0]
+
+    def query(self, metric, tags=None, start=None, end=None, step=None):
+        # 返回 [(ts, avg, min, max, count)]；step 大于所选分辨率时在 SQL 中再按 step 分组
+        end = int(end if end is not None else time.time())
+        start = int(start if start is not None else end - 86400)
+        res = self._pick(start, end, step)
+        where = "s.metric = ? AND p.ts >= ? AND p.ts <= ?"
+        params = [metric, start, end]
+        if tags:
+            where += " AND s.tags = ?"
+            params.append(_tags_key(tags))
+        agg = "sum(p.sum), min(p.min), max(p.max), sum(p.count)"
+        bucket = f"p.ts - p.ts % {int(step)}" if step else "p.ts"
+        sql = (f"SELECT {bucket} AS b, {agg} FROM points_{res} p JOIN series s ON s.id = p.series_id "
+               f"WHERE {where} GROUP BY b ORDER BY b")
+        return res, [(b, total / n, lo, hi, n) for b, total, lo, hi, n in self.conn.execute(sql, params)]
+
+    def series(self, metric=None):
+        sql = "SELECT metric, tags FROM series"
+        rows = self.conn.execute(sql + " WHERE metric = ? ORDER BY metric, tags" if metric else
+                                 sql + " ORDER BY metric, tags", (metric,) if metric else ())
+        return [{"metric": m, "tags": json.loads(t)} for m, t in rows]
+
+    def close(self):
+        self.conn.close()
+
+def flatten(prefix, obj, out=None):
+    # 把嵌套字典中的数值展开为 prefix.key 形式的指标名
+    out = {} if out is None else out
+    for k, v in obj.items():
+        name = f"{prefix}.{k}"
+        if isinstance(v, dict):
+            flatten(name, v, out)
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[name] = v
+    return out
+
+def record(path, points, tags=None, ts=None):
+    # 单次运行的工具写一批指标后即关闭
+    store = MetricsStore(path)
+    try:
+        return store.write_many(points, ts, tags)
+    finally:
+        store.close()
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", required=True, help="时序库文件")
+    p.add_argument("--metric", help="指标名，不指定则列出全部序列")
+    p.add_argument("--tags", help="JSON 格式的标签过滤，如 {\"target\": \"primary\"}")
+    p.add_argument("--since", default="1d", help="查询起点距今的跨度，如 30d、6h")
+    p.add_argument("--step", help="聚合步长，如 5m、1h；默认按跨度自动选择")
+    p.add_argument("--prune", action="store_true", help="按保留期清理过期数据")
+    args = p.parse_args()
+    try:
+        store = MetricsStore(args.db)
+        if args.prune:
+            store.prune()
+        if not args.metric:
+            print(json.dumps(store.series(), ensure_ascii=False, indent=2))
+            return
+        t0 = time.perf_counter()
+        end = int(time.time())
+        res, rows = store.query(args.metric, json.loads(args.tags) if args.tags else None,
+                                end - parse_span(args.since), end, parse_span(args.step) if args.step else None)
+        print(json.dumps({
+            "metric": args.metric,
+            "resolution": res,
+            "query_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "points": [{"ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(b)), "avg": round(a, 4),
+                        "min": lo, "max": hi, "count": n} for b, a, lo, hi, n in rows],
+        }, ensure_ascii=False, indent=2))
+    except Exception as e:
+        print(json.dumps({"error": str(e)}, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
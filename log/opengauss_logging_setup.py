@@ -1,8 +1,30 @@
 import os
 import sys
+import argparse
+import json
+import re
 from pathlib import Path
 import psycopg2
 
+from fleet import load_targets, run_fleet
+
+BASELINE = {
+    "logging_collector": "on",
+    "log_destination": "csvlog",
+    "log_line_prefix": "%m [%p] user=%u,db=%d,app=%a,client=%h ",
+    "log_min_duration_statement": 1000,
+    "log_statement": "ddl",
+    "log_rotation_age": "1d",
+    "log_rotation_size": "1GB",
+    "track_io_timing": "on",
+}
+
+_NUM_UNIT_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*([a-zA-Z]*)\s*$")
+_MEMORY_UNITS = {"B": 1, "kB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+_TIME_UNITS = {"us": 0.001, "ms": 1, "s": 1000, "min": 60000, "h": 3600000, "d": 86400000}
+_TRUE = ("on", "true", "yes", "1")
+_FALSE = ("off", "false", "no", "0")
+
 def _try_import_db_config():
     candidates = [
         Path(__file__).resolve().parents[1] / "backend" / "app" / "迁移",
@@ -33,7 +55,144 @@ def _apply_settings(cur, settings):
         q = f"ALTER SYSTEM SET {k} TO {_fmt_value(v)}"
         cur.execute(q)
 
+def _unit_scale(unit):
+    # pg_settings 的单位可能带倍数，如 8kB、16MB
+    m = re.match(r"^(\d*)(.*)$", unit or "")
+    factor = int(m.group(1) or 1)
+    base = m.group(2)
+    if base in _MEMORY_UNITS:
+        return factor * _MEMORY_UNITS[base], _MEMORY_UNITS
+    if base in _TIME_UNITS:
+        return factor * _TIME_UNITS[base], _TIME_UNITS
+    return None, None
+
+def _normalize(value, vartype, unit):
+    # 把期望值与当前值统一成可比较的形式：数值换算到基本单位，布尔统一为 on/off，枚举忽略大小写
+    s = str(value).strip()
+    if vartype == "bool":
+        sl = s.lower()
+        return "on" if sl in _TRUE else "off" if sl in _FALSE else sl
+    if vartype in ("integer", "real"):
+        m = _NUM_UNIT_RE.match(s)
+        if not m:
+            return s
+        num, suffix = float(m.group(1)), m.group(2)
+        scale, table = _unit_scale(unit)
+        if suffix and table and suffix in table:
+            return num * table[suffix]
+        return num * scale if scale else num
+    if vartype == "enum":
+        return s.lower()
+    return s
+
+def _fetch_current(cur, names):
+    cur.execute("SELECT name, setting, unit, vartype, context, source, sourcefile FROM pg_settings "
+                "WHERE name = ANY(%s)", (list(names),))
+    return {name: {"setting": setting, "unit": unit, "vartype": vartype, "context": context,
+                   "source": source, "sourcefile": sourcefile}
+            for name, setting, unit, vartype, context, source, sourcefile in cur.fetchall()}
+
+def _restore_setting(cur, name, info):
+    # 原值来自 postgresql.auto.conf 时写回原值，否则 RESET，删除本次新增的 ALTER SYSTEM 覆盖项
+    if info.get("source") == "configuration file" and (info.get("sourcefile") or "").endswith("postgresql.auto.conf"):
+        _apply_settings(cur, {name: info["setting"]})
+    else:
+        cur.execute(f"ALTER SYSTEM RESET {name}")
+
+def _diff(current, settings):
+    changed = []
+    unknown = []
+    for k, v in settings.items():
+        cur = current.get(k)
+        if cur is None:
+            unknown.append(k)
+            continue
+        now = _normalize(cur["setting"], cur["vartype"], cur["unit"])
+        want = _normalize(v, cur["vartype"], cur["unit"])
+        if now != want:
+            changed.append({"name": k, "current": cur["setting"], "unit": cur["unit"], "desired": v,
+                            "context": cur["context"]})
+    return changed, unknown
+
+def apply_baseline(cur, settings, dry_run=False):
+    # 一次查询取当前值，只对有差异的键执行 ALTER SYSTEM SET；ALTER SYSTEM 不能放在事务块中，
+    # 因此逐条执行，任一失败则把已改的键恢复原状态（见 _restore_setting），保证要么全部生效要么都不变；
+    # 只有存在非 postmaster 级参数变更时才重载，postmaster 级参数列为需重启
+    current = _fetch_current(cur, settings)
+    changed, unknown = _diff(current, settings)
+    report = {
+        "changed": changed,
+        "unchanged": len(settings) - len(changed) - len(unknown),
+        "unknown": unknown,
+        "applied": False,
+        "reloaded": False,
+        "restart_required": [c["name"] for c in changed if c["context"] == "postmaster"],
+    }
+    if dry_run or not changed:
+        return report
+    done = []
+    try:
+        for c in changed:
+            _apply_settings(cur, {c["name"]: settings[c["name"]]})
+            done.append(c["name"])
+    except Exception as e:
+        # rolled_back 只列出确实恢复成功的键，恢复失败的键连同原因列入 rollback_failed，需人工处理
+        failed = {}
+        for name in reversed(done):
+            try:
+                _restore_setting(cur, name, current[name])
+            except Exception as err:
+                failed[name] = str(err)
+        report["error"] = f"{c['name']}: {e}"
+        report["rolled_back"] = [name for name in done if name not in failed]
+        report["rollback_failed"] = [{"name": name, "error": failed[name]} for name in done if name in failed]
+        return report
+    report["applied"] = True
+    if any(c["context"] != "postmaster" for c in changed):
+        cur.execute("SELECT pg_reload_conf()")
+        report["reloaded"] = True
+    return report
+
+def _diff_main(args):
+    settings = BASELINE
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    if args.dsn or args.targets:
+        report = run_fleet(load_targets(args.dsn, args.targets), lambda cur: apply_baseline(cur, settings, args.dry_run),
+                           args.timeout, args.fleet_workers or None, "opengauss_logging_setup")
+        print(json.dumps(report, ensure_ascii=False, default=str, indent=2))
+        return
+    db_cfg = _try_import_db_config()
+    if not db_cfg:
+        print("无法导入 db_config.py，请在项目根目录运行或设置环境变量")
+        return
+    conn = None
+    try:
+        conn = psycopg2.connect(**db_cfg.opengauss_config)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            report = apply_baseline(cur, settings, args.dry_run)
+        print(json.dumps(report, ensure_ascii=False, default=str, indent=2))
+    except Exception as e:
+        print(f"执行失败: {e}")
+    finally:
+        if conn is not None:
+            conn.close()
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--diff", action="store_true", help="先读取当前值，只应用有差异的参数，必要时才重载")
+    parser.add_argument("--dry-run", action="store_true", help="只输出差异，不做修改（隐含 --diff）")
+    parser.add_argument("--baseline", help="JSON 格式的参数基线文件，默认使用内置日志基线")
+    parser.add_argument("--dsn", action="append", help="批量应用的目标 DSN，可重复指定（隐含 --diff）")
+    parser.add_argument("--targets", help="批量应用目标文件，每行 \"名称 DSN\" 或只写 DSN（隐含 --diff）")
+    parser.add_argument("--timeout", type=float, default=30, help="批量应用时单个实例的超时秒数")
+    parser.add_argument("--fleet-workers", type=int, default=0, help="批量应用并发线程数，0 表示每个实例一个（最多 32）")
+    args = parser.parse_args()
+    if args.diff or args.dry_run or args.baseline or args.dsn or args.targets:
+        _diff_main(args)
+        return
     print("openGauss 日志配置基线应用")
     db_cfg = _try_import_db_config()
     if not db_cfg:
@@ -44,17 +203,7 @@ def main():
         conn = psycopg2.connect(**cfg)
         conn.autocommit = True
         cur = conn.cursor()
-        settings = {
-            "logging_collector": "on",
-            "log_destination": "csvlog",
-            "log_line_prefix": "%m [%p] user=%u,db=%d,app=%a,client=%h ",
-            "log_min_duration_statement": 1000,
-            "log_statement": "ddl",
-            "log_rotation_age": "1d",
-            "log_rotation_size": "1GB",
-            "track_io_timing": "on",
-        }
-        _apply_settings(cur, settings)
+        _apply_settings(cur, BASELINE)
         cur.execute("SELECT pg_reload_conf()")
         print("已应用并重载配置")
     except Exception as e:
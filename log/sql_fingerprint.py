@@ -0,0 +1,161 @@
+import hashlib
+import math
+import re
+
+# 单次扫描：字符串/美元引用字面量与带引号标识符排在注释之前匹配，引号内的 -- 或 /* 不会被当成注释
+_TOKEN_RE = re.compile(
+    r"""(?P<lit>\$([A-Za-z_][A-Za-z0-9_]*|)\$.*?\$\2\$"""
+    r"""|[EeBbXxNn]?'(?:[^']|'')*'"""
+    r"""|\$[0-9]+"""
+    r"""|(?<![A-Za-z0-9_."])0[xX][0-9A-Fa-f]+"""
+    r"""|(?<![A-Za-z0-9_."])(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?)"""
+    r"""|(?P<ident>"(?:[^"]|"")*")"""
+    r"""|(?P<comment>/\*.*?\*/|--[^\n]*)""",
+    re.S,
+)
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_RE = re.compile(r"\bvalues\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+_SPACE_RE = re.compile(r"\s+")
+
+def _replace_token(m):
+    if m.group("lit") is not None:
+        return "?"
+    if m.group("comment") is not None:
+        return " "
+    return m.group(0)
+
+def normalize_sql(sql):
+    # 去注释、字面量与参数替换为 ?，IN 列表与多行 VALUES 折叠为单个占位
+    s = _TOKEN_RE.sub(_replace_token, sql)
+    s = _SPACE_RE.sub(" ", s).strip().rstrip(";").strip().lower()
+    s = _IN_LIST_RE.sub("in (?)", s)
+    s = _VALUES_RE.sub("values (?)", s)
+    return s
+
+def fingerprint(normalized):
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+class QuantileSketch:
+    # 对数分桶的流式分位数草图（DDSketch 思路），相对误差 alpha，可合并；
+    # 桶数超过上限时合并最低的桶，保证单个草图内存有界
+    def __init__(self, alpha=0.01, max_buckets=2048):
+        self.alpha = alpha
+        self.max_buckets = max_buckets
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.buckets = {}
+        self.zero = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= 0:
+            self.zero += 1
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        extra = len(keys) - self.max_buckets
+        floor = keys[extra]
+        for k in keys[:extra]:
+            self.buckets[floor] += self.buckets.pop(k)
+
+    def merge(self, other):
+        self.count += other.count
+        self.zero += other.zero
+        for k, n in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + n
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                return 2 * self._gamma ** k / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.buckets) / (self._gamma + 1)
+
+    def dump(self):
+        return {"alpha": self.alpha, "zero": self.zero, "buckets": [[k, n] for k, n in self.buckets.items()]}
+
+    @classmethod
+    def load(cls, data):
+        sketch = cls(data.get("alpha", 0.01))
+        sketch.zero = data.get("zero", 0)
+        sketch.buckets = {int(k): n for k, n in data.get("buckets", [])}
+        sketch.count = sketch.zero + sum(sketch.buckets.values())
+        return sketch
+
+class SlowQueryProfile:
+    # 按指纹聚合慢 SQL，内存只与不同指纹的数量相关
+    def __init__(self, alpha=0.01):
+        self.alpha = alpha
+        self.stats = {}
+
+    def add(self, sql, ms):
+        normalized = normalize_sql(sql)
+        if not normalized:
+            return
+        fp = fingerprint(normalized)
+        st = self.stats.get(fp)
+        if st is None:
+            st = self.stats[fp] = {"query": normalized[:1000], "total_ms": 0.0, "max_ms": 0.0,
+                                   "sketch": QuantileSketch(self.alpha)}
+        st["total_ms"] += ms
+        if ms > st["max_ms"]:
+            st["max_ms"] = ms
+        st["sketch"].add(ms)
+
+    def merge(self, other):
+        for fp, o in other.stats.items():
+            st = self.stats.get(fp)
+            if st is None:
+                self.stats[fp] = {"query": o["query"], "total_ms": o["total_ms"], "max_ms": o["max_ms"],
+                                  "sketch": QuantileSketch(self.alpha).merge(o["sketch"])}
+                continue
+            st["total_ms"] += o["total_ms"]
+            st["max_ms"] = max(st["max_ms"], o["max_ms"])
+            st["sketch"].merge(o["sketch"])
+        return self
+
+    def top(self, n=50):
+        ranked = sorted(self.stats.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)
+        out = []
+        for fp, st in ranked[:n]:
+            sk = st["sketch"]
+            out.append({
+                "fingerprint": fp,
+                "query": st["query"],
+                "count": sk.count,
+                "total_ms": round(st["total_ms"], 3),
+                "mean_ms": round(st["total_ms"] / sk.count, 3),
+                "p50_ms": round(sk.quantile(0.5), 3),
+                "p95_ms": round(sk.quantile(0.95), 3),
+                "p99_ms": round(sk.quantile(0.99), 3),
+                "max_ms": st["max_ms"],
+            })
+        return out
+
+    def dump(self):
+        return {fp: {"query": st["query"], "total_ms": st["total_ms"], "max_ms": st["max_ms"],
+                     "sketch": st["sketch"].dump()}
+                for fp, st in self.stats.items()}
+
+    @classmethod
+    def load(cls, data, alpha=0.01):
+        profile = cls(alpha)
+        for fp, st in (data or {}).items():
+            profile.stats[fp] = {"query": st["query"], "total_ms": st["total_ms"], "max_ms": st["max_ms"],
+                                 "sketch": QuantileSketch.load(st["sketch"])}
+        return profile
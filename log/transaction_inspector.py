@@ -3,8 +3,15 @@ import sys
 from pathlib import Path
 import argparse
 import json
+import signal
+import time
+from collections import deque
 import psycopg2
 
+from blocking_graph import WaitForGraph, edges_from_blocking, evaluate_blocking_alerts
+from fleet import load_targets, run_fleet
+from metrics_store import MetricsStore, record
+
 def _try_import_db_config():
     candidates = [
         Path(__file__).resolve().parents[1] / "backend" / "app" / "迁移",
@@ -27,8 +34,7 @@ def _connect():
         raise RuntimeError("无法导入 db_config.py")
     return psycopg2.connect(**db_cfg.opengauss_config)
 
-def _fetch_activity(cur):
-    cur.execute("""
+_ACTIVITY_SQL = """
         SELECT
           pid,
           usename,
@@ -40,15 +46,14 @@ def _fetch_activity(cur):
           wait_event,
           query_start,
           now() - query_start AS duration,
-          query
+          {query}
         FROM pg_stat_activity
+        {where}
         ORDER BY query_start NULLS LAST
-    """)
-    cols = [d[0] for d in cur.description]
-    return [dict(zip(cols, r)) for r in cur.fetchall()]
+        {limit}
+"""
 
-def _fetch_blocking(cur):
-    cur.execute("""
+_BLOCKING_SQL = """
         SELECT
           bl.pid               AS blocked_pid,
           a.usename            AS blocked_user,
@@ -57,9 +62,9 @@ def _fetch_blocking(cur):
           kl.pid               AS blocking_pid,
           ka.usename           AS blocking_user,
           kl.mode              AS blocking_mode,
-          a.query              AS blocked_query,
-          ka.query             AS blocking_query,
-          now() - a.query_start AS blocked_duration
+          {blocked_query},
+          {blocking_query},
+          now() - {blocked_since} AS blocked_duration
         FROM pg_locks bl
         JOIN pg_stat_activity a ON bl.pid = a.pid
         JOIN pg_locks kl ON bl.locktype = kl.locktype
@@ -71,44 +76,379 @@ def _fetch_blocking(cur):
                           AND bl.pid <> kl.pid
         JOIN pg_stat_activity ka ON kl.pid = ka.pid
         WHERE NOT bl.granted
-    """)
+"""
+
+# python 策略：pg_locks 只取锁标识与持有信息，会话信息单独取一次，在客户端按锁标识做哈希匹配
+_LOCKS_SQL = """
+        SELECT locktype, database, relation, transactionid, classid, objid, pid, mode, granted,
+               {waited} AS waited
+        FROM pg_locks
+        WHERE pid IS NOT NULL
+"""
+
+_SESSIONS_SQL = """
+        SELECT pid, usename, {query},
+               CASE WHEN wait_event_type = 'Lock' THEN now() - state_change END AS lock_wait
+        FROM pg_stat_activity
+"""
+
+LOCK_STRATEGIES = ("sql", "python")
+
+def _rows(cur):
     cols = [d[0] for d in cur.description]
     return [dict(zip(cols, r)) for r in cur.fetchall()]
 
+def _query_column(prefix, name, query_chars=0, ids_only=False):
+    # ids_only 只取 query_id，不传输语句文本；query_chars 在服务端截断文本
+    if ids_only:
+        return f"{prefix}query_id AS {name}_id"
+    if query_chars:
+        return f"left({prefix}query, {int(query_chars)}) AS {name}"
+    return f"{prefix}query AS {name}"
+
+def _activity_query(min_ms=0, states=None, limit=0, query_chars=0, ids_only=False):
+    # 时长与状态过滤、行数限制都下推到服务端，只回传需要的行
+    where = []
+    params = []
+    if min_ms:
+        where.append("query_start <= now() - %s * interval '1 millisecond'")
+        params.append(int(min_ms))
+    if states:
+        where.append("state = ANY(%s)")
+        params.append(list(states))
+    sql = _ACTIVITY_SQL.format(
+        query=_query_column("", "query", query_chars, ids_only),
+        where="WHERE " + " AND ".join(where) if where else "",
+        limit=f"LIMIT {int(limit)}" if limit else "",
+    )
+    return sql, params or None
+
+def _has_waitstart(cur):
+    # pg_locks.waitstart 自 PG 14 起提供；更早版本与 openGauss 用等锁会话的 state_change 近似等锁起点
+    return cur.connection.server_version >= 140000
+
+def _blocking_query(query_chars=0, ids_only=False, waitstart=False):
+    return _BLOCKING_SQL.format(
+        blocked_query=_query_column("a.", "blocked_query", query_chars, ids_only),
+        blocking_query=_query_column("ka.", "blocking_query", query_chars, ids_only),
+        blocked_since="bl.waitstart" if waitstart else "CASE WHEN a.wait_event_type = 'Lock' THEN a.state_change END",
+    )
+
+def _locks_query(waitstart=False):
+    return _LOCKS_SQL.format(waited="now() - waitstart" if waitstart else "NULL::interval")
+
+def _sessions_query(query_chars=0, ids_only=False):
+    return _SESSIONS_SQL.format(query=_query_column("", "query", query_chars, ids_only))
+
+def _match_locks(locks, sessions, ids_only=False):
+    # 与 _BLOCKING_SQL 的自连接等价：同一锁标识（前 6 列，NULL 视为相等）下，
+    # 每个未授予的锁与其他 pid 的锁各成一行，两端会话都须在 pg_stat_activity 中；
+    # 等待时长优先取锁自身的 waitstart（第 10 列），没有时取会话的等锁时长
+    tags = {lk[:6] for lk in locks if not lk[8]}
+    if not tags:
+        return []
+    by_tag = {}
+    for lk in locks:
+        tag = lk[:6]
+        if tag in tags:
+            by_tag.setdefault(tag, []).append(lk)
+    info = {row[0]: row for row in sessions}
+    qname = "_id" if ids_only else ""
+    out = []
+    for group in by_tag.values():
+        for bl in group:
+            if bl[8]:
+                continue
+            a = info.get(bl[6])
+            if a is None:
+                continue
+            for kl in group:
+                if kl[6] == bl[6]:
+                    continue
+                ka = info.get(kl[6])
+                if ka is None:
+                    continue
+                out.append({
+                    "blocked_pid": bl[6],
+                    "blocked_user": a[1],
+                    "locktype": bl[0],
+                    "blocked_mode": bl[7],
+                    "blocking_pid": kl[6],
+                    "blocking_user": ka[1],
+                    "blocking_mode": kl[7],
+                    "blocked_query" + qname: a[2],
+                    "blocking_query" + qname: ka[2],
+                    "blocked_duration": bl[9] if bl[9] is not None else a[3],
+                })
+    return out
+
+def _fetch_activity(cur, min_ms=0, states=None, limit=0, query_chars=0, ids_only=False):
+    cur.execute(*_activity_query(min_ms, states, limit, query_chars, ids_only))
+    return _rows(cur)
+
+def _python_blocking(cur, locks_sql, sessions_sql, ids_only=False):
+    cur.execute(locks_sql)
+    locks = cur.fetchall()
+    if all(lk[8] for lk in locks):
+        return []
+    cur.execute(sessions_sql)
+    return _match_locks(locks, cur.fetchall(), ids_only)
+
+def _fetch_blocking(cur, query_chars=0, ids_only=False, strategy="sql"):
+    waitstart = _has_waitstart(cur)
+    if strategy == "python":
+        return _python_blocking(cur, _locks_query(waitstart), _sessions_query(query_chars, ids_only), ids_only)
+    cur.execute(_blocking_query(query_chars, ids_only, waitstart))
+    return _rows(cur)
+
+def _long_running(activity, min_ms):
+    long_running = []
+    for row in activity:
+        d = row.get("duration")
+        if d is not None:
+            ms = int(d.total_seconds() * 1000)
+            if ms >= min_ms:
+                row["_duration_ms"] = ms
+                long_running.append(row)
+    return long_running
+
+def _open_sampler(filters, strategy="sql"):
+    # 常驻连接：autocommit 保证每次采样的 now() 都是新的，且不长期持有事务快照；
+    # 两条查询在服务端 PREPARE（过滤条件在 PREPARE 时绑定），后续采样只发送 EXECUTE
+    conn = _connect()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("SET application_name = 'transaction_inspector'")
+    activity_sql = cur.mogrify(*_activity_query(**filters)).decode()
+    cur.execute("PREPARE ti_activity AS " + activity_sql)
+    query_chars, ids_only = filters.get("query_chars", 0), filters.get("ids_only", False)
+    waitstart = _has_waitstart(cur)
+    if strategy == "python":
+        cur.execute("PREPARE ti_locks AS " + _locks_query(waitstart))
+        cur.execute("PREPARE ti_sessions AS " + _sessions_query(query_chars, ids_only))
+    else:
+        cur.execute("PREPARE ti_blocking AS " + _blocking_query(query_chars, ids_only, waitstart))
+    return conn, cur
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _sample(cur, min_ms, graph, strategy="sql", ids_only=False):
+    t0 = time.perf_counter()
+    cur.execute("EXECUTE ti_activity")
+    activity = _rows(cur)
+    if strategy == "python":
+        blocking = _python_blocking(cur, "EXECUTE ti_locks", "EXECUTE ti_sessions", ids_only)
+    else:
+        cur.execute("EXECUTE ti_blocking")
+        blocking = _rows(cur)
+    # 等待图跨采样保留，只按新增/消失的等待边增量更新
+    graph_summary = graph.update(edges_from_blocking(blocking)).snapshot()
+    return {
+        "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "activity_rows": len(activity),
+        "long_running": _long_running(activity, min_ms),
+        "blocking": blocking,
+        "graph": graph_summary,
+        "alerts": evaluate_blocking_alerts(graph_summary),
+        "sample_ms": round((time.perf_counter() - t0) * 1000, 2),
+    }
+
+def run_sampler(min_ms, interval, ring_size, count=0, dump=None, as_json=False, filters=None, lock_strategy="sql",
+                store=None):
+    filters = filters or {"min_ms": min_ms}
+    store = MetricsStore(store) if store else None
+    ring = deque(maxlen=ring_size)
+    graph = WaitForGraph()
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    conn = cur = None
+    backoff = 1
+    taken = 0
+    try:
+        while not stop and (count <= 0 or taken < count):
+            started = time.monotonic()
+            try:
+                if conn is None or conn.closed:
+                    conn, cur = _open_sampler(filters, lock_strategy)
+                snap = _sample(cur, min_ms, graph, lock_strategy, filters.get("ids_only", False))
+                backoff = 1
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # 连接断开：退避重连，重连后重新 PREPARE
+                print(f"采样连接异常，{backoff}s 后重连: {e}", flush=True)
+                if conn is not None:
+                    _close_quietly(conn)
+                conn = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            except (psycopg2.Error, RuntimeError) as e:
+                # PREPARE 失败（如服务端版本缺少 query_id 列）等非连接错误，重连也无法恢复
+                print(f"执行失败: {e}", flush=True)
+                break
+            ring.append(snap)
+            taken += 1
+            if store is not None:
+                metrics = _metrics(snap)
+                metrics["tx.activity_rows"] = snap["activity_rows"]
+                metrics["tx.sample_ms"] = snap["sample_ms"]
+                store.write_many(metrics, tags={"target": "local"})
+            if as_json:
+                print(json.dumps(snap, ensure_ascii=False, default=str), flush=True)
+            else:
+                print(f"{snap['ts']} rows={snap['activity_rows']} long_running={len(snap['long_running'])} "
+                      f"blocking={len(snap['blocking'])} roots={snap['graph']['root_blockers']} "
+                      f"max_chain={snap['graph']['max_chain_length']} alerts={len(snap['alerts'])} "
+                      f"sample_ms={snap['sample_ms']}", flush=True)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if conn is not None:
+            _close_quietly(conn)
+        if store is not None:
+            store.close()
+        if dump:
+            with open(dump, "w", encoding="utf-8") as f:
+                json.dump(list(ring), f, ensure_ascii=False, default=str)
+    return ring
+
+def inspect_instance(cur, filters, lock_strategy="sql"):
+    activity = _fetch_activity(cur, **filters)
+    blocking = _fetch_blocking(cur, filters.get("query_chars", 0), filters.get("ids_only", False), lock_strategy)
+    graph = WaitForGraph().update(edges_from_blocking(blocking)).snapshot()
+    return {
+        "long_running": _long_running(activity, filters.get("min_ms", 0)),
+        "blocking": blocking,
+        "graph": graph,
+        "alerts": evaluate_blocking_alerts(graph),
+    }
+
+def _metrics(report):
+    graph = report["graph"]
+    return {
+        "tx.long_running": len(report["long_running"]),
+        "tx.blocking": len(report["blocking"]),
+        "tx.root_blockers": graph["root_blockers"],
+        "tx.max_chain_length": graph["max_chain_length"],
+        "tx.max_cumulative_blocked_s": max((r["cumulative_blocked_s"] for r in graph["roots"]), default=0),
+        "tx.cycles": len(graph["cycles"]),
+        "tx.alerts": len(report["alerts"]),
+    }
+
+def _merge_fleet(report):
+    # 汇总各实例结果：计数求和，告警与长事务带上实例名后合并排序
+    summary = {"long_running": 0, "blocking": 0, "root_blockers": 0, "max_chain_length": 0,
+               "alerts": [], "longest": []}
+    for name, r in report["results"].items():
+        if not r["ok"]:
+            continue
+        res = r["result"]
+        summary["long_running"] += len(res["long_running"])
+        summary["blocking"] += len(res["blocking"])
+        summary["root_blockers"] += res["graph"]["root_blockers"]
+        summary["max_chain_length"] = max(summary["max_chain_length"], res["graph"]["max_chain_length"])
+        summary["alerts"] += [dict(a, target=name) for a in res["alerts"]]
+        summary["longest"] += [{"target": name, "pid": x["pid"], "ms": x["_duration_ms"]} for x in res["long_running"]]
+    summary["longest"] = sorted(summary["longest"], key=lambda x: x["ms"], reverse=True)[:20]
+    report["summary"] = summary
+    return report
+
+def _print_report(report, min_ms, ids_only):
+    long_running, blocking, graph, alerts = (report["long_running"], report["blocking"],
+                                             report["graph"], report["alerts"])
+    print(f"长时间运行语句阈值: {min_ms} ms")
+    print(f"长时间运行语句数量: {len(long_running)}")
+    for i, r in enumerate(long_running[:20], 1):
+        print(f"{i}. pid={r['pid']} user={r['usename']} db={r['datname']} ms={r['_duration_ms']}")
+        print(f"   {r['query_id'] if ids_only else r['query']}")
+    print(f"\n阻塞链路数量: {len(blocking)}")
+    for i, b in enumerate(blocking[:20], 1):
+        dur = b.get("blocked_duration")
+        ms = int(dur.total_seconds() * 1000) if dur else 0
+        print(f"{i}. blocked_pid={b['blocked_pid']} blocking_pid={b['blocking_pid']} ms={ms} lock={b['locktype']} mode={b['blocked_mode']}->{b['blocking_mode']}")
+    print(f"\n根阻塞者数量: {graph['root_blockers']}  最长链路: {graph['max_chain_length']}  等待环: {len(graph['cycles'])}")
+    for i, r in enumerate(graph["roots"], 1):
+        print(f"{i}. root_pid={r['pid']} direct={r['direct_waiters']} total={r['total_waiters']} "
+              f"chain={r['chain_length']} cumulative_s={r['cumulative_blocked_s']} max_wait_s={r['max_wait_s']}")
+    for c in graph["cycles"]:
+        print(f"   等待环: {' -> '.join(map(str, c))}")
+    for a in alerts:
+        print(f"告警: {json.dumps(a, ensure_ascii=False)}")
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--min-duration-ms", type=int, default=1000)
     parser.add_argument("--json", action="store_true")
+    parser.add_argument("--sample", action="store_true", help="常驻采样模式，复用同一连接按间隔持续采样")
+    parser.add_argument("--interval", type=float, default=1.0, help="采样间隔秒数，可小于 1")
+    parser.add_argument("--ring-size", type=int, default=600, help="内存环形缓冲保留的快照数")
+    parser.add_argument("--count", type=int, default=0, help="采样次数，0 表示持续运行")
+    parser.add_argument("--dump", help="退出时把环形缓冲中的快照写入该 JSON 文件")
+    parser.add_argument("--states", help="只取这些状态的会话，逗号分隔，如 active,idle in transaction")
+    parser.add_argument("--limit", type=int, default=0, help="服务端返回的最大会话行数，0 表示不限")
+    parser.add_argument("--query-chars", type=int, default=0, help="服务端截断语句文本的字符数，0 表示不截断")
+    parser.add_argument("--ids-only", action="store_true", help="只取 query_id，不传输语句文本")
+    parser.add_argument("--lock-strategy", choices=LOCK_STRATEGIES, default="sql",
+                        help="sql: 服务端 pg_locks 自连接；python: 取一次 pg_locks 快照在客户端哈希匹配，锁数量很大时更省服务端")
+    parser.add_argument("--dsn", action="append", help="集群巡检的目标 DSN，可重复指定")
+    parser.add_argument("--targets", help="集群巡检目标文件，每行 \"名称 DSN\" 或只写 DSN")
+    parser.add_argument("--timeout", type=float, default=10, help="集群巡检时单个实例的超时秒数")
+    parser.add_argument("--fleet-workers", type=int, default=0, help="集群巡检并发线程数，0 表示每个实例一个（最多 32）")
+    parser.add_argument("--store", help="把指标写入该本地时序库（SQLite）")
     args = parser.parse_args()
+    filters = {
+        "min_ms": args.min_duration_ms,
+        "states": [s.strip() for s in args.states.split(",")] if args.states else None,
+        "limit": args.limit,
+        "query_chars": args.query_chars,
+        "ids_only": args.ids_only,
+    }
+    if args.dsn or args.targets:
+        try:
+            targets = load_targets(args.dsn, args.targets)
+            report = _merge_fleet(run_fleet(targets, lambda cur: inspect_instance(cur, filters, args.lock_strategy),
+                                            args.timeout, args.fleet_workers or None, "transaction_inspector"))
+            if args.store:
+                record(args.store, [(m, v, {"target": name}) for name, r in report["results"].items() if r["ok"]
+                                    for m, v in _metrics(r["result"]).items()])
+        except Exception as e:
+            print(f"执行失败: {e}")
+            return
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False, default=str, indent=2))
+        else:
+            s = report["summary"]
+            print(f"实例数: {report['targets']}  成功: {report['ok']}  失败: {report['failed']}  耗时: {report['elapsed_ms']} ms")
+            for name, r in report["results"].items():
+                if r["ok"]:
+                    res = r["result"]
+                    print(f"  {name}: long_running={len(res['long_running'])} blocking={len(res['blocking'])} "
+                          f"max_chain={res['graph']['max_chain_length']} alerts={len(res['alerts'])} ms={r['elapsed_ms']}")
+                else:
+                    print(f"  {name}: 失败 {r['error']}")
+            print(f"合计: long_running={s['long_running']} blocking={s['blocking']} root_blockers={s['root_blockers']} "
+                  f"max_chain={s['max_chain_length']}")
+            for a in s["alerts"]:
+                print(f"告警: {json.dumps(a, ensure_ascii=False)}")
+        return
+    if args.sample:
+        run_sampler(args.min_duration_ms, args.interval, args.ring_size, args.count, args.dump, args.json, filters,
+                    args.lock_strategy, args.store)
+        return
     try:
         conn = _connect()
         cur = conn.cursor()
-        activity = _fetch_activity(cur)
-        blocking = _fetch_blocking(cur)
-        long_running = []
-        for row in activity:
-            d = row.get("duration")
-            if d is not None:
-                ms = int(d.total_seconds() * 1000)
-                if ms >= args.min_duration_ms:
-                    row["_duration_ms"] = ms
-                    long_running.append(row)
+        report = inspect_instance(cur, filters, args.lock_strategy)
+        if args.store:
+            record(args.store, _metrics(report), {"target": "local"})
         if args.json:
-            print(json.dumps({
-                "long_running": long_running,
-                "blocking": blocking
-            }, ensure_ascii=False, default=str, indent=2))
+            print(json.dumps(report, ensure_ascii=False, default=str, indent=2))
         else:
-            print(f"长时间运行语句阈值: {args.min_duration_ms} ms")
-            print(f"长时间运行语句数量: {len(long_running)}")
-            for i, r in enumerate(long_running[:20], 1):
-                print(f"{i}. pid={r['pid']} user={r['usename']} db={r['datname']} ms={r['_duration_ms']}")
-                print(f"   {r['query']}")
-            print(f"\n阻塞链路数量: {len(blocking)}")
-            for i, b in enumerate(blocking[:20], 1):
-                dur = b.get("blocked_duration")
-                ms = int(dur.total_seconds() * 1000) if dur else 0
-                print(f"{i}. blocked_pid={b['blocked_pid']} blocking_pid={b['blocking_pid']} ms={ms} lock={b['locktype']} mode={b['blocked_mode']}->{b['blocking_mode']}")
+            _print_report(report, args.min_duration_ms, args.ids_only)
         cur.close()
         conn.close()
     except Exception as e:
@@ -116,4 +456,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
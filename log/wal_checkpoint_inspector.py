@@ -1,8 +1,18 @@
 import os
 import sys
 from pathlib import Path
+import argparse
+import re
+import signal
+import statistics
+import time
+from collections import deque
 import psycopg2
 import json
+import math
+
+from fleet import load_targets, run_fleet
+from metrics_store import MetricsStore, flatten, record
 
 def _try_import_db_config():
     candidates = [
@@ -26,8 +36,7 @@ def _connect():
         raise RuntimeError("无法导入 db_config.py")
     return psycopg2.connect(**db_cfg.opengauss_config)
 
-def _fetch_bgwriter(cur):
-    cur.execute("""
+_BGWRITER_SQL = """
         SELECT
           checkpoints_timed,
           checkpoints_req,
@@ -37,7 +46,29 @@ def _fetch_bgwriter(cur):
           checkpoint_write_time,
           checkpoint_sync_time
         FROM pg_stat_bgwriter
-    """)
+"""
+
+# PG 17 起检查点计数移到 pg_stat_checkpointer，pg_stat_bgwriter 只保留后台清理计数；列名按旧视图对齐
+_CHECKPOINTER_SQL = """
+        SELECT
+          c.num_timed AS checkpoints_timed,
+          c.num_requested AS checkpoints_req,
+          c.buffers_written AS buffers_checkpoint,
+          b.buffers_clean,
+          b.maxwritten_clean,
+          c.write_time AS checkpoint_write_time,
+          c.sync_time AS checkpoint_sync_time
+        FROM pg_stat_checkpointer c CROSS JOIN pg_stat_bgwriter b
+"""
+
+def _server_version(cur):
+    cur.execute("SHOW server_version_num")
+    return int(cur.fetchone()[0])
+
+def _fetch_bgwriter(cur, version=None):
+    if version is None:
+        version = _server_version(cur)
+    cur.execute(_CHECKPOINTER_SQL if version >= 170000 else _BGWRITER_SQL)
     cols = [d[0] for d in cur.description]
     return dict(zip(cols, cur.fetchone()))
 
@@ -57,13 +88,341 @@ def _advise(stats):
         adv.append("检查点与 WAL 状态正常")
     return adv
 
+_COUNTERS = ("checkpoints_timed", "checkpoints_req", "buffers_checkpoint", "buffers_clean",
+             "maxwritten_clean", "checkpoint_write_time", "checkpoint_sync_time")
+_WAL_COUNTERS = ("wal_records", "wal_fpi", "wal_bytes")
+_WAL_SETTINGS = ("max_wal_size", "checkpoint_segments", "wal_segment_size", "checkpoint_timeout",
+                 "checkpoint_completion_target", "block_size", "full_page_writes")
+_UNIT_RE = re.compile(r"^(\d*)\s*(B|kB|MB|GB|TB)$")
+_UNIT_BYTES = {"B": 1, "kB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30, "TB": 1 << 40}
+
+def _lsn_bytes(lsn):
+    if not lsn:
+        return None
+    hi, _, lo = str(lsn).partition("/")
+    return (int(hi, 16) << 32) + int(lo, 16)
+
+def _setting_value(setting, unit):
+    # pg_settings 的内存类单位可能带倍数，如 8kB、16MB
+    m = _UNIT_RE.match(unit or "")
+    if m:
+        return int(float(setting) * int(m.group(1) or 1) * _UNIT_BYTES[m.group(2)])
+    try:
+        return float(setting)
+    except (TypeError, ValueError):
+        return setting
+
+def _capabilities(cur):
+    # 按版本选择可用的视图与函数：openGauss 与 PG 9.x 用 xlog 命名，PG 10 起为 wal；
+    # pg_stat_wal 自 PG 14，pg_stat_io 自 PG 16（PG 18 起以 write_bytes 替代 op_bytes）
+    version = _server_version(cur)
+    if version >= 100000:
+        lsn_sql = ("SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() "
+                   "ELSE pg_current_wal_lsn() END::text")
+    else:
+        lsn_sql = ("SELECT CASE WHEN pg_is_in_recovery() THEN pg_last_xlog_replay_location() "
+                   "ELSE pg_current_xlog_location() END::text")
+    io_sql = None
+    if version >= 160000:
+        written = "write_bytes" if version >= 180000 else "writes * op_bytes"
+        io_sql = (f"SELECT backend_type, sum({written})::bigint, sum(fsyncs)::bigint FROM pg_stat_io "
+                  f"WHERE writes IS NOT NULL GROUP BY backend_type")
+    cur.execute("SELECT name, setting, unit FROM pg_settings WHERE name = ANY(%s)", (list(_WAL_SETTINGS),))
+    settings = {name: _setting_value(setting, unit) for name, setting, unit in cur.fetchall()}
+    return {"version": version, "lsn_sql": lsn_sql, "stat_wal": version >= 140000, "io_sql": io_sql,
+            "settings": settings}
+
+def _snapshot(cur, caps=None):
+    stats = _fetch_bgwriter(cur, caps["version"] if caps else None)
+    stats["_t"] = time.monotonic()
+    if caps:
+        cur.execute(caps["lsn_sql"])
+        stats["_lsn"] = _lsn_bytes(cur.fetchone()[0])
+        if caps["stat_wal"]:
+            cur.execute("SELECT wal_records, wal_fpi, wal_bytes FROM pg_stat_wal")
+            stats.update(zip(_WAL_COUNTERS, (int(v) for v in cur.fetchone())))
+        if caps["io_sql"]:
+            cur.execute(caps["io_sql"])
+            stats["_io"] = {bt: (wb or 0, fs or 0) for bt, wb, fs in cur.fetchall()}
+    return stats
+
+def _delta(prev, cur):
+    # 两次快照之间的计数增量；任一计数回退说明统计被重置，该区间丢弃
+    d = {k: (cur.get(k) or 0) - (prev.get(k) or 0) for k in _COUNTERS + _WAL_COUNTERS}
+    if any(v < 0 for v in d.values()):
+        return None
+    d["interval_s"] = cur["_t"] - prev["_t"]
+    # LSN 差值即区间内产生（备机上为回放）的 WAL 字节数
+    d["lsn_bytes"] = None
+    if cur.get("_lsn") is not None and prev.get("_lsn") is not None and cur["_lsn"] >= prev["_lsn"]:
+        d["lsn_bytes"] = cur["_lsn"] - prev["_lsn"]
+    if "_io" in cur and "_io" in prev:
+        d["io"] = {bt: (wb - prev["_io"].get(bt, (0, 0))[0], fs - prev["_io"].get(bt, (0, 0))[1])
+                   for bt, (wb, fs) in cur["_io"].items()}
+    return d
+
+def _rates(deltas, block_size=8192):
+    # 多个区间按增量求和后再除以总时长，避免短区间放大抖动
+    total = {k: sum(d[k] for d in deltas) for k in _COUNTERS + _WAL_COUNTERS}
+    secs = sum(d["interval_s"] for d in deltas)
+    ckpts = total["checkpoints_timed"] + total["checkpoints_req"]
+    out = {
+        "window_s": round(secs, 1),
+        "checkpoints": ckpts,
+        "checkpoints_req": total["checkpoints_req"],
+        "checkpoints_per_min": round(ckpts * 60 / secs, 3) if secs else 0.0,
+        "buffers_checkpoint_per_s": round(total["buffers_checkpoint"] / secs, 2) if secs else 0.0,
+        "buffers_clean_per_s": round(total["buffers_clean"] / secs, 2) if secs else 0.0,
+        "maxwritten_clean": total["maxwritten_clean"],
+        "write_ms_per_checkpoint": round(total["checkpoint_write_time"] / ckpts, 1) if ckpts else None,
+        "sync_ms_per_checkpoint": round(total["checkpoint_sync_time"] / ckpts, 1) if ckpts else None,
+    }
+    lsn = [d["lsn_bytes"] for d in deltas if d.get("lsn_bytes") is not None]
+    if lsn and secs:
+        out["wal_bytes_per_s"] = round(sum(lsn) / secs, 1)
+    if total["wal_bytes"]:
+        # pg_stat_wal 的整页镜像数按块大小估算字节，页内空洞压缩会使真实占比略低
+        out["fpw_share"] = round(min(1.0, total["wal_fpi"] * block_size / total["wal_bytes"]), 3)
+        out["fpw_share_method"] = "pg_stat_wal"
+    io = {}
+    for d in deltas:
+        for bt, (wb, fs) in d.get("io", {}).items():
+            acc = io.setdefault(bt, [0, 0])
+            acc[0] += wb
+            acc[1] += fs
+    if io and secs:
+        out["io_write_bytes_per_s"] = {bt: round(v[0] / secs, 1) for bt, v in io.items() if v[0]}
+        out["io_fsyncs"] = {bt: v[1] for bt, v in io.items() if v[1]}
+    return out
+
+def _estimate_fpw_share(deltas):
+    # 无 pg_stat_wal 时的估算：检查点开始后每页首次修改都写整页镜像，
+    # 含检查点开始的区间 WAL 速率相对其余区间的抬升部分近似为整页写占比
+    after, base = [], []
+    for d in deltas:
+        if d.get("lsn_bytes") is None or not d["interval_s"]:
+            continue
+        rate = d["lsn_bytes"] / d["interval_s"]
+        (after if d["checkpoints_timed"] + d["checkpoints_req"] else base).append(rate)
+    if not after or not base:
+        return None
+    a = statistics.median(after)
+    return round(min(1.0, max(0.0, 1 - statistics.median(base) / a)), 3) if a else None
+
+def _projection(wal_bytes_per_s, settings):
+    # 按实测 WAL 速率推算写满 max_wal_size 所需时间；两次检查点之间需保留的 WAL 约为
+    # 速率 * checkpoint_timeout * (1 + checkpoint_completion_target)，超过 max_wal_size 即会提前触发请求检查点。
+    # 没有 max_wal_size 的版本（openGauss、PG 9.4 及更早）在上次检查点后写满 checkpoint_segments 个段即触发，
+    # 不乘 completion_target 系数。判定与建议值使用同一公式
+    limit = settings.get("max_wal_size")
+    segment = settings.get("wal_segment_size", 16 << 20)
+    segments = not isinstance(limit, (int, float)) and isinstance(settings.get("checkpoint_segments"), (int, float))
+    if segments:
+        limit = settings["checkpoint_segments"] * segment
+    timeout = settings.get("checkpoint_timeout")
+    target = settings.get("checkpoint_completion_target", 0.5)
+    if not wal_bytes_per_s or not isinstance(limit, (int, float)):
+        return None
+    out = {
+        "max_wal_size_mb": round(limit / (1 << 20), 1),
+        "seconds_to_max_wal_size": round(limit / wal_bytes_per_s, 1),
+    }
+    if isinstance(timeout, (int, float)) and isinstance(target, (int, float)):
+        needed = wal_bytes_per_s * timeout * (1 if segments else 1 + target)
+        out["checkpoint_timeout_s"] = timeout
+        out["wal_per_checkpoint_mb"] = round(needed / (1 << 20), 1)
+        out["wal_triggered"] = limit < needed
+        if segments:
+            out["checkpoint_segments"] = settings["checkpoint_segments"]
+            out["suggested_checkpoint_segments"] = math.ceil(needed / segment)
+        else:
+            out["suggested_max_wal_size_mb"] = math.ceil(needed / (1 << 20))
+    return out
+
+def _wal_spike(window, history, ratio=2.0):
+    # 最近窗口 WAL 速率超过较长历史中位数的 ratio 倍视为突增
+    rates = [d["lsn_bytes"] / d["interval_s"] for d in history if d.get("lsn_bytes") is not None and d["interval_s"]]
+    current = window.get("wal_bytes_per_s")
+    if current is None or len(rates) < 3:
+        return False
+    base = statistics.median(rates)
+    return bool(base) and current > base * ratio
+
+def _advise_window(rates, checkpoint_ms=30000, wal_spike=False, projection=None):
+    # 基于最近窗口的速率给出建议；WAL 突增取 LSN 速率相对历史的抬升，
+    # 无 LSN 数据时以请求触发的检查点（WAL 量达到上限）作为信号
+    adv = []
+    alerts = []
+    ckpts = rates["checkpoints"]
+    req = rates["checkpoints_req"]
+    per_ckpt = (rates["write_ms_per_checkpoint"] or 0) + (rates["sync_ms_per_checkpoint"] or 0)
+    if ckpts and req * 2 > ckpts:
+        adv.append("最近窗口内检查点多为请求触发，评估增大 max_wal_size 或 checkpoint_timeout")
+    if ckpts and per_ckpt > checkpoint_ms:
+        adv.append("最近窗口内单次检查点写入/同步耗时较高，评估磁盘带宽与 checkpoint_completion_target")
+        spike = wal_spike if "wal_bytes_per_s" in rates else bool(req)
+        if spike:
+            alerts.append({"alert": "检查点耗时 > 30s 且 WAL 写入突增", "checkpoint_ms": round(per_ckpt, 1),
+                           "checkpoints_req": req, "wal_bytes_per_s": rates.get("wal_bytes_per_s"),
+                           "window_s": rates["window_s"]})
+    if rates["buffers_checkpoint_per_s"] and rates["buffers_clean_per_s"] < rates["buffers_checkpoint_per_s"] / 2:
+        adv.append("最近窗口内后台清理较少，相对检查点写入偏多，评估 bgwriter 参数与 shared_buffers")
+    if rates["maxwritten_clean"]:
+        adv.append("bgwriter 多次因 bgwriter_lru_maxpages 中止清理，评估调大该参数")
+    if projection and projection.get("wal_triggered"):
+        if "suggested_checkpoint_segments" in projection:
+            adv.append(f"按当前 WAL 速率，一个检查点周期约产生 {projection['wal_per_checkpoint_mb']}MB WAL，"
+                       f"超过 checkpoint_segments（{projection['checkpoint_segments']} 个段），"
+                       f"会在 checkpoint_timeout 前触发检查点，"
+                       f"建议 checkpoint_segments 不低于 {projection['suggested_checkpoint_segments']}")
+        else:
+            adv.append(f"按当前 WAL 速率，一个检查点周期约产生 {projection['wal_per_checkpoint_mb']}MB WAL，"
+                       f"超过 max_wal_size（{projection['max_wal_size_mb']}MB），会在 checkpoint_timeout 前触发检查点，"
+                       f"建议 max_wal_size 不低于 {projection['suggested_max_wal_size_mb']}MB")
+    if (rates.get("fpw_share") or 0) > 0.5:
+        adv.append("整页写占 WAL 比例过半，评估拉长检查点间隔或开启 wal_compression")
+    if not adv:
+        adv.append("最近窗口内检查点与 WAL 状态正常")
+    return adv, alerts
+
+def _evaluate(deltas, history, caps):
+    block_size = caps["settings"].get("block_size", 8192)
+    window = _rates(deltas, block_size)
+    if "fpw_share" not in window:
+        est = _estimate_fpw_share(history)
+        if est is not None:
+            window["fpw_share"] = est
+            window["fpw_share_method"] = "checkpoint_rate_uplift"
+    projection = _projection(window.get("wal_bytes_per_s"), caps["settings"])
+    adv, alerts = _advise_window(window, wal_spike=_wal_spike(window, history), projection=projection)
+    return window, projection, adv, alerts
+
+def run_sampler(interval=10, count=0, window=6, as_json=False, history=180, store=None):
+    # 常驻连接按间隔取快照；每个区间输出区间速率，建议与告警基于最近 window 个区间，
+    # 更长的 history 用作 WAL 速率基线与整页写占比估算
+    deltas = deque(maxlen=window)
+    past = deque(maxlen=max(history, window))
+    caps = None
+    store = MetricsStore(store) if store else None
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+    conn = cur = prev = None
+    backoff = 1
+    taken = 0
+    try:
+        while not stop and (count <= 0 or taken < count):
+            started = time.monotonic()
+            try:
+                if conn is None or conn.closed:
+                    conn = _connect()
+                    conn.autocommit = True
+                    cur = conn.cursor()
+                    caps = _capabilities(cur)
+                    prev = None
+                snap = _snapshot(cur, caps)
+                backoff = 1
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                print(f"采样连接异常，{backoff}s 后重连: {e}", flush=True)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+                continue
+            d = _delta(prev, snap) if prev is not None else None
+            if prev is not None and d is None:
+                deltas.clear()
+                past.clear()
+            prev = snap
+            if d is not None:
+                deltas.append(d)
+                taken += 1
+                win, projection, adv, alerts = _evaluate(deltas, past, caps)
+                past.append(d)
+                out = {"ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "interval": _rates([d], caps["settings"].get("block_size", 8192)),
+                       "window": win, "projection": projection, "advice": adv, "alerts": alerts}
+                if store is not None:
+                    metrics = flatten("wal", out["interval"])
+                    flatten("wal.projection", projection or {}, metrics)
+                    metrics["wal.fpw_share"] = win.get("fpw_share")
+                    metrics["wal.alerts"] = len(alerts)
+                    store.write_many(metrics, tags={"target": "local"})
+                if as_json:
+                    print(json.dumps(out, ensure_ascii=False), flush=True)
+                else:
+                    r = out["interval"]
+                    print(f"{out['ts']} ckpt/min={r['checkpoints_per_min']} req={r['checkpoints_req']} "
+                          f"buf_ckpt/s={r['buffers_checkpoint_per_s']} buf_clean/s={r['buffers_clean_per_s']} "
+                          f"write_ms/ckpt={r['write_ms_per_checkpoint']} sync_ms/ckpt={r['sync_ms_per_checkpoint']} "
+                          f"wal_B/s={r.get('wal_bytes_per_s')} fpw={out['window'].get('fpw_share')}", flush=True)
+                    for a in alerts:
+                        print(f"告警: {json.dumps(a, ensure_ascii=False)}", flush=True)
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if store is not None:
+            store.close()
+    return list(deltas)
+
+def inspect_instance(cur):
+    stats = _fetch_bgwriter(cur)
+    return {"stats": stats, "advice": _advise(stats)}
+
+def _merge_fleet(report):
+    # 汇总：各实例建议按内容归并，列出命中该建议的实例
+    by_advice = {}
+    for name, r in report["results"].items():
+        if r["ok"]:
+            for a in r["result"]["advice"]:
+                by_advice.setdefault(a, []).append(name)
+    report["summary"] = {"advice": [{"advice": a, "targets": names} for a, names in by_advice.items()]}
+    return report
+
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sample", action="store_true", help="按间隔连续采样，基于计数增量计算区间速率")
+    parser.add_argument("--interval", type=float, default=10, help="采样间隔秒数")
+    parser.add_argument("--count", type=int, default=0, help="输出的区间数，0 表示持续运行")
+    parser.add_argument("--window", type=int, default=6, help="建议与告警所依据的最近区间数")
+    parser.add_argument("--history", type=int, default=180, help="作为 WAL 速率基线与整页写估算的历史区间数")
+    parser.add_argument("--json", action="store_true", help="采样模式下每个区间输出一行 JSON")
+    parser.add_argument("--dsn", action="append", help="集群巡检的目标 DSN，可重复指定")
+    parser.add_argument("--targets", help="集群巡检目标文件，每行 \"名称 DSN\" 或只写 DSN")
+    parser.add_argument("--timeout", type=float, default=10, help="集群巡检时单个实例的超时秒数")
+    parser.add_argument("--fleet-workers", type=int, default=0, help="集群巡检并发线程数，0 表示每个实例一个（最多 32）")
+    parser.add_argument("--store", help="把指标写入该本地时序库（SQLite）")
+    args = parser.parse_args()
+    if args.sample:
+        run_sampler(args.interval, args.count, args.window, args.json, args.history, args.store)
+        return
+    if args.dsn or args.targets:
+        try:
+            report = _merge_fleet(run_fleet(load_targets(args.dsn, args.targets), inspect_instance, args.timeout,
+                                            args.fleet_workers or None, "wal_checkpoint_inspector"))
+            if args.store:
+                record(args.store, [(m, v, {"target": name}) for name, r in report["results"].items() if r["ok"]
+                                    for m, v in flatten("wal.stats", r["result"]["stats"]).items()])
+            print(json.dumps(report, ensure_ascii=False, default=str, indent=2))
+        except Exception as e:
+            print(f"执行失败: {e}")
+        return
     try:
         conn = _connect()
         cur = conn.cursor()
-        stats = _fetch_bgwriter(cur)
-        adv = _advise(stats)
-        print(json.dumps({"stats": stats, "advice": adv}, ensure_ascii=False, indent=2))
+        result = inspect_instance(cur)
+        if args.store:
+            record(args.store, flatten("wal.stats", result["stats"]), {"target": "local"})
+        print(json.dumps(result, ensure_ascii=False, indent=2))
         cur.close()
         conn.close()
     except Exception as e:
@@ -71,4 +430,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,220 @@
+"""
+文件解析结果缓存
+"""
+import hashlib
+import importlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+# 相对路径按本模块所在目录解析，不依赖进程工作目录；默认放在已被 .gitignore 忽略的 data/ 下
+PARSE_CACHE_PATH = Path(__file__).resolve().parent / os.getenv("PARSE_CACHE_PATH", "data/parse_cache.db")
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", 1 << 30))
+# 已提交但未取回结果的解析任务绑定保留时长
+TASK_BINDING_TTL = 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parse_cache (
+    key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    parser_version TEXT NOT NULL,
+    options TEXT NOT NULL,
+    content BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_parse_cache_accessed ON parse_cache (accessed_at);
+CREATE TABLE IF NOT EXISTS file_contents (
+    file_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parse_tasks (
+    task_id TEXT PRIMARY KEY,
+    file_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    options TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_parse_tasks (
+    task_id TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    options TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (task_id, file_id)
+);
+"""
+
+
+def parser_version(package=None):
+    """解析器版本：显式的 PARSER_VERSION 加上解析器包内全部源码的摘要，任一解析器改动都会产生新版本"""
+    package = package or importlib.import_module("app.parsers")
+    digest = hashlib.sha256(str(getattr(package, "PARSER_VERSION", "")).encode())
+    root = Path(package.__file__).resolve().parent
+    for path in sorted(root.rglob("*.py")):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _options_key(options):
+    return json.dumps(options or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+class ParseCache:
+    """以 (内容哈希, 解析器版本, 解析选项) 为键的持久化缓存，超出容量时按最近访问时间淘汰"""
+
+    def __init__(self, path=PARSE_CACHE_PATH, max_bytes=PARSE_CACHE_MAX_BYTES, version=None):
+        self.path = str(path)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.version = version or parser_version()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # 解析器变化后旧版本结果全部失效
+            conn.execute("DELETE FROM parse_cache WHERE parser_version <> ?", (self.version,))
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _key(self, content_hash, options):
+        raw = f"{content_hash}:{self.version}:{_options_key(options)}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, content_hash, options=None):
+        if not content_hash:
+            return None
+        key = self._key(content_hash, options)
+        with self._connect() as conn:
+            row = conn.execute("SELECT content FROM parse_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE parse_cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, content_hash, result, options=None):
+        if not content_hash or result is None:
+            return
+        blob = zlib.compress(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+        if len(blob) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(content_hash, options), content_hash, self.version, _options_key(options),
+                 blob, len(blob), now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parse_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # 淘汰到容量的 90%，避免每次写入都触发淘汰
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM parse_cache ORDER BY accessed_at"):
+            victims.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM parse_cache WHERE key = ?", victims)
+
+    def invalidate(self, content_hash):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM parse_cache WHERE content_hash = ?", (content_hash,))
+
+    def file_hash(self, file_id):
+        """上传时记录的内容哈希；没有记录（如本功能上线前上传的文件）时返回 None，不使用缓存"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT content_hash FROM file_contents WHERE file_id = ?", (file_id,)).fetchone()
+        return row[0] if row else None
+
+    def remember_file_hash(self, file_id, content_hash):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO file_contents VALUES (?, ?)", (file_id, content_hash))
+
+    def forget_file(self, file_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM file_contents WHERE file_id = ?", (file_id,))
+
+    def bind_task(self, task_id, file_id, content_hash, options=None):
+        """记录解析任务属于哪个文件及其内容哈希，任务完成后只按该绑定写入缓存"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM parse_tasks WHERE created_at < ?", (now - TASK_BINDING_TTL,))
+            conn.execute("INSERT OR REPLACE INTO parse_tasks VALUES (?, ?, ?, ?, ?)",
+                         (task_id, file_id, content_hash, _options_key(options), now))
+
+    def task_binding(self, task_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT file_id, content_hash, options FROM parse_tasks WHERE task_id = ?",
+                               (task_id,)).fetchone()
+        if row is None:
+            return None
+        return {"file_id": row[0], "content_hash": row[1], "options": json.loads(row[2])}
+
+    def complete_task(self, task_id, result):
+        """按任务绑定写入缓存并删除绑定；未绑定的任务不写入"""
+        binding = self.task_binding(task_id)
+        if binding is None:
+            return False
+        self.put(binding["content_hash"], result, binding["options"])
+        with self._connect() as conn:
+            conn.execute("DELETE FROM parse_tasks WHERE task_id = ?", (task_id,))
+        return True
+
+    def bind_batch(self, task_id, files):
+        """批量任务逐个文件绑定，files 为 (file_id, content_hash, options) 列表"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM batch_parse_tasks WHERE created_at < ?", (now - TASK_BINDING_TTL,))
+            conn.executemany("INSERT OR REPLACE INTO batch_parse_tasks VALUES (?, ?, ?, ?, ?)",
+                             [(task_id, file_id, digest, _options_key(options), now)
+                              for file_id, digest, options in files])
+
+    def complete_batch(self, task_id, results):
+        """results 为 {file_id: 解析结果}；只写入该批量任务绑定过的文件并删除绑定，返回写入条数"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT file_id, content_hash, options FROM batch_parse_tasks WHERE task_id = ?",
+                                (task_id,)).fetchall()
+        stored = 0
+        for file_id, digest, options in rows:
+            result = results.get(file_id)
+            if result is not None:
+                self.put(digest, result, json.loads(options))
+                stored += 1
+        if rows:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM batch_parse_tasks WHERE task_id = ?", (task_id,))
+        return stored
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_parse_cache():
+    """首次使用时创建缓存（建表、清理旧版本结果、计算解析器版本），导入本模块没有副作用"""
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = ParseCache()
+    return _instance
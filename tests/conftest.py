@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# log/ 下的脚本以同目录导入方式互相引用，测试时把仓库根目录与 log/ 都加入搜索路径
+ROOT = Path(__file__).resolve().parents[1]
+for p in (ROOT, ROOT / "log"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
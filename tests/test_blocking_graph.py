@@ -0,0 +1,77 @@
+import random
+
+from blocking_graph import WaitForGraph, evaluate_blocking_alerts
+
+
+def test_chain_root_and_cumulative_time():
+    g = WaitForGraph().update([(2, 1, 10.0), (3, 2, 5.0), (4, 1, None)], now=100.0)
+    snap = g.snapshot(now=100.0)
+    assert snap["waiters"] == 3
+    assert snap["cycles"] == []
+    (root,) = snap["roots"]
+    assert root["pid"] == 1
+    assert root["direct_waiters"] == 2
+    assert root["total_waiters"] == 3
+    assert root["chain_length"] == 3
+    assert root["cumulative_blocked_s"] == 15.0
+    assert g.snapshot(now=110.0)["roots"][0]["cumulative_blocked_s"] == 45.0
+
+
+def test_deadlock_cycle_detected_and_cleared():
+    g = WaitForGraph().update([(1, 2, 1.0), (2, 3, 1.0), (3, 1, 1.0), (4, 1, 1.0)], now=0.0)
+    snap = g.snapshot(now=0.0)
+    assert snap["cycles"] == [[1, 2, 3]]
+    assert [r["pid"] for r in snap["roots"]] == [1]
+    assert {"cycle": [1, 2, 3]} in evaluate_blocking_alerts(snap)
+    snap = g.update([(1, 2, 1.0), (2, 3, 1.0), (4, 1, 1.0)], now=1.0).snapshot(now=1.0)
+    assert snap["cycles"] == []
+    assert [r["pid"] for r in snap["roots"]] == [3]
+    assert snap["max_chain_length"] == 4
+
+
+def test_two_separate_cycles():
+    g = WaitForGraph().update([(1, 2, 0), (2, 1, 0), (5, 6, 0), (6, 7, 0), (7, 5, 0)], now=0.0)
+    assert sorted(g.snapshot(now=0.0)["cycles"]) == [[1, 2], [5, 6, 7]]
+
+
+def test_chain_alert_threshold():
+    edges = [(i + 1, i, 20.0) for i in range(1, 5)]
+    snap = WaitForGraph().update(edges, now=0.0).snapshot(now=0.0)
+    assert evaluate_blocking_alerts(snap) == [{"root_pid": 1, "chain_length": 5, "cumulative_blocked_s": 80.0}]
+
+
+def _full(edges, now):
+    g = WaitForGraph().update(edges, now=now)
+    return g.snapshot(now=now, top=1000)
+
+
+def test_incremental_matches_full_recompute():
+    rng = random.Random(7)
+    g = WaitForGraph()
+    edges = set()
+    for step in range(200):
+        for _ in range(rng.randint(1, 4)):
+            w, b = rng.sample(range(12), 2)
+            edges.symmetric_difference_update({(w, b, 0.0)})
+        inc = g.update(list(edges), now=float(step)).snapshot(now=float(step), top=1000)
+        full = _full(list(edges), float(step))
+        assert sorted(map(tuple, inc["cycles"])) == sorted(map(tuple, full["cycles"]))
+        key = lambda r: (r["pid"], r["total_waiters"], r["chain_length"], r["direct_waiters"])
+        assert sorted(map(key, inc["roots"])) == sorted(map(key, full["roots"]))
+
+
+def test_cycle_detection_runs_once_per_update(monkeypatch):
+    calls = []
+    original = WaitForGraph._find_cycles
+
+    def counting(self):
+        calls.append(1)
+        return original(self)
+
+    monkeypatch.setattr(WaitForGraph, "_find_cycles", counting)
+    g = WaitForGraph().update([(i + 1, i, 1.0) for i in range(50)] + [(0, 50, 1.0)], now=0.0)
+    assert len(calls) == 1
+    assert g.snapshot(now=0.0)["cycles"] == [list(range(51))]
+    g.update([(i + 1, i, 1.0) for i in range(50)], now=1.0)
+    g.update([(i + 1, i, 1.0) for i in range(50)], now=2.0)
+    assert len(calls) == 2
@@ -0,0 +1,13 @@
+import pytest
+
+from csvlog_bench import ENGINES, _CSVLOG_ENGINES, _TEXT_ENGINES
+from csvlog_gen import generate
+
+
+@pytest.mark.parametrize("fmt, engines", [("text", _TEXT_ENGINES), ("csvlog", _CSVLOG_ENGINES)])
+def test_every_engine_reports_chunk_latencies(tmp_path, fmt, engines):
+    path = tmp_path / ("bench.csv" if fmt == "csvlog" else "bench.log")
+    generate(path, size_mb=1.5, fmt=fmt, seed=11)
+    for engine in engines:
+        lat = ENGINES[engine](path, 1000, 2)
+        assert lat and all(ms >= 0 for ms in lat), engine
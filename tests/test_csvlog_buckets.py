@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from csvlog_buckets import DURATION_EDGES_MS, TimeBuckets, build_buckets, evaluate_alerts
+
+
+def _buckets(durations, edges=DURATION_EDGES_MS, width_s=60):
+    tb = TimeBuckets(width_s, edges)
+    ts = [i * width_s * 1000 for i in range(len(durations))]
+    tb.add_batch(ts, durations, np.zeros(len(durations), np.uint8))
+    return tb
+
+
+def test_slow_threshold_is_strictly_greater():
+    tb = _buckets([2000.0] * 5)
+    assert evaluate_alerts(tb, slow_ms=2000, slow_runs=5)["slow_runs"] == []
+    tb = _buckets([2000.5] * 5)
+    assert evaluate_alerts(tb, slow_ms=2000, slow_runs=5)["slow_runs"][0]["statements"] == 5
+
+
+def test_off_edge_threshold_is_rejected():
+    tb = _buckets([1800.0] * 5)
+    with pytest.raises(ValueError):
+        evaluate_alerts(tb, slow_ms=1500, slow_runs=5)
+
+
+def test_build_buckets_adds_threshold_edge(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text("".join(f"2024-01-01 00:0{i}:00 LOG:  duration: 1800 ms  statement: select {i}\n"
+                           for i in range(5)))
+    tb = build_buckets(str(log), slow_ms=1500)
+    assert 1500 in tb.edges
+    assert evaluate_alerts(tb, slow_ms=1500, slow_runs=5)["slow_runs"][0]["statements"] == 5
+    assert evaluate_alerts(tb, slow_ms=2000, slow_runs=5)["slow_runs"] == []
+
+
+def test_text_continuation_lines_are_not_events(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text(
+        "2024-01-01 00:00:00 LOG:  duration: 1800 ms  statement: select 1\n"
+        "\tfrom t\n"
+        "\twhere note = 'ERROR'\n"
+        "2024-01-01 00:00:01 ERROR:  deadlock detected\n"
+        "DETAIL:  Process 1 waits for ShareLock on transaction 2\n"
+        "2024-01-01 00:00:02 LOG:  checkpoint starting\n")
+    tb = build_buckets(str(log))
+    assert int(tb.events.sum()) == 3
+    assert int(tb.errors.sum()) == 1
+    assert int(tb.deadlocks.sum()) == 1
+    assert int(tb.hist.sum()) == 1
+
+
+def test_deadlock_window():
+    tb = TimeBuckets(60)
+    flags = np.array([2, 0, 0, 2], np.uint8)
+    tb.add_batch([0, 60000, 120000, 3600000], [np.nan] * 4, flags)
+    windows = evaluate_alerts(tb, deadlock_window_s=600)["deadlock_windows"]
+    assert len(windows) == 2
@@ -0,0 +1,50 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+import csvlog_export
+from csvlog_export import export_records
+from csvlog_gen import generate
+from csvlog_parser import iter_csvlog_records
+
+
+@pytest.fixture
+def csvlog(tmp_path):
+    path = tmp_path / "postgresql.csv"
+    generate(path, size_mb=0.2, fmt="csvlog", slow_ratio=0.3, multiline_ratio=0.3, seed=5)
+    return path
+
+
+def _read_arrow(path):
+    with pa.ipc.open_stream(str(path)) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize("name, read", [("out.parquet", pq.read_table), ("out.arrow", _read_arrow)])
+def test_export_round_trip(tmp_path, csvlog, name, read):
+    out = tmp_path / name
+    result = export_records(csvlog, out, batch_size=500, with_fingerprint=True)
+    records = list(iter_csvlog_records(csvlog))
+    assert result["rows"] == len(records) and result["batches"] > 1
+    table = read(out)
+    assert table.num_rows == len(records)
+    assert table.column("statement").to_pylist() == [r.statement for r in records]
+    assert table.column("duration_ms").to_pylist() == [r.duration_ms for r in records]
+    assert table.column("pid").to_pylist() == [r.pid for r in records]
+    fps = table.column("fingerprint").to_pylist()
+    assert all((fp is not None) == (r.duration_ms is not None) for fp, r in zip(fps, records))
+    assert not (tmp_path / f"{name}.tmp").exists()
+
+
+def test_failed_export_leaves_no_output(tmp_path, csvlog, monkeypatch):
+    def broken(path, layout):
+        for i, rec in enumerate(iter_csvlog_records(path, layout)):
+            if i == 700:
+                raise ValueError("坏记录")
+            yield rec
+
+    monkeypatch.setattr(csvlog_export, "iter_csvlog_records", broken)
+    out = tmp_path / "out.parquet"
+    assert export_records(csvlog, out, batch_size=500) == {"error": "坏记录"}
+    assert list(tmp_path.iterdir()) == [csvlog]
@@ -0,0 +1,175 @@
+import os
+import sys
+
+import pytest
+
+import csvlog_parser
+from csvlog_gen import generate
+from csvlog_parser import (_TopK, _acc_result, _csv_record_cut, _iter_blocks, _new_acc, _scan_block, _split_ranges,
+                           _store_result, follow_log, iter_csvlog_records, parse_csvlog, parse_log, parse_log_mmap,
+                           parse_log_parallel)
+from metrics_store import MetricsStore
+
+
+def _slow(n, ms=1500):
+    return "".join(f"2024-01-01 00:00:0{i % 10} LOG:  duration: {ms} ms  statement: select {i}\n" for i in range(n))
+
+
+def test_follow_counts_only_new_lines(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text(_slow(3))
+    state = tmp_path / "state.json"
+    assert follow_log(log, 1000, state_path=state)["new"]["slow_count"] == 3
+    with open(log, "a") as f:
+        f.write(_slow(2))
+    result = follow_log(log, 1000, state_path=state)
+    assert result["new"]["slow_count"] == 2
+    assert result["slow_count"] == 5
+
+
+def test_follow_file_rotation_finishes_old_tail(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text(_slow(2))
+    state = tmp_path / "state.json"
+    follow_log(log, 1000, state_path=state)
+    with open(log, "a") as f:
+        f.write(_slow(1))
+    os.rename(log, tmp_path / "postgresql.log.1")
+    log.write_text(_slow(4))
+    result = follow_log(log, 1000, state_path=state)
+    assert result["new"]["slow_count"] == 5
+    assert result["slow_count"] == 7
+
+
+def test_follow_directory_rename_to_tracked_suffix_not_double_counted(tmp_path):
+    logdir = tmp_path / "logs"
+    logdir.mkdir()
+    current = logdir / "postgresql.log"
+    current.write_text(_slow(2))
+    state = tmp_path / "state.json"
+    follow_log(logdir, 1000, state_path=state)
+    with open(current, "a") as f:
+        f.write(_slow(1))
+    # 轮转后的文件名仍以 .log 结尾，会同时出现在目录扫描结果中
+    os.rename(current, logdir / "postgresql-2024-01-01.log")
+    current.write_text(_slow(3))
+    result = follow_log(logdir, 1000, state_path=state)
+    assert result["new"]["slow_count"] == 4
+    assert result["slow_count"] == 6
+    assert follow_log(logdir, 1000, state_path=state)["new"]["slow_count"] == 0
+
+
+def test_follow_copytruncate_rewritten_past_offset(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text(_slow(3))
+    state = tmp_path / "state.json"
+    follow_log(log, 1000, state_path=state)
+    # 截断后新写入的内容已超过原偏移，只看大小无法发现
+    log.write_text(_slow(5, ms=2500))
+    result = follow_log(log, 1000, state_path=state)
+    assert result["new"]["slow_count"] == 5
+    assert result["slow_count"] == 8
+    assert follow_log(log, 1000, state_path=state)["new"]["slow_count"] == 0
+
+
+def test_follow_threshold_change_restarts_from_beginning(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text(_slow(3) + _slow(2, ms=3000))
+    state = tmp_path / "state.json"
+    assert follow_log(log, 1000, state_path=state)["slow_count"] == 5
+    result = follow_log(log, 2000, state_path=state)
+    assert result["new"]["slow_count"] == 2
+    assert result["slow_count"] == 2
+    assert follow_log(log, 2000, state_path=state)["new"]["slow_count"] == 0
+
+
+def test_store_records_only_follow_increments(tmp_path, monkeypatch):
+    log = tmp_path / "postgresql.log"
+    log.write_text(_slow(3))
+    db = tmp_path / "m.db"
+    state = tmp_path / "state.json"
+    for extra in (0, 2, 0):
+        with open(log, "a") as f:
+            f.write(_slow(extra))
+        _store_result(db, log, follow_log(log, 1000, state_path=state))
+    _, points = MetricsStore(db).query("csvlog.slow_count", start=0)
+    assert sum(avg * n for _, avg, _, _, n in points) == 5
+    monkeypatch.setattr(sys, "argv", ["csvlog_parser", "--path", str(log), "--store", str(db)])
+    with pytest.raises(SystemExit):
+        csvlog_parser.main()
+
+
+def _text_log(tmp_path, size_mb=0.5):
+    path = tmp_path / "postgresql.log"
+    generate(path, size_mb=size_mb, fmt="text", slow_ratio=0.3, multiline_ratio=0.3, deadlock_rate=0.01, seed=7)
+    return path
+
+
+def test_byte_ranges_match_serial_parse(tmp_path):
+    path = _text_log(tmp_path)
+    serial = parse_log(path, 1000, top=20)
+    data = path.read_bytes()
+    ranges = _split_ranges(path, 7)
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+    # 分段边界顺延到下一行开头，跨越切分点的行只属于前一段
+    assert all(data[a - 1:a] == b"\n" for a, _ in ranges[1:])
+    acc = _new_acc(20)
+    with open(path, "rb") as f:
+        for a, b in ranges:
+            part = _new_acc(20)
+            # 块大小取奇数，保证有行跨越块边界
+            for offset, block in _iter_blocks(f, a, b, block_size=4093):
+                _scan_block(block, 1000, part, offset)
+            acc["slow"].merge(part["slow"])
+            acc["errors"] += part["errors"]
+            acc["deadlocks"] += part["deadlocks"]
+    assert _acc_result(path, 1000, acc) == serial
+    assert serial["slow_count"] > 0 and serial["deadlocks"] > 0
+
+
+def test_parallel_parse_matches_serial(tmp_path):
+    path = _text_log(tmp_path, size_mb=2.5)
+    assert parse_log_parallel(path, 1000, workers=2, top=20) == parse_log(path, 1000, top=20)
+
+
+def test_mmap_parse_matches_serial(tmp_path):
+    path = _text_log(tmp_path)
+    assert parse_log_mmap(path, 1000, top=20, profile=True) == parse_log(path, 1000, top=20, profile=True)
+    assert parse_log_parallel(path, 1000, workers=2, top=20, use_mmap=True) == parse_log(path, 1000, top=20)
+
+
+def test_topk_keeps_largest_and_earliest_ties():
+    items = [(5, "a"), (9, "b"), (1, "c"), (9, "d"), (7, "e"), (5, "f"), (3, "g")]
+    topk = _TopK(3)
+    for seq, (ms, line) in enumerate(items):
+        topk.add(ms, seq, line)
+    assert topk.count == len(items)
+    assert topk.items() == [{"duration_ms": 9, "line": "b"}, {"duration_ms": 9, "line": "d"},
+                            {"duration_ms": 7, "line": "e"}]
+    # 分片合并与顺序加入结果一致，dump/load 往返不丢失计数与顺序
+    left, right = _TopK(3), _TopK(3)
+    for seq, (ms, line) in enumerate(items):
+        (left if seq < 4 else right).add(ms, seq, line)
+    assert left.merge(right).items() == topk.items()
+    restored = _TopK.load(3, topk.dump())
+    assert (restored.count, restored.items()) == (topk.count, topk.items())
+    assert _TopK(0).would_keep(100) is False
+
+
+def test_csvlog_multiline_records(tmp_path):
+    path = tmp_path / "postgresql.csv"
+    counts = generate(path, size_mb=0.3, fmt="csvlog", slow_ratio=0.3, multiline_ratio=0.5, deadlock_rate=0.01, seed=3)
+    records = list(iter_csvlog_records(path))
+    assert len(records) == counts["records"]
+    assert sum(r.duration_ms is not None for r in records) == counts["durations"]
+    assert any("\n" in r.statement for r in records)
+    result = parse_csvlog(path, 0, top=5)
+    assert (result["slow_count"], result["errors"], result["deadlocks"]) == (
+        counts["durations"], counts["errors"], counts["deadlocks"])
+
+
+def test_csv_record_cut_respects_quotes():
+    buf = b'a,"x\ny",1\nb,"p""\nq'
+    # 第二条记录的引号未闭合，只能切在第一条记录之后
+    assert _csv_record_cut(buf) == buf.index(b"1\n") + 2
+    assert _csv_record_cut(b'a,"x\ny') == 0
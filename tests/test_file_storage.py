@@ -0,0 +1,115 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from file_storage import MultipartUploads
+
+MB = 1 << 20
+
+
+class _FakeMinio:
+    # 模拟 minio 客户端的分片上传接口，分片按序号保存，ETag 为内容摘要
+    def __init__(self):
+        self.uploads = {}
+        self.objects = {}
+        self.page_size = 2
+
+    def _create_multipart_upload(self, bucket, object_name, headers):
+        upload_id = f"u{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {"object": object_name, "parts": {}}
+        return upload_id
+
+    def _upload_part(self, bucket, object_name, data, headers, upload_id, part_number):
+        etag = f"etag-{part_number}-{len(data)}-{data[:1].hex()}"
+        self.uploads[upload_id]["parts"][part_number] = (etag, data)
+        return f'"{etag}"'
+
+    def _list_parts(self, bucket, object_name, upload_id, part_number_marker=None):
+        numbers = sorted(n for n in self.uploads[upload_id]["parts"] if n > (part_number_marker or 0))
+        page = numbers[:self.page_size]
+        parts = [SimpleNamespace(part_number=n, etag=self.uploads[upload_id]["parts"][n][0],
+                                 size=len(self.uploads[upload_id]["parts"][n][1])) for n in page]
+        return SimpleNamespace(parts=parts, is_truncated=len(numbers) > len(page),
+                               next_part_number_marker=page[-1] if page else None)
+
+    def _complete_multipart_upload(self, bucket, object_name, upload_id, parts):
+        stored = self.uploads.pop(upload_id)["parts"]
+        assert [p.part_number for p in parts] == sorted(stored)
+        assert all(stored[p.part_number][0] == p.etag for p in parts)
+        self.objects[object_name] = b"".join(stored[p.part_number][1] for p in parts)
+        return SimpleNamespace(etag='"merged"')
+
+    def _abort_multipart_upload(self, bucket, object_name, upload_id):
+        del self.uploads[upload_id]
+
+    def get_object(self, bucket, object_name):
+        body = io.BytesIO(self.objects[object_name])
+        body.release_conn = lambda: None
+        return body
+
+    def remove_object(self, bucket, object_name):
+        del self.objects[object_name]
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    return MultipartUploads(_FakeMinio(), "files", tmp_path / "data" / "multipart.db")
+
+
+def _chunks(size, part_size):
+    data = bytes(i % 251 for i in range(size))
+    return data, {n + 1: data[i:i + part_size] for n, i in enumerate(range(0, size, part_size))}
+
+
+def test_parts_out_of_order_then_complete(uploads):
+    data, chunks = _chunks(5 * MB + 123, MB)
+    plan = uploads.create(7, "报告.pdf", len(data), MB, "application/pdf")
+    assert plan["part_count"] == 6
+    upload_id = plan["upload_id"]
+    for n in (6, 2, 5, 1):
+        uploads.upload_part(upload_id, 7, n, io.BytesIO(chunks[n]), len(chunks[n]))
+    listed = uploads.list_parts(upload_id, 7)
+    assert [p["part_number"] for p in listed["parts"]] == [1, 2, 5, 6]
+    with pytest.raises(ValueError, match="缺少"):
+        uploads.complete(upload_id, 7)
+    for n in (4, 3):
+        uploads.upload_part(upload_id, 7, n, io.BytesIO(chunks[n]), len(chunks[n]))
+    # 客户端提交的分片乱序也按序号合并
+    parts = [{"part_number": p["part_number"], "etag": f'"{p["etag"]}"'}
+             for p in reversed(uploads.list_parts(upload_id, 7)["parts"])]
+    merged = uploads.complete(upload_id, 7, parts)
+    assert merged["filename"] == "报告.pdf" and merged["size"] == len(data) and merged["etag"] == "merged"
+    with uploads.spool_object(merged["object_name"]) as spool:
+        assert spool.read() == data
+    assert uploads.list_parts(upload_id, 7) is None
+
+
+def test_other_users_cannot_touch_upload(uploads):
+    upload_id = uploads.create(7, "a.pdf", 2 * MB, MB)["upload_id"]
+    assert uploads.upload_part(upload_id, 8, 1, io.BytesIO(b"x" * MB), MB) is None
+    assert uploads.list_parts(upload_id, 8) is None
+    assert uploads.complete(upload_id, 8) is None
+    assert uploads.abort(upload_id, 8) is False
+    assert uploads.client.uploads[upload_id]["parts"] == {}
+
+
+def test_part_size_and_etag_are_checked(uploads):
+    upload_id = uploads.create(7, "a.pdf", 2 * MB + 10, MB)["upload_id"]
+    with pytest.raises(ValueError):
+        uploads.upload_part(upload_id, 7, 1, io.BytesIO(b"x" * 10), 10)
+    with pytest.raises(ValueError):
+        uploads.upload_part(upload_id, 7, 4, io.BytesIO(b"x" * 10), 10)
+    for n, size in ((1, MB), (2, MB), (3, 10)):
+        uploads.upload_part(upload_id, 7, n, io.BytesIO(b"x" * size), size)
+    with pytest.raises(ValueError, match="ETag"):
+        uploads.complete(upload_id, 7, [{"part_number": n, "etag": "forged"} for n in (1, 2, 3)])
+
+
+def test_abort_releases_parts(uploads):
+    upload_id = uploads.create(7, "a.pdf", 2 * MB, MB)["upload_id"]
+    uploads.upload_part(upload_id, 7, 2, io.BytesIO(b"y" * MB), MB)
+    assert uploads.abort(upload_id, 7) is True
+    assert upload_id not in uploads.client.uploads
+    assert uploads.list_parts(upload_id, 7) is None
+    assert uploads.abort(upload_id, 7) is False
@@ -0,0 +1,131 @@
+import asyncio
+import io
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from file_transfer import (etag_matches, if_range_matches, not_modified_since, parse_range, resolve_range,
+                           stream_object)
+
+
+class _ObjectResponse:
+    # 模拟对象存储（urllib3）响应：read 阻塞一段时间，记录连接是否被关闭与释放
+    def __init__(self, data, delay=0.0):
+        self.body = io.BytesIO(data)
+        self.delay = delay
+        self.closed = False
+        self.released = False
+        self.reading = threading.Lock()
+
+    def read(self, n):
+        assert self.reading.acquire(blocking=False), "并发读取同一响应"
+        try:
+            time.sleep(self.delay)
+            return self.body.read(n)
+        finally:
+            self.reading.release()
+
+    def close(self):
+        assert not self.reading.locked(), "读取未结束就关闭了响应"
+        self.closed = True
+
+    def release_conn(self):
+        self.released = True
+
+
+async def _collect(response, chunk_size):
+    return [chunk async for chunk in stream_object(response, chunk_size)]
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, None)),
+    ("bytes=-500", (None, 500)),
+    ("bytes=-0", (None, 0)),
+    (" bytes=5-5 ", (5, 5)),
+    ("bytes=10-5", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header) == expected
+
+
+@pytest.mark.parametrize("byte_range, size, expected", [
+    ((0, 99), 1000, (0, 99)),
+    ((900, 2000), 1000, (900, 999)),
+    ((100, None), 1000, (100, 999)),
+    ((None, 500), 1000, (500, 999)),
+    ((None, 5000), 1000, (0, 999)),
+    ((1000, None), 1000, None),
+    ((None, 0), 1000, None),
+    ((None, 10), 0, None),
+    ((0, None), 0, None),
+])
+def test_resolve_range(byte_range, size, expected):
+    assert resolve_range(byte_range, size) == expected
+
+
+def test_etag_matches():
+    assert etag_matches('"a", "b"', '"b"')
+    assert etag_matches('W/"a"', '"a"')
+    assert not etag_matches('W/"a"', '"a"', weak=False)
+    assert not etag_matches('"a"', 'W/"a"', weak=False)
+    assert etag_matches("*", '"x"')
+    assert not etag_matches(None, '"x"')
+    assert not etag_matches('"x"', None)
+
+
+def test_not_modified_since():
+    lm = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert not_modified_since(lm, lm)
+    assert not_modified_since("Thu, 22 Oct 2015 07:28:00 GMT", lm)
+    assert not not_modified_since("Tue, 20 Oct 2015 07:28:00 GMT", lm)
+    assert not not_modified_since("garbage", lm)
+
+
+def test_if_range_matches():
+    lm = "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert if_range_matches(None, '"a"', lm)
+    assert if_range_matches('"a"', '"a"', lm)
+    assert not if_range_matches('"b"', '"a"', lm)
+    assert not if_range_matches('W/"a"', 'W/"a"', lm)
+    assert if_range_matches(lm, '"a"', lm)
+    assert not if_range_matches("Thu, 22 Oct 2015 07:28:00 GMT", '"a"', lm)
+
+
+def test_streams_all_chunks_and_closes():
+    response = _ObjectResponse(b"x" * 10)
+    assert asyncio.run(_collect(response, 4)) == [b"xxxx", b"xxxx", b"xx"]
+    assert response.closed and response.released
+
+
+def test_cancelled_consumer_still_closes_response():
+    response = _ObjectResponse(b"x" * 100, delay=0.05)
+
+    async def main():
+        task = asyncio.create_task(_collect(response, 4))
+        await asyncio.sleep(0.12)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert response.closed and response.released
+
+
+def test_early_aclose_closes_response():
+    response = _ObjectResponse(b"x" * 100, delay=0.01)
+
+    async def main():
+        gen = stream_object(response, 4)
+        assert await gen.__anext__() == b"xxxx"
+        await gen.aclose()
+
+    asyncio.run(main())
+    assert response.closed and response.released
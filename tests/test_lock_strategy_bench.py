@@ -0,0 +1,29 @@
+import random
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+import transaction_inspector as ti
+from lock_strategy_bench import _pairs, _synthetic, bench_offline
+
+
+def _self_join(locks, sessions):
+    # 逐对比较，等价于 _BLOCKING_SQL 的自连接
+    users = {s[0]: s[1] for s in sessions}
+    return sorted((bl[6], kl[6], bl[0], bl[7], kl[7]) for bl in locks if not bl[8] for kl in locks
+                  if kl[:6] == bl[:6] and kl[6] != bl[6] and bl[6] in users and kl[6] in users)
+
+
+def test_hash_match_equals_self_join():
+    locks, sessions = _synthetic(300, 40, 50, random.Random(3))
+    assert _pairs(ti._match_locks(locks, sessions)) == _self_join(locks, sessions)
+
+
+def test_bench_offline_reports_each_lock_count():
+    entries = bench_offline([100, 1000], waiters=30, sessions=50, repeat=2)
+    assert [e["lock_count"] for e in entries] == [100, 1000]
+    for e in entries:
+        assert e["strategy"] == "python_match_only"
+        assert e["rows"] >= 30
+        assert 0 <= e["ms_min"] <= e["ms_median"]
@@ -0,0 +1,59 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from metrics_exporter import CsvlogRefresher, MetricsCache, _Refresher
+
+
+class _Flaky(_Refresher):
+    def __init__(self, cache):
+        super().__init__("flaky", cache, 1, threading.Event())
+        self.fail = False
+
+    def collect(self):
+        if self.fail:
+            raise RuntimeError("boom")
+        return [("opengauss_sessions", "gauge", "会话数", [({"state": "active"}, 3)])]
+
+
+def test_failed_refresh_drops_stale_families():
+    cache = MetricsCache()
+    r = _Flaky(cache)
+    r.refresh()
+    body = cache.payload(False).decode()
+    assert 'opengauss_sessions{state="active"} 3.0' in body
+    assert 'opengauss_exporter_up{source="flaky"} 1.0' in body
+    r.fail = True
+    r.refresh()
+    body = cache.payload(False).decode()
+    assert "opengauss_sessions" not in body
+    assert 'opengauss_exporter_up{source="flaky"} 0.0' in body
+    assert 'opengauss_exporter_refresh_errors_total{source="flaky"} 1.0' in body
+
+
+def test_openmetrics_merges_same_family_across_sources():
+    cache = MetricsCache()
+    cache.update("a", [("opengauss_exporter_up", "gauge", "up", [({"source": "a"}, 1)])])
+    cache.update("b", [("opengauss_exporter_up", "gauge", "up", [({"source": "b"}, 0)]),
+                       ("opengauss_checkpoints", "counter", "检查点次数", [({"trigger": "timed"}, 4)])])
+    body = cache.payload(True).decode()
+    assert body.count("# TYPE opengauss_exporter_up gauge") == 1
+    assert "# TYPE opengauss_checkpoints counter" in body
+    assert 'opengauss_checkpoints_total{trigger="timed"} 4.0' in body
+    assert body.endswith("# EOF\n")
+
+
+def test_csvlog_refresher_uses_its_own_state_and_top(tmp_path):
+    log = tmp_path / "postgresql.log"
+    log.write_text("".join(f"2024-01-01 00:00:00 LOG:  duration: {1000 + i} ms  statement: select {i}\n"
+                           for i in range(5)))
+    r = CsvlogRefresher(MetricsCache(), 1, threading.Event(), log, min_ms=1000, top=3)
+    families = {name: samples for name, _, _, samples in r.collect()}
+    assert families["opengauss_csvlog_slow_statements"][0][1] == 5
+    assert (tmp_path / "postgresql.log.exporter.offset").exists()
+    assert not (tmp_path / "postgresql.log.offset").exists()
+    state = json.loads((tmp_path / "postgresql.log.exporter.offset").read_text())
+    assert len(state["slow"]["heap"]) == 3
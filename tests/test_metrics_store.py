@@ -0,0 +1,57 @@
+import sqlite3
+import time
+
+import pytest
+
+from metrics_store import MetricsStore, flatten, parse_span, record
+
+_NOW = int(time.time())
+T0 = _NOW - _NOW % 3600 - 3600
+
+
+def test_same_second_writes_agree_across_resolutions(tmp_path):
+    store = MetricsStore(tmp_path / "m.db")
+    store.write("tx.waiters", 1, ts=T0)
+    store.write("tx.waiters", 3, ts=T0)
+    store.write("tx.waiters", 5, ts=T0 + 30)
+    minute = store.query("tx.waiters", start=T0, end=T0 + 59, step=60)
+    assert minute[0] == "1m"
+    assert store.query("tx.waiters", start=T0, end=T0 + 59)[1] == [(T0, 2.0, 1, 3, 2), (T0 + 30, 5.0, 5, 5, 1)]
+    (_, avg, lo, hi, n), = minute[1]
+    assert (avg, lo, hi, n) == (3.0, 1, 5, 3)
+    store.close()
+
+
+def test_prune_time_is_persisted(tmp_path, monkeypatch):
+    path = tmp_path / "m.db"
+    record(path, {"a": 1}, ts=T0)
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT value FROM meta WHERE key = 'last_prune'").fetchone() == (str(T0),)
+    conn.close()
+    store = MetricsStore(path)
+    assert store._last_prune == T0
+    pruned = []
+    monkeypatch.setattr(store, "prune", lambda now=None: pruned.append(now))
+    store.write("a", 2, ts=T0 + 60)
+    assert pruned == []
+    store.write("a", 3, ts=T0 + 601)
+    assert pruned == [T0 + 601]
+    store.close()
+
+
+def test_prune_drops_expired_points(tmp_path):
+    store = MetricsStore(tmp_path / "m.db", retention={"raw": 100})
+    store.write("a", 1, ts=T0)
+    store.write("a", 2, ts=T0 + 150)
+    store.prune(T0 + 200)
+    assert store.conn.execute("SELECT ts FROM points_raw").fetchall() == [(T0 + 150,)]
+    assert store.conn.execute("SELECT sum(count) FROM points_1m").fetchone() == (2,)
+    store.close()
+
+
+def test_helpers():
+    assert parse_span("30d") == 30 * 86400
+    assert parse_span("90") == 90
+    with pytest.raises(ValueError):
+        parse_span("1w")
+    assert flatten("wal", {"rate": 1.5, "nested": {"n": 2, "flag": True}, "s": "x"}) == {"wal.rate": 1.5, "wal.nested.n": 2}
@@ -0,0 +1,88 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from opengauss_logging_setup import _diff, _normalize, apply_baseline
+
+AUTO_CONF = "/data/postgresql.auto.conf"
+
+
+class _Cursor:
+    def __init__(self, rows, fail_on=None, fail_restore=None):
+        self.rows = rows
+        self.fail_on = fail_on
+        self.fail_restore = fail_restore
+        self.executed = []
+
+    def execute(self, sql, params=None):
+        if self.fail_on and self.fail_on in sql:
+            raise RuntimeError("invalid value")
+        if self.fail_restore and self.fail_restore in sql:
+            raise RuntimeError("connection lost")
+        self.executed.append(sql)
+
+    def fetchall(self):
+        return self.rows
+
+
+def _row(name, setting, unit=None, vartype="string", context="sighup", source="default", sourcefile=None):
+    return (name, setting, unit, vartype, context, source, sourcefile)
+
+
+def test_normalize_units_and_booleans():
+    assert _normalize("1GB", "integer", "8kB") == _normalize("131072", "integer", "8kB")
+    assert _normalize("1s", "integer", "ms") == _normalize(1000, "integer", "ms")
+    assert _normalize("1d", "integer", "min") == _normalize("1440", "integer", "min")
+    assert _normalize("true", "bool", None) == "on"
+    assert _normalize("DDL", "enum", None) == "ddl"
+
+
+def test_diff_reports_changed_and_unknown():
+    current = {"log_statement": {"setting": "none", "unit": None, "vartype": "enum", "context": "superuser"},
+               "log_rotation_age": {"setting": "1440", "unit": "min", "vartype": "integer", "context": "sighup"}}
+    changed, unknown = _diff(current, {"log_statement": "ddl", "log_rotation_age": "1d", "no_such": 1})
+    assert [c["name"] for c in changed] == ["log_statement"]
+    assert unknown == ["no_such"]
+
+
+def test_apply_only_changed_and_reload():
+    cur = _Cursor([_row("log_statement", "none", vartype="enum"), _row("log_rotation_age", "1440", "min", "integer")])
+    report = apply_baseline(cur, {"log_statement": "ddl", "log_rotation_age": "1d"})
+    assert report["applied"] and report["reloaded"]
+    assert cur.executed[1:] == ["ALTER SYSTEM SET log_statement TO 'ddl'", "SELECT pg_reload_conf()"]
+
+
+def test_failed_apply_resets_new_overrides_and_restores_auto_conf_values():
+    cur = _Cursor([
+        _row("log_statement", "none", vartype="enum"),
+        _row("log_line_prefix", "%m ", source="configuration file", sourcefile=AUTO_CONF),
+        _row("log_destination", "stderr", source="configuration file", sourcefile="/data/postgresql.conf"),
+    ], fail_on="log_destination TO")
+    settings = {"log_statement": "ddl", "log_line_prefix": "%m [%p] ", "log_destination": "bogus"}
+    report = apply_baseline(cur, settings)
+    assert not report["applied"] and report["rolled_back"] == ["log_statement", "log_line_prefix"]
+    assert cur.executed[-2:] == ["ALTER SYSTEM SET log_line_prefix TO '%m '", "ALTER SYSTEM RESET log_statement"]
+    assert "SELECT pg_reload_conf()" not in cur.executed
+    assert report["rollback_failed"] == []
+
+
+def test_failed_restore_is_reported():
+    cur = _Cursor([
+        _row("log_statement", "none", vartype="enum"),
+        _row("log_min_duration_statement", "-1", "ms", "integer"),
+        _row("log_destination", "stderr"),
+    ], fail_on="log_destination TO", fail_restore="RESET log_statement")
+    settings = {"log_statement": "ddl", "log_min_duration_statement": "1s", "log_destination": "bogus"}
+    report = apply_baseline(cur, settings)
+    assert report["rolled_back"] == ["log_min_duration_statement"]
+    assert report["rollback_failed"] == [{"name": "log_statement", "error": "connection lost"}]
+    assert report["error"] == "log_destination: invalid value"
+
+
+def test_postmaster_change_requires_restart_without_reload():
+    cur = _Cursor([_row("logging_collector", "off", vartype="bool", context="postmaster")])
+    report = apply_baseline(cur, {"logging_collector": "on"})
+    assert report["restart_required"] == ["logging_collector"]
+    assert not report["reloaded"]
+    assert apply_baseline(_Cursor([_row("logging_collector", "off", vartype="bool")]),
+                          {"logging_collector": "on"}, dry_run=True)["applied"] is False
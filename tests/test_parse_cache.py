@@ -0,0 +1,109 @@
+import importlib
+import os
+import sys
+import types
+
+import pytest
+
+import parse_cache
+from parse_cache import ParseCache, parser_version
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(tmp_path / "cache.db", max_bytes=1 << 20, version="v1")
+
+
+def _parser_package(tmp_path, source):
+    pkg = tmp_path / "fake_parsers"
+    pkg.mkdir(exist_ok=True)
+    (pkg / "__init__.py").write_text(source)
+    module = types.ModuleType("fake_parsers")
+    module.__file__ = str(pkg / "__init__.py")
+    return module
+
+
+def test_put_get_and_options(cache):
+    cache.put("h1", {"text": "内容"}, {"ext": ".pdf"})
+    assert cache.get("h1", {"ext": ".pdf"}) == {"text": "内容"}
+    assert cache.get("h1", {"ext": ".docx"}) is None
+    assert cache.get("h2", {"ext": ".pdf"}) is None
+    assert cache.get(None) is None
+
+
+def test_evicts_least_recently_used(tmp_path):
+    # 随机内容压缩后仍约 1.1KB，容量只够放三条
+    c = ParseCache(tmp_path / "cache.db", max_bytes=3500, version="v1")
+    for i in range(3):
+        c.put(f"h{i}", {"data": os.urandom(1000).hex()})
+    c.get("h0")
+    c.put("h3", {"data": os.urandom(1000).hex()})
+    assert c.get("h0") is not None
+    assert c.get("h1") is None
+    assert c.get("h3") is not None
+
+
+def test_parser_change_invalidates(tmp_path):
+    path = tmp_path / "cache.db"
+    v1 = parser_version(_parser_package(tmp_path, "PARSER_VERSION = 1\n"))
+    ParseCache(path, version=v1).put("h", {"text": "旧"})
+    v2 = parser_version(_parser_package(tmp_path, "PARSER_VERSION = 1\n# 改动\n"))
+    assert v1 != v2
+    assert ParseCache(path, version=v2).get("h") is None
+    assert ParseCache(path, version=v1).get("h") is None
+
+
+def test_task_binding_rejects_other_file(cache):
+    cache.bind_task("t1", 7, "hash-of-7", {"ext": ".pdf"})
+    binding = cache.task_binding("t1")
+    assert binding == {"file_id": 7, "content_hash": "hash-of-7", "options": {"ext": ".pdf"}}
+    assert cache.task_binding("t2") is None
+
+
+def test_complete_task_uses_bound_hash(cache):
+    cache.bind_task("t1", 7, "hash-of-7", {"ext": ".pdf"})
+    assert cache.complete_task("t1", {"text": "文件 7"})
+    assert cache.get("hash-of-7", {"ext": ".pdf"}) == {"text": "文件 7"}
+    assert cache.task_binding("t1") is None
+    # 未绑定的任务结果不写入缓存
+    assert not cache.complete_task("t2", {"text": "伪造"})
+    assert not cache.complete_task("t1", {"text": "伪造"})
+    assert cache.get("hash-of-7", {"ext": ".pdf"}) == {"text": "文件 7"}
+
+
+def test_file_hash_recorded_per_file(cache):
+    cache.remember_file_hash(7, "h1")
+    assert cache.file_hash(7) == "h1"
+    assert cache.file_hash(8) is None
+    cache.forget_file(7)
+    assert cache.file_hash(7) is None
+
+
+def test_complete_batch_uses_per_file_bindings(cache):
+    cache.bind_batch("b1", [(7, "hash-of-7", {"ext": ".pdf"}), (8, "hash-of-8", {"ext": ".docx"})])
+    # 未绑定的文件与缺少结果的文件不写入
+    assert cache.complete_batch("b1", {7: {"text": "文件 7"}, 9: {"text": "伪造"}}) == 1
+    assert cache.get("hash-of-7", {"ext": ".pdf"}) == {"text": "文件 7"}
+    assert cache.get("hash-of-8", {"ext": ".docx"}) is None
+    # 绑定已删除，再次查询不会覆盖缓存；批量任务也不能当作单文件任务取回
+    assert cache.complete_batch("b1", {7: {"text": "伪造"}}) == 0
+    assert not cache.complete_task("b1", {"text": "伪造"})
+    assert cache.get("hash-of-7", {"ext": ".pdf"}) == {"text": "文件 7"}
+
+
+def test_creates_missing_parent_dir(tmp_path):
+    ParseCache(tmp_path / "data" / "cache.db", version="v1").put("h", {"text": "内容"})
+    assert (tmp_path / "data" / "cache.db").exists()
+
+
+def test_import_has_no_side_effects(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("PARSE_CACHE_PATH", str(tmp_path / "lazy.db"))
+    module = importlib.reload(sys.modules["parse_cache"])
+    try:
+        assert module.PARSE_CACHE_PATH == tmp_path / "lazy.db"
+        assert not (tmp_path / "lazy.db").exists()
+        assert not list(tmp_path.iterdir())
+    finally:
+        monkeypatch.delenv("PARSE_CACHE_PATH")
+        importlib.reload(parse_cache)
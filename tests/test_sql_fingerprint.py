@@ -0,0 +1,67 @@
+import random
+
+from sql_fingerprint import QuantileSketch, SlowQueryProfile, fingerprint, normalize_sql
+
+
+def test_literals_and_comments():
+    assert normalize_sql("SELECT * FROM t WHERE a = 'x' AND b = 2 -- trailing\n;") == "select * from t where a = ? and b = ?"
+    assert normalize_sql("select /* hint */ 1.5e3, $1, 0xff, E'a''b'") == "select ?, ?, ?, ?"
+    assert normalize_sql("select $fn$ body -- x $fn$") == "select ?"
+
+
+def test_comment_markers_inside_literals_are_not_comments():
+    assert normalize_sql("select * from t where a = '--x' and b = 2") == "select * from t where a = ? and b = ?"
+    assert normalize_sql("select * from t where a = '/* x' and b = '*/'") == "select * from t where a = ? and b = ?"
+    assert fingerprint(normalize_sql("select * from t where a = '--x' and b = 2")) != \
+        fingerprint(normalize_sql("select * from u where c = '--y'"))
+
+
+def test_quoted_identifiers_are_kept():
+    assert normalize_sql('select "col--1", "t2" from "a/*b"') == 'select "col--1", "t2" from "a/*b"'
+
+
+def test_in_list_and_values_collapse():
+    assert normalize_sql("select 1 from t where id in (1, 2, 3)") == "select ? from t where id in (?)"
+    assert normalize_sql("insert into t values (1, 'a'), (2, 'b')") == "insert into t values (?)"
+
+
+def test_quantile_sketch_relative_error():
+    rng = random.Random(1)
+    values = [rng.lognormvariate(3, 1) for _ in range(20000)]
+    sketch = QuantileSketch(alpha=0.01)
+    for v in values:
+        sketch.add(v)
+    values.sort()
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) / exact <= 0.011
+
+
+def test_quantile_sketch_merge_and_roundtrip():
+    a, b, whole = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for i in range(1, 1001):
+        (a if i % 2 else b).add(i)
+        whole.add(i)
+    merged = QuantileSketch.load(a.dump()).merge(b)
+    assert merged.count == 1000
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == whole.quantile(q)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_quantile_sketch_bucket_limit():
+    sketch = QuantileSketch(alpha=0.01, max_buckets=16)
+    for i in range(1, 100000, 97):
+        sketch.add(i)
+    assert len(sketch.buckets) <= 16
+    assert sketch.quantile(1.0) >= 99000 * 0.98
+
+
+def test_profile_groups_by_fingerprint():
+    profile = SlowQueryProfile()
+    profile.add("select * from t where id = 1", 100)
+    profile.add("select * from t where id = 2", 300)
+    profile.add("select * from u where name = '--x'", 50)
+    top = profile.top()
+    assert [row["count"] for row in top] == [2, 1]
+    assert top[0]["total_ms"] == 400
@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import transaction_inspector as ti
+
+
+def test_sampler_reports_prepare_errors(monkeypatch, capsys):
+    def fail(filters, strategy):
+        raise psycopg2.ProgrammingError('column "query_id" does not exist')
+
+    monkeypatch.setattr(ti, "_open_sampler", fail)
+    ring = ti.run_sampler(1000, 0, 10, count=3)
+    assert len(ring) == 0
+    assert "执行失败" in capsys.readouterr().out
+
+
+def test_sampler_reconnects_after_connection_errors(monkeypatch, capsys):
+    calls = []
+
+    def flaky(filters, strategy):
+        calls.append(1)
+        if len(calls) == 1:
+            raise psycopg2.OperationalError("server closed the connection")
+        raise RuntimeError("无法导入 db_config.py")
+
+    monkeypatch.setattr(ti, "_open_sampler", flaky)
+    monkeypatch.setattr(ti.time, "sleep", lambda s: None)
+    ti.run_sampler(1000, 0, 10, count=1)
+    out = capsys.readouterr().out
+    assert len(calls) == 2
+    assert "重连" in out and "执行失败" in out
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.executed = []
+        self.description = [("pid",), ("duration",)]
+
+    def mogrify(self, sql, params=None):
+        return (sql % tuple(repr(p) for p in params or ())).encode()
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchall(self):
+        return []
+
+
+class _FakeConn:
+    def __init__(self, server_version=90204):
+        self.server_version = server_version
+        self.cur = _FakeCursor()
+        self.cur.connection = self
+
+    def cursor(self):
+        return self.cur
+
+
+def test_activity_query_filters_and_truncates_on_server():
+    sql, params = ti._activity_query(min_ms=500, states=["active"], limit=20, query_chars=100)
+    assert "WHERE query_start <= now() - %s * interval '1 millisecond' AND state = ANY(%s)" in sql
+    assert "LIMIT 20" in sql
+    assert "left(query, 100) AS query" in sql
+    assert params == [500, ["active"]]
+    sql, params = ti._activity_query(ids_only=True)
+    assert "query_id AS query_id" in sql and "left(" not in sql
+    assert "WHERE" not in sql and "LIMIT" not in sql and params is None
+
+
+def test_sampler_binds_filters_in_prepare(monkeypatch):
+    conn = _FakeConn()
+    monkeypatch.setattr(ti, "_connect", lambda: conn)
+    filters = {"min_ms": 1000, "states": ["active", "idle in transaction"], "limit": 50, "ids_only": True}
+    _, cur = ti._open_sampler(filters)
+    prepared = [sql for sql, _ in cur.executed if sql.startswith("PREPARE")]
+    assert len(prepared) == 2
+    assert "1000 * interval" in prepared[0] and "['active', 'idle in transaction']" in prepared[0]
+    assert "LIMIT 50" in prepared[0] and "query_id AS query_id" in prepared[0]
+    assert "a.query_id AS blocked_query_id" in prepared[1]
+    cur.executed.clear()
+    sample = ti._sample(cur, 1000, ti.WaitForGraph(), ids_only=True)
+    assert [sql for sql, _ in cur.executed] == ["EXECUTE ti_activity", "EXECUTE ti_blocking"]
+    assert sample["activity_rows"] == 0
+
+
+def test_blocked_duration_uses_lock_wait_start():
+    assert "now() - bl.waitstart AS blocked_duration" in ti._blocking_query(waitstart=True)
+    sql = ti._blocking_query()
+    assert "CASE WHEN a.wait_event_type = 'Lock' THEN a.state_change END AS blocked_duration" in sql
+    assert "query_start" not in sql
+    assert ti._has_waitstart(_FakeConn(170002).cur) and not ti._has_waitstart(_FakeConn().cur)
+
+
+def test_match_locks_prefers_lock_wait_start():
+    tag = ("relation", 1, 16400, None, None, None)
+    locks = [tag + (10, "AccessExclusiveLock", True, None),
+             tag + (11, "AccessShareLock", False, timedelta(seconds=3)),
+             tag + (12, "AccessShareLock", False, None)]
+    sessions = [(10, "a", "alter", None), (11, "b", "select", timedelta(seconds=9)),
+                (12, "c", "select", timedelta(seconds=4))]
+    waits = {(r["blocked_pid"], r["blocking_pid"]): r["blocked_duration"] for r in ti._match_locks(locks, sessions)}
+    assert waits[(11, 10)] == timedelta(seconds=3)
+    assert waits[(12, 10)] == timedelta(seconds=4)
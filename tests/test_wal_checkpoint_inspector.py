@@ -0,0 +1,85 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from wal_checkpoint_inspector import _advise_window, _estimate_fpw_share, _fetch_bgwriter, _lsn_bytes, _projection
+
+MB = 1 << 20
+
+
+def _settings(max_wal_mb, timeout=300, target=0.5):
+    return {"max_wal_size": max_wal_mb * MB, "checkpoint_timeout": timeout, "checkpoint_completion_target": target}
+
+
+@pytest.mark.parametrize("rate_mb", [0.5, 1.0, 1.5, 2.0, 2.2, 2.3, 5.0])
+def test_projection_trigger_agrees_with_suggestion(rate_mb):
+    proj = _projection(rate_mb * MB, _settings(1024))
+    assert proj["wal_triggered"] == (proj["suggested_max_wal_size_mb"] > proj["max_wal_size_mb"])
+
+
+def test_projection_uses_completion_target():
+    # 2MB/s * 300s = 600MB 小于 1GB，但算上 completion_target 需要 1200MB
+    proj = _projection(2 * MB, _settings(1024, target=1.0))
+    assert proj["seconds_to_max_wal_size"] == 512.0
+    assert proj["wal_triggered"] is True
+    assert proj["suggested_max_wal_size_mb"] == 1200
+    assert _projection(2 * MB, _settings(2048, target=0.5))["wal_triggered"] is False
+
+
+def test_projection_checkpoint_segments_fallback():
+    proj = _projection(MB, {"checkpoint_segments": 64, "checkpoint_timeout": 300})
+    assert proj["max_wal_size_mb"] == 1024.0
+    assert _projection(None, _settings(1024)) is None
+
+
+def test_checkpoint_segments_trigger_ignores_completion_target():
+    # 3MB/s * 300s = 900MB 未写满 64 个段（1024MB），不受 completion_target 影响
+    settings = {"checkpoint_segments": 64, "checkpoint_timeout": 300, "checkpoint_completion_target": 0.9}
+    assert _projection(3 * MB, settings)["wal_triggered"] is False
+    proj = _projection(4 * MB, settings)
+    assert proj["wal_triggered"] is True
+    assert proj["wal_per_checkpoint_mb"] == 1200.0
+    assert proj["suggested_checkpoint_segments"] == 75
+    rates = {"checkpoints": 0, "checkpoints_req": 0, "write_ms_per_checkpoint": None, "sync_ms_per_checkpoint": None,
+             "buffers_checkpoint_per_s": 0, "buffers_clean_per_s": 0, "maxwritten_clean": 0}
+    adv, _ = _advise_window(rates, projection=proj)
+    assert any("checkpoint_segments 不低于 75" in a for a in adv)
+
+
+class _VersionCursor:
+    def __init__(self, version):
+        self.version = version
+        self.sql = []
+
+    def execute(self, sql, params=None):
+        self.sql.append(sql)
+        self.description = [(c,) for c in ("checkpoints_timed", "checkpoints_req")]
+
+    def fetchone(self):
+        return (str(self.version),) if self.sql[-1] == "SHOW server_version_num" else (3, 1)
+
+
+@pytest.mark.parametrize("version, view", [(90204, "pg_stat_bgwriter"), (160004, "pg_stat_bgwriter"),
+                                           (170002, "pg_stat_checkpointer")])
+def test_checkpoint_counters_view_by_version(version, view):
+    cur = _VersionCursor(version)
+    assert _fetch_bgwriter(cur) == {"checkpoints_timed": 3, "checkpoints_req": 1}
+    assert cur.sql[0] == "SHOW server_version_num"
+    assert view in cur.sql[1]
+    assert ("pg_stat_checkpointer" in cur.sql[1]) == (version >= 170000)
+
+
+def test_advice_mentions_suggestion_when_triggered():
+    rates = {"checkpoints": 0, "checkpoints_req": 0, "write_ms_per_checkpoint": None, "sync_ms_per_checkpoint": None,
+             "buffers_checkpoint_per_s": 0, "buffers_clean_per_s": 0, "maxwritten_clean": 0}
+    adv, _ = _advise_window(rates, projection=_projection(5 * MB, _settings(1024)))
+    assert any("2250MB" in a for a in adv)
+
+
+def test_lsn_and_fpw_estimate():
+    assert _lsn_bytes("1/0") == 1 << 32
+    assert _lsn_bytes(None) is None
+    base = {"checkpoints_timed": 0, "checkpoints_req": 0, "interval_s": 10}
+    deltas = [dict(base, lsn_bytes=100), dict(base, lsn_bytes=100),
+              dict(base, checkpoints_timed=1, lsn_bytes=400)]
+    assert _estimate_fpw_share(deltas) == 0.75